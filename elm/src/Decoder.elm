@@ -9,10 +9,17 @@ module Decoder exposing
     , decodeevents
     , matchactionresult
     , decodetask
+    , decodecompacttasks
+    , decodesnapshot
     , decodeworkeraction
+    , decoderulecheck
+    , decodetimeline
     )
 
+import Array exposing (Array)
+import Dict exposing (Dict)
 import Json.Decode as D
+import Json.Encode as E
 import Json.Decode.Field as F
 import Metadata as M
 import Type
@@ -28,13 +35,19 @@ import Type
         , Msg(..)
         , OptionValue(..)
         , Plan
+        , QueueDepth
+        , RuleCheck
         , Scheduler
         , Service
+        , Span
+        , Snapshot
         , SpecType(..)
         , Status(..)
         , Task
         , TaskResult(..)
+        , Timeline
         , Worker
+        , WorkerTimeline
         )
 
 
@@ -164,6 +177,75 @@ decodetask =
     decodestatus |> D.andThen decodetaskfromstatus
 
 
+-- compact (columnar) tasks table
+
+type alias CompactTasks =
+    { size : Int
+    , dicts : Dict String (Array D.Value)
+    , columns : Dict String (Array D.Value)
+    , sparse : Dict String (Dict Int D.Value)
+    }
+
+
+decodesparsecolumn : D.Decoder (Dict Int D.Value)
+decodesparsecolumn =
+    D.map2 (\indexes values -> Dict.fromList <| List.map2 Tuple.pair indexes values)
+        (D.index 0 (D.list D.int))
+        (D.index 1 (D.list D.value))
+
+
+compactrow : CompactTasks -> Int -> D.Value
+compactrow compact idx =
+    let
+        dense name column =
+            let
+                val =
+                    Maybe.withDefault E.null (Array.get idx column)
+            in
+            case Dict.get name compact.dicts of
+                Nothing ->
+                    val
+
+                Just dict ->
+                    case D.decodeValue D.int val of
+                        Ok code ->
+                            Maybe.withDefault E.null (Array.get code dict)
+
+                        Err _ ->
+                            E.null
+
+        sparse column =
+            Maybe.withDefault E.null (Dict.get idx column)
+    in
+    E.object <|
+        List.map (\( name, column ) -> ( name, dense name column ))
+            (Dict.toList compact.columns)
+            ++ List.map (\( name, column ) -> ( name, sparse column ))
+                (Dict.toList compact.sparse)
+
+
+decodecompacttasks : D.Decoder (List Task)
+decodecompacttasks =
+    let
+        rows compact =
+            E.list (compactrow compact) (List.range 0 (compact.size - 1))
+
+        decoderows compact =
+            case D.decodeValue (D.list decodetask) (rows compact) of
+                Ok tasks ->
+                    D.succeed tasks
+
+                Err err ->
+                    D.fail <| D.errorToString err
+    in
+    D.map4 CompactTasks
+        (D.field "size" D.int)
+        (D.field "dicts" (D.dict (D.array D.value)))
+        (D.field "columns" (D.dict (D.array D.value)))
+        (D.field "sparse" (D.dict decodesparsecolumn))
+        |> D.andThen decoderows
+
+
 decodeservice : D.Decoder Service
 decodeservice =
     D.map5 Service
@@ -289,6 +371,53 @@ decodeworker =
         (D.field "button" decodeworkeraction)
 
 
+decodequeuedepth : D.Decoder QueueDepth
+decodequeuedepth =
+    D.map5 QueueDepth
+        (D.field "domain" D.string)
+        (D.field "operation" D.string)
+        (D.field "queued" D.int)
+        (D.field "oldest" D.string)
+        (D.field "age" D.float)
+
+
+decodespan : D.Decoder Span
+decodespan =
+    D.map6 Span
+        (D.field "tid" D.int)
+        (D.field "operation" (D.nullable D.string))
+        (D.field "status" D.string)
+        (D.field "start" D.float)
+        (D.field "end" D.float)
+        (D.field "count" D.int)
+
+
+decodeworkertimeline : D.Decoder WorkerTimeline
+decodeworkertimeline =
+    D.map5 WorkerTimeline
+        (D.field "wid" D.int)
+        (D.field "host" D.string)
+        (D.field "pid" (D.nullable D.int))
+        (D.field "domain" D.string)
+        (D.field "intervals" (D.list decodespan))
+
+
+decodetimeline : D.Decoder Timeline
+decodetimeline =
+    D.map3 Timeline
+        (D.field "start" D.float)
+        (D.field "stop" D.float)
+        (D.field "workers" (D.list decodeworkertimeline))
+
+
+decoderulecheck : D.Decoder RuleCheck
+decoderulecheck =
+    D.map3 RuleCheck
+        (D.field "rule" D.string)
+        (D.field "error" (D.nullable D.string))
+        (D.field "next" (D.list D.string))
+
+
 decodeworkers : D.Decoder JsonMonitors
 decodeworkers =
     D.map2 JsonMonitors
@@ -332,3 +461,19 @@ decodeflags =
     D.map2 Flags
         (D.field "baseurl" D.string)
         (D.field "domains" (D.list D.string))
+
+
+decodesnapshot : D.Decoder Snapshot
+decodesnapshot =
+    let
+        section name decoder =
+            D.maybe (D.at [ "sections", name ] decoder)
+    in
+    D.map7 Snapshot
+        (D.field "versions" (D.dict D.string))
+        (section "services" (D.list decodeservice))
+        (section "launchers" (D.list decodelauncher))
+        (section "schedulers" (D.list decodescheduler))
+        (section "workers" decodeworkers)
+        (section "plans" (D.list decodeplan))
+        (section "queue" (D.list decodequeuedepth))
@@ -1,12 +1,14 @@
 module Logview exposing (main)
 
 import Browser
+import Browser.Events exposing (Visibility(..), onVisibilityChange)
+import Dict exposing (Dict)
 import Http
 import Html as H
 import Html.Attributes as HA
 import Json.Decode as D
 import List.Extra as LE
-import Main exposing (tasksquery)
+import Main exposing (hintedresponse, tasksquery)
 import Maybe.Extra as Maybe
 import Regex as RE
 import Decoder exposing (decodetask)
@@ -29,6 +31,9 @@ type alias Model =
     , task : Maybe Task
     , lastlogid : Int
     , logger : Logger
+    -- polling: server hint (ms, 0 for none) and page visibility
+    , polldelay : Int
+    , visible : Bool
     }
 
 
@@ -40,8 +45,9 @@ type alias Flags =
 
 type Msg
     = GotTask (Result Http.Error String)
-    | GotLogs (Result Http.Error String)
+    | GotLogs (Result Http.Error ( String, Dict String String ))
     | Refresh
+    | VisibilityChanged Visibility
     | SelectDisplayLevel Level
 
 
@@ -52,7 +58,7 @@ logsquery model =
                 { url = UB.crossOrigin model.baseurl
                       [ "job_logslice", String.fromInt task.id ]
                       [ UB.int "from_log_id" model.lastlogid ]
-                , expect = Http.expectString GotLogs
+                , expect = Http.expectStringResponse GotLogs hintedresponse
                 }
 
         Nothing -> Cmd.none
@@ -115,7 +121,7 @@ update msg model =
         GotTask (Err err) ->
             nocmd model
 
-        GotLogs (Ok rawlogs) ->
+        GotLogs (Ok ( rawlogs, headers )) ->
             case D.decodeString logsdecoder rawlogs of
                 Ok parsedlogs ->
                     let
@@ -134,17 +140,27 @@ update msg model =
                     nocmd { model
                               | logger = newlogger
                               , lastlogid = if lastid == -1 then model.lastlogid else lastid
+                              , polldelay =
+                                  Dict.get "x-poll-interval" headers
+                                      |> Maybe.andThen String.toInt
+                                      |> Maybe.withDefault model.polldelay
                           }
                 Err err -> nocmd model
 
         GotLogs (Err error) -> nocmd model
 
+        VisibilityChanged Visible ->
+            update Refresh { model | visible = True }
+
+        VisibilityChanged Hidden ->
+            nocmd { model | visible = False }
+
         Refresh ->
             let
                 logcmd =
                     logsquery model
                 taskcmd task =
-                    Http.get <| tasksquery model GotTask (Just task.id) (Just task.id)
+                    Http.get <| tasksquery model False GotTask (Just task.id) (Just task.id)
                 cmd =
                     case model.task of
                         Nothing -> logcmd
@@ -195,9 +211,11 @@ init flags =
                 Nothing
                 0
                 (Logger DEBUG DEBUG [])
+                0
+                True
     in
     ( model
-    , Http.get <| tasksquery model GotTask (Just flags.taskid) (Just flags.taskid)
+    , Http.get <| tasksquery model False GotTask (Just flags.taskid) (Just flags.taskid)
     )
 
 
@@ -216,7 +234,13 @@ refresh model =
                         Aborted -> False
 
     in
-    if doit then Time.every 1000 (always Refresh) else Sub.none
+    Sub.batch
+        [ if doit && model.visible
+          -- at the pace suggested by the server
+          then Time.every (max 1000 (toFloat model.polldelay)) (always Refresh)
+          else Sub.none
+        , onVisibilityChange VisibilityChanged
+        ]
 
 
 main : Program Flags Model Msg
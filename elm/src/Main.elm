@@ -1,14 +1,12 @@
 port module Main exposing (..)
 
 import AssocList as AL
-import AssocList.Extra as ALE
 import Browser
 import Browser.Dom exposing (getViewport)
-import Browser.Events exposing (onKeyDown, onResize)
+import Browser.Events exposing (Visibility(..), onKeyDown, onResize, onVisibilityChange)
 import Cmd.Extra exposing (withNoCmd)
 import Dict exposing (Dict)
 import Http
-import Http.Detailed as HD
 import InfiniteScroll as IS
 import InfiniteScroll as IS exposing (Msg(..))
 import Json.Decode as JD
@@ -31,10 +29,11 @@ import Decoder
         , decodelauncher
         , decodeplan
         , decodescheduler
-        , decodeworkers
         , decodeservice
         , matchactionresult
-        , decodetask
+        , decodecompacttasks
+        , decodesnapshot
+        , decodetimeline
         )
 import Type
     exposing
@@ -43,11 +42,11 @@ import Type
         , Flags
         , Model
         , Msg(..)
+        , Snapshot
         , Status(..)
         , TabsLayout(..)
         )
 import View exposing (view)
-import AssocSet as AS
 import Task
 import Time
 import Url.Builder as UB
@@ -66,17 +65,6 @@ unwraperror resp =
         Http.BadBody body -> "we got a bad body: " ++ body
 
 
-unwraperror2 : HD.Error  String -> String
-unwraperror2 resp =
-    case resp of
-        HD.BadUrl x -> "bad url: " ++ x
-        HD.Timeout -> "the query timed out"
-        HD.NetworkError -> "there was a network error"
-        HD.BadStatus _ body ->
-            "the server signals an issue: "  ++ body
-        HD.BadBody _ a b -> "we got a bad body: " ++ a ++ b
-
-
 handleevents model events =
     -- remove deleted events in place
     -- and query the tasks using min/max concerned ids
@@ -85,7 +73,7 @@ handleevents model events =
         deletedids = List.map .taskid alldeleted
         others = List.map .taskid allothers
         newmodel = { model
-                       | tasks = ALE.removeMany (AS.fromList deletedids) model.tasks
+                       | tasks = List.foldl Dict.remove model.tasks deletedids
                        , lasteventid = Maybe.withDefault
                                        model.lasteventid
                                        <| LE.foldl1 max <| List.map .id events
@@ -94,11 +82,45 @@ handleevents model events =
     ( newmodel
     , if List.length others > 0
       then Http.get
-          <| tasksquery model UpdatedTasks (LE.foldl1 min others) (LE.foldl1 max others)
+          <| tasksquery model True UpdatedTasks (LE.foldl1 min others) (LE.foldl1 max others)
       else Cmd.none
     )
 
 
+applysnapshot : Model -> Snapshot -> Model
+applysnapshot model snapshot =
+    let
+        bygroup items =
+            AL.fromList (groupbyid items)
+    in
+    { model
+        | sectionversions =
+            Dict.union snapshot.versions model.sectionversions
+        , services =
+            Maybe.unwrap model.services bygroup snapshot.services
+        , launchers =
+            Maybe.unwrap model.launchers bygroup snapshot.launchers
+        , schedulers =
+            Maybe.unwrap model.schedulers bygroup snapshot.schedulers
+        , monitors =
+            Maybe.unwrap model.monitors (bygroup << .monitors) snapshot.workers
+        , workers =
+            Maybe.unwrap model.workers (bygroup << .workers) snapshot.workers
+        , events = Maybe.withDefault model.events snapshot.plans
+        , queue = Maybe.withDefault model.queue snapshot.queue
+    }
+
+
+withpollhint : Dict String String -> Model -> Model
+withpollhint headers model =
+    { model
+        | polldelay =
+            Dict.get "x-poll-interval" headers
+                |> Maybe.andThen String.toInt
+                |> Maybe.withDefault model.polldelay
+    }
+
+
 update : Msg -> Model -> ( Model, Cmd Msg )
 update msg model =
     let
@@ -111,7 +133,7 @@ update msg model =
             in
             case table of
                 TasksTab ->
-                    { mod | tasks = AL.update id (Maybe.map updateactions) mod.tasks }
+                    { mod | tasks = Dict.update id (Maybe.map updateactions) mod.tasks }
 
                 MonitorsTab ->
                     { mod | workers = AL.update id (Maybe.map updateactions) mod.workers }
@@ -137,12 +159,27 @@ update msg model =
             nocmd model
 
         Tab tab ->
-            ( { model | activetab = tab }
+            -- the pace of the previous tab does not apply
+            ( { model | activetab = tab, polldelay = 0 }
             , refreshCmd model tab
             )
 
+        VisibilityChanged Visible ->
+            ( { model | visible = True }
+            , refreshCmd model model.activetab
+            )
+
+        VisibilityChanged Hidden ->
+            nocmd { model | visible = False }
+
         SetDomain domain ->
-            nocmd { model | domain = LS.select domain model.domain }
+            let
+                newmodel = { model | domain = LS.select domain model.domain }
+            in
+            -- the events feed follows the domain: catch up
+            ( newmodel
+            , Http.get <| tasksquery newmodel True GotTasks Nothing Nothing
+            )
 
         OnRefresh ->
             ( model, refreshCmd model model.activetab )
@@ -167,6 +204,9 @@ update msg model =
         LoadMore ->
             nocmd model
 
+        TasksScrolled scrolltop ->
+            nocmd { model | scrolltop = scrolltop }
+
         ScrollMore dir ->
             let
                 remain =
@@ -175,15 +215,21 @@ update msg model =
                             (st.contentHeight - (round st.scrollTop))
                         _ -> 9999
 
+                scrolled =
+                    case dir of
+                        Scroll st ->
+                            { model | scrolltop = st.scrollTop }
+                        _ -> model
+
                 (newmodel, nextcmd) =
                     if remain > 1200 && not model.loading
-                    then (model, Cmd.none)
+                    then (scrolled, Cmd.none)
                     else
-                        ( { model | loading = True }
+                        ( { scrolled | loading = True }
                         , Http.get <|
-                            (tasksquery model)
+                            (tasksquery model True)
                             GotTasks
-                            (List.minimum <| List.map .id (AL.values model.tasks))
+                            (List.head <| Dict.keys model.tasks)
                             Nothing
                         )
             in
@@ -211,26 +257,28 @@ update msg model =
                   , forceload = True
               }
             , Http.get <|
-                (tasksquery model)
+                (tasksquery model True)
                 GotTasks
                 (Just 1)
-                (List.minimum <| List.map .id (AL.values model.tasks))
+                (List.head <| Dict.keys model.tasks)
             )
 
         GotTasks (Ok rawtasks) ->
             let mod = log model INFO ("TASKS (all):" ++ rawtasks) in
-            case JD.decodeString (JD.list decodetask) rawtasks of
+            case JD.decodeString decodecompacttasks rawtasks of
                 Ok tasks ->
                     let
                         newtasks =
-                            AL.fromList <| groupbyid tasks
+                            Dict.fromList <| groupbyid tasks
                         filehintcmd =
                             [ getiofilehint model tasks "input" GotInputFileHint
                             , getiofilehint model tasks "output" GotOutputFileHint
                             ]
                     in
+                    -- the fresh rows win (e.g. catching up after a
+                    -- domain change, whose events we did not get)
                     ( { model
-                          | tasks = AL.union model.tasks newtasks
+                          | tasks = Dict.union newtasks model.tasks
                           , loading = False
                           , toload = List.length tasks > 0
                       }
@@ -263,12 +311,13 @@ update msg model =
 
         UpdatedTasks (Ok rawtasks) ->
             let mod = log model INFO ("TASKS (subset):" ++ rawtasks) in
-            case JD.decodeString (JD.list decodetask) rawtasks of
+            case JD.decodeString decodecompacttasks rawtasks of
                 Ok tasks ->
                     ( { model
-                          | tasks = AL.union
-                            (AL.fromList (groupbyid tasks))
+                          | tasks = List.foldl
+                            (\task -> Dict.insert task.id task)
                             model.tasks
+                            tasks
                       }
                     , Cmd.batch [ getiofilehint model tasks "input" GotInputFileHint
                                 , getiofilehint model tasks "output" GotOutputFileHint
@@ -279,11 +328,16 @@ update msg model =
         UpdatedTasks (Err err) ->
             nocmd <| log model ERROR <| unwraperror err
 
-        GotEvents (Ok rawevents) ->
+        GotEvents (Ok ( rawevents, headers )) ->
             let mod =
+                    withpollhint headers <|
                     if rawevents /= "[]"
                     then log model INFO ("EVENTS: " ++ rawevents)
                     else model
+
+                lastid =
+                    Dict.get "x-last-event-id" headers
+                        |> Maybe.andThen String.toInt
             in
             case JD.decodeString decodeevents rawevents of
                 Err err -> nocmd <| log model ERROR <| JD.errorToString err
@@ -293,13 +347,25 @@ update msg model =
                             -- resync with the server state
                             ( mod
                             , Cmd.batch
-                                [ Http.get <| tasksquery model GotTasks Nothing Nothing
+                                [ Http.get <| tasksquery model True GotTasks Nothing Nothing
                                 , Http.get <| lasteventquery model
                                 ]
                             )
                         Just events ->
                             -- try to update the model with minimal effort
-                            handleevents mod events
+                            -- (the events of the other domains are filtered
+                            -- out but still move the last event id)
+                            let
+                                ( newmodel, cmd ) = handleevents mod events
+                            in
+                            ( { newmodel
+                                  | lasteventid =
+                                      Maybe.unwrap newmodel.lasteventid
+                                          (max newmodel.lasteventid)
+                                          lastid
+                              }
+                            , cmd
+                            )
 
         GotEvents (Err err) ->
             nocmd <| log model ERROR <| unwraperror err
@@ -353,7 +419,7 @@ update msg model =
 
         RelaunchMsg taskid (Ok _) ->
             let
-                maybetask = AL.get taskid model.tasks
+                maybetask = Dict.get taskid model.tasks
                 newmodel =
                     case maybetask of
                         Nothing -> model
@@ -361,7 +427,7 @@ update msg model =
                             let
                                 newtask id =
                                     Just { task | actions = matchactionresult task.status }
-                            in { model | tasks = AL.update task.id newtask model.tasks }
+                            in { model | tasks = Dict.update task.id newtask model.tasks }
             in
             nocmd <| newmodel
 
@@ -379,6 +445,23 @@ update msg model =
         GotWorkers (Err err) ->
             nocmd <| log model ERROR <| unwraperror err
 
+        GotTimeline (Ok timeline) ->
+            nocmd { model | timeline = Just timeline }
+
+        GotTimeline (Err err) ->
+            nocmd <| log model ERROR <| unwraperror err
+
+        GotSnapshot (Ok ( rawsnapshot, headers )) ->
+            case JD.decodeString decodesnapshot rawsnapshot of
+                Ok snapshot ->
+                    nocmd <| withpollhint headers <| applysnapshot model snapshot
+
+                Err err ->
+                    nocmd <| log model ERROR <| JD.errorToString err
+
+        GotSnapshot (Err err) ->
+            nocmd <| log model ERROR <| unwraperror err
+
         OnKill wid ->
             ( disableactions model MonitorsTab wid
             , Http.get
@@ -482,19 +565,26 @@ update msg model =
 
         ScheduleRule rule ->
             ( { model | selectedrule = rule }
-            , Http.get
-                { url = UB.crossOrigin model.baseurl
-                      [ "test-cron-rule" ] [ UB.string "rule" rule ]
-                , expect = HD.expectString TestedRule
+            , Http.post
+                { url = UB.crossOrigin model.baseurl [ "test-cron-rules" ] []
+                , body = Http.jsonBody <| JE.object
+                         [ ( "rules", JE.list JE.string [ rule ] ) ]
+                , expect = Http.expectJson TestedRule (JD.list Decoder.decoderulecheck)
                 }
             )
 
-        TestedRule (Ok err) ->
-            let errmsg = Tuple.second err in
-            nocmd { model | lasterror = if errmsg == "" then Nothing else Just errmsg }
+        TestedRule (Ok checks) ->
+            case List.head checks of
+                Nothing ->
+                    nocmd model
+                Just check ->
+                    nocmd { model
+                              | lasterror = check.error
+                              , nextfires = check.next
+                          }
 
         TestedRule (Err err) ->
-            nocmd <| log model ERROR <| unwraperror2 err
+            nocmd <| log model ERROR <| unwraperror err
 
         CancelPreSchedule ->
             nocmd { model
@@ -502,6 +592,7 @@ update msg model =
                       , selectedhost = Nothing
                       , selectedrule = defaultrule
                       , lasterror = Nothing
+                      , nextfires = []
                   }
 
         PreSchedule ->
@@ -519,6 +610,7 @@ update msg model =
                         , selectedhost = Nothing
                         , selectedrule = defaultrule
                         , lasterror = Nothing
+                        , nextfires = []
                     }
             in
             ( newmodel
@@ -646,11 +738,33 @@ cmdPut url expect =
 eventsquery model =
     { url = UB.crossOrigin model.baseurl
           [ "events", String.fromInt model.lasteventid ]
-          []
-    , expect = Http.expectString GotEvents
+          (LS.selected model.domain
+              |> Maybe.map (UB.string "domain")
+              |> Maybe.toList)
+    , expect = Http.expectStringResponse GotEvents hintedresponse
     }
 
 
+-- the body along with the response headers (carrying the server hints)
+hintedresponse : Http.Response String -> Result Http.Error ( String, Dict String String )
+hintedresponse response =
+    case response of
+        Http.GoodStatus_ metadata body ->
+            Ok ( body, metadata.headers )
+
+        Http.BadUrl_ url ->
+            Err (Http.BadUrl url)
+
+        Http.Timeout_ ->
+            Err Http.Timeout
+
+        Http.NetworkError_ ->
+            Err Http.NetworkError
+
+        Http.BadStatus_ metadata _ ->
+            Err (Http.BadStatus metadata.statusCode)
+
+
 lasteventquery model =
     { url = UB.crossOrigin model.baseurl
           [ "lasteventid" ]
@@ -659,9 +773,12 @@ lasteventquery model =
     }
 
 
-tasksquery model msg min max =
+-- the tasks table asks for the compact format, the other pages
+-- (e.g. the log view) for the task dicts
+tasksquery model compact msg min max =
     let
-        args = [] ++
+        args = (if compact then [ UB.string "format" "compact" ] else [])
+               ++
                (case min of
                    Nothing -> []
                    Just num -> [ UB.int "min" num ])
@@ -714,6 +831,18 @@ getlaunchers model =
     }
 
 
+-- the last hour, merged by the server to the chart resolution
+gettimeline model =
+    { url = UB.crossOrigin model.baseurl
+          [ "workers-timeline-json" ]
+          (UB.int "width" 1000
+              :: (LS.selected model.domain
+                     |> Maybe.map (UB.string "domain")
+                     |> Maybe.toList))
+    , expect = Http.expectJson GotTimeline decodetimeline
+    }
+
+
 getplans model =
     { url = UB.crossOrigin model.baseurl
           [ "plans-table-json" ] [ UB.int "hours" model.hours ]
@@ -734,37 +863,41 @@ launchnow model sid =
     }
 
 
-refreshCmd : Model -> TabsLayout -> Cmd Msg
-refreshCmd model tab =
-    let
-        domain =
-            LS.selected model.domain
-                |> Maybe.map (UB.string "domain")
-                |> Maybe.toList
+snapshotquery : Model -> List String -> Cmd Msg
+snapshotquery model sections =
+    Http.post
+        { url = UB.crossOrigin model.baseurl [ "snapshot" ] []
+        , body = Http.jsonBody <| JE.object
+                 [ ( "sections", JE.list JE.string sections )
+                 , ( "versions", JE.dict identity JE.string model.sectionversions )
+                 , ( "hours", JE.int model.hours )
+                 ]
+        , expect = Http.expectStringResponse GotSnapshot hintedresponse
+        }
 
-        query =
-            case tab of
-                TasksTab ->
-                    [ eventsquery model ]
 
-                ServicesTab ->
-                    [ getservices model ]
+refreshCmd : Model -> TabsLayout -> Cmd Msg
+refreshCmd model tab =
+    case tab of
+        TasksTab ->
+            Http.get <| eventsquery model
 
-                MonitorsTab ->
-                    [ { url = UB.crossOrigin model.baseurl
-                            [ "workers-table-json" ] [ ]
-                      , expect = Http.expectJson GotWorkers decodeworkers
-                      }
-                    ]
+        ServicesTab ->
+            snapshotquery model [ "services" ]
 
-                LaunchersTab -> [ getlaunchers model ]
+        MonitorsTab ->
+            Cmd.batch [ snapshotquery model [ "workers", "queue" ]
+                      , Http.get <| gettimeline model
+                      ]
 
-                SchedulersTab -> [ getlaunchers model, getschedulers model ]
+        LaunchersTab ->
+            snapshotquery model [ "launchers" ]
 
-                PlansTab -> [ getplans model ]
+        SchedulersTab ->
+            snapshotquery model [ "launchers", "schedulers" ]
 
-    in
-    Cmd.batch <| List.map Http.get query
+        PlansTab ->
+            snapshotquery model [ "plans" ]
 
 
 loadmore direction =
@@ -806,7 +939,7 @@ init jsonFlags =
         model =
             { baseurl = baseurl
             , canwrite = False
-            , tasks = AL.empty
+            , tasks = Dict.empty
             , tasksfilter =
                   { service = Nothing
                   , inputs = Nothing
@@ -814,6 +947,8 @@ init jsonFlags =
                   }
             , workers = AL.empty
             , monitors = AL.empty
+            , queue = []
+            , timeline = Nothing
             , services = AL.empty
             , launchers = AL.empty
             , launching = Nothing
@@ -825,6 +960,9 @@ init jsonFlags =
             , forceload = False
             , scroller = IS.init loadmore
             , height = 500
+            , scrolltop = 0
+            , polldelay = 0
+            , visible = True
             , lasteventid = 0
             -- single input/output files
             , inputfilehints = Dict.empty
@@ -840,13 +978,15 @@ init jsonFlags =
             , selectedhost = Nothing
             , selectedrule = defaultrule
             , lasterror = Nothing
+            , nextfires = []
             -- plan
             , hours = 1
             , events = []
+            , sectionversions = Dict.empty
             }
     in
     ( model
-    , Cmd.batch [ Http.get <| tasksquery model GotTasks Nothing Nothing
+    , Cmd.batch [ Http.get <| tasksquery model True GotTasks Nothing Nothing
                 , Http.get <| lasteventquery model
                 , Http.get <| getservices model
                 , Http.get <| writepermsquery model
@@ -885,7 +1025,11 @@ sub model =
                 PlansTab ->
                     10000
     in
-    Sub.batch [ Time.every refreshTime (always OnRefresh)
+    Sub.batch [ if model.visible
+                -- the server may ask for a slower pace
+                then Time.every (max refreshTime (toFloat model.polldelay)) (always OnRefresh)
+                else Sub.none
+              , onVisibilityChange VisibilityChanged
               , onKeyDown (JD.map HandleKeyboardEvent decodeKeyboardEvent)
               , pre_schedule_fail PreScheduleFailed
               , pre_schedule_ok PreScheduleOk
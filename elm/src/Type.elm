@@ -2,9 +2,9 @@ module Type exposing (..)
 
 import AssocList as AL
 import Browser.Dom exposing (Viewport)
+import Browser.Events exposing (Visibility)
 import Dict exposing (Dict)
 import Http
-import Http.Detailed as HD
 import InfiniteScroll as IS
 import Keyboard.Event exposing (KeyboardEvent)
 import List.Selection as LS
@@ -134,6 +134,64 @@ type alias JsonMonitors =
     }
 
 
+type alias RuleCheck =
+    { rule : String
+    , error : Maybe String
+    , next : List String
+    }
+
+
+type alias QueueDepth =
+    { domain : String
+    , operation : String
+    , queued : Int
+    , oldest : String
+    , age : Float
+    }
+
+
+-- the tasks run by a worker: the intervals starting within the same
+-- pixel are merged by the server (`count` tasks, `operation` and
+-- `status` set when they agree)
+type alias Span =
+    { tid : Int
+    , operation : Maybe String
+    , status : String
+    , start : Float
+    , end : Float
+    , count : Int
+    }
+
+
+type alias WorkerTimeline =
+    { wid : Int
+    , host : String
+    , pid : Maybe Int
+    , domain : String
+    , intervals : List Span
+    }
+
+
+-- times in seconds since the epoch
+type alias Timeline =
+    { start : Float
+    , stop : Float
+    , workers : List WorkerTimeline
+    }
+
+
+-- the stale sections of a dashboard snapshot
+type alias Snapshot =
+    { versions : Dict String String
+    , services : Maybe (List Service)
+    , launchers : Maybe (List Launcher)
+    , schedulers : Maybe (List Scheduler)
+    , workers : Maybe JsonMonitors
+    , plans : Maybe (List Plan)
+    , queue : Maybe (List QueueDepth)
+    }
+
+
 type alias WorkerDict =
     AL.Dict Int Worker
 
@@ -142,8 +200,9 @@ type alias MonitorDict =
     AL.Dict Int Monitor
 
 
+-- keyed by id: O(log n) updates on the (possibly large) tasks table
 type alias TaskDict =
-    AL.Dict Int Task
+    Dict Int Task
 
 
 type alias ServiceDict =
@@ -172,6 +231,8 @@ type alias Model =
     , tasksfilter : TasksFilter
     , workers : WorkerDict
     , monitors : MonitorDict
+    , queue : List QueueDepth
+    , timeline : Maybe Timeline
     , services : ServiceDict
     , launchers : LauncherDict
     , launching : Maybe Int
@@ -183,6 +244,10 @@ type alias Model =
     , forceload : Bool
     , scroller : IS.Model Msg
     , height : Float
+    , scrolltop : Float
+    -- polling: server hint (ms, 0 for none) and page visibility
+    , polldelay : Int
+    , visible : Bool
     , lasteventid : Int
     -- single input/output files
     , inputfilehints : Dict String String
@@ -198,9 +263,12 @@ type alias Model =
     , selectedhost : Maybe String
     , selectedrule : String
     , lasterror : Maybe String
+    , nextfires : List String
     -- plan
     , hours : Int
     , events : List Plan
+    -- snapshot section -> version token
+    , sectionversions : Dict String String
     }
 
 
@@ -245,7 +313,7 @@ type Msg
     | GotInputFileHint (Result Http.Error String)
     | GotOutputFileHint (Result Http.Error String)
     | UpdatedTasks (Result Http.Error String)
-    | GotEvents (Result Http.Error String)
+    | GotEvents (Result Http.Error ( String, Dict String String ))
     | GotLastEvent (Result Http.Error String)
     | ActionResponse TabsLayout Int Action (Result Http.Error Bool)
     | RelaunchMsg Int (Result Http.Error Int)
@@ -253,6 +321,9 @@ type Msg
     | Tab TabsLayout
     | GotServices (Result Http.Error (List Service))
     | GotWorkers (Result Http.Error JsonMonitors)
+    | GotTimeline (Result Http.Error Timeline)
+    | GotSnapshot (Result Http.Error ( String, Dict String String ))
+    | VisibilityChanged Visibility
     | OnKill Int
     | OnShutdown Int
     | SetDomain String
@@ -268,7 +339,7 @@ type Msg
     | ScheduleService String String
     | ScheduleHost String
     | ScheduleRule String
-    | TestedRule (Result (HD.Error String) (Http.Metadata, String))
+    | TestedRule (Result Http.Error (List RuleCheck))
     | PreSchedule
     | CancelPreSchedule
     | DeleteSched Int
@@ -282,6 +353,7 @@ type Msg
     | SelectDisplayLevel Level
     | LoadMore
     | ScrollMore IS.Msg
+    | TasksScrolled Float
     | GotInitialViewport Viewport
     | Resize (Float, Float)
     -- filters
@@ -24,6 +24,7 @@ import Type
         , Model
         , Msg(..)
         , OptionValue(..)
+        , QueueDepth
         , Scheduler
         , Service
         , SpecType(..)
@@ -31,7 +32,9 @@ import Type
         , TabsLayout(..)
         , Task
         , TaskResult(..)
+        , Timeline
         , Worker
+        , WorkerTimeline
         )
 
 
@@ -323,19 +326,44 @@ view model =
                     (String.fromInt <| ceiling model.height) ++ "px"
 
                 scroller =
-                    if model.toload && not model.loading
-                    then
-                        [ HA.style "height" height
-                        , HA.style "overflow" "scroll"
-                        , IS.infiniteScroll ScrollMore
-                        ]
-                    else
-                        []
+                    [ HA.style "height" height
+                    , HA.style "overflow" "scroll"
+                    , if model.toload && not model.loading
+                      then IS.infiniteScroll ScrollMore
+                      else HE.on "scroll"
+                          <| JD.map TasksScrolled
+                          <| JD.at [ "target", "scrollTop" ] JD.float
+                    ]
+
+                -- windowed rendering: only the rows around the visible
+                -- part of the scroller get a dom, spacers stand for the
+                -- others
+                -- (must match the .task-row height of style.css)
+                rowheight = 72
+
+                overscan = 20
+
+                shown =
+                    -- newest first
+                    List.filter filtertask
+                        <| Dict.foldl (\_ task acc -> task :: acc) [] model.tasks
+
+                -- even, to keep the stripes in place
+                first =
+                    2 * ((max 0 <| floor (model.scrolltop / toFloat rowheight) - overscan) // 2)
+
+                window =
+                    List.take (ceiling (model.height / toFloat rowheight) + 2 * overscan)
+                        <| List.drop first shown
+
+                spacer count =
+                    H.tr [ HA.style "height" (String.fromInt (count * rowheight) ++ "px") ] []
 
                 table =
                     body columns filter
-                        (List.map (taskrenderrow model)
-                             <| List.filter filtertask (AL.values model.tasks)
+                        ([ spacer first ]
+                         ++ List.map (taskrenderrow model) window
+                         ++ [ spacer (List.length shown - first - List.length window) ]
                         )
 
             in
@@ -410,11 +438,32 @@ view model =
                             (AL.values model.monitors)
                         )
 
+                queuecolumns =
+                    [ "domain"
+                    , "service"
+                    , "queued"
+                    , "oldest queued"
+                    ]
+
+                queuetable =
+                    body queuecolumns []
+                        (List.map queuerenderrow model.queue)
+
                 workertable =
                     body workercolumns []
                         (List.map (workerrendertow model.canwrite) (AL.values model.workers))
+
+                timelinetable =
+                    case model.timeline of
+                        Nothing ->
+                            H.div [] []
+
+                        Just timeline ->
+                            body [ "pid@host", "tasks (last hour)" ] []
+                                (List.map (timelinerenderrow timeline) timeline.workers)
             in
-            H.div [ topmargin ] [ title, head, domaintable, workertable ]
+            H.div [ topmargin ]
+                [ title, head, domaintable, queuetable, workertable, timelinetable ]
 
         SchedulersTab ->
             let
@@ -610,6 +659,12 @@ scheduleaction model =
                           H.p
                               [ HA.class "text-danger" ]
                               [ H.text error ]
+                , case model.nextfires of
+                      [] -> H.span [] []
+                      nextfires ->
+                          H.p
+                              [ HA.class "text-muted" ]
+                              [ H.text ("next: " ++ String.join ", " nextfires) ]
                 , H.pre [ HA.class "text-monospace text-muted" ]
                     (List.intersperse (H.br [] [])
                         <| List.map H.text (String.lines crondocumentation)
@@ -736,7 +791,11 @@ taskrenderrow model task =
                         , H.span []
                             [ H.span [] [ H.text " " ]
                             , H.a
-                                [ HA.title "show the error"
+                                [ HA.title <|
+                                      case task.status of
+                                          -- the last line of the traceback
+                                          Failed excerpt -> excerpt
+                                          _ -> "show the error"
                                 , HA.target "_blank"
                                 , HA.style "color" "red"
                                 , HA.href ("taskerror/" ++ String.fromInt task.id)
@@ -767,7 +826,7 @@ taskrenderrow model task =
                   [ H.text (String.fromInt task.id) ]
             , renderresult task.result
             , td task.domain
-            , td <| Maybe.withDefault "" task.input
+            , clampedtd [] <| Maybe.withDefault "" task.input
             , H.td [ HA.class "text-monospace", HA.style "font-size" ".8em" ]
                 [ H.span [ HA.style "color" "grey" ] [ H.text task.queued ]
                 , H.br [] []
@@ -775,12 +834,12 @@ taskrenderrow model task =
                 , H.br [] []
                 , H.span [] [ H.text <| Maybe.withDefault "" task.finished ]
                 ]
-            , H.td
+            , clampedtd
                 [ if user == unknownuser
                   then HA.style "color" "grey"
                   else HA.style "color" "blue"
                 ]
-                [ H.text user ]
+                user
             , td <| case task.worker of
                         Nothing -> "#"
                         Just worker -> "#" ++ String.fromInt worker
@@ -788,7 +847,7 @@ taskrenderrow model task =
             ]
 
     in
-    H.tr [] (if model.canwrite then row ++ [ actions ] else row)
+    H.tr [ HA.class "task-row" ] (if model.canwrite then row ++ [ actions ] else row)
 
 
 td : String -> H.Html msg
@@ -796,6 +855,13 @@ td x =
     H.td [] [ H.text x ]
 
 
+-- a one line cell, elided beyond its width (the full text shows
+-- on hover)
+clampedtd : List (H.Attribute msg) -> String -> H.Html msg
+clampedtd attrs x =
+    H.td attrs [ H.div [ HA.class "clamped", HA.title x ] [ H.text x ] ]
+
+
 servicerenderrow : Service -> H.Html Msg
 servicerenderrow service =
     H.tr []
@@ -1028,6 +1094,78 @@ monitorrenderrow monitor =
         ]
 
 
+queuerenderrow : QueueDepth -> H.Html Msg
+queuerenderrow depth =
+    H.tr []
+        [ td depth.domain
+        , td depth.operation
+        , td (String.fromInt depth.queued)
+        , formatdatecolor depth.oldest depth.age
+        ]
+
+
+timelinerenderrow : Timeline -> WorkerTimeline -> H.Html Msg
+timelinerenderrow timeline worker =
+    let
+        window =
+            max 1 (timeline.stop - timeline.start)
+
+        percent stamp =
+            String.fromFloat
+                (100 * (clamp timeline.start timeline.stop stamp - timeline.start) / window)
+                ++ "%"
+
+        color status =
+            case status of
+                "running" -> "DarkMagenta"
+                "done" -> "DarkGreen"
+                "failed" -> "Red"
+                "aborting" -> "DarkMagenta"
+                "aborted" -> "Orange"
+                "mixed" -> "SteelBlue"
+                _ -> "Gray"
+
+        label span =
+            if span.count > 1 then
+                String.fromInt span.count ++ " tasks"
+                    ++ (Maybe.withDefault "" <| Maybe.map ((++) " of ") span.operation)
+
+            else
+                "#" ++ String.fromInt span.tid ++ " "
+                    ++ Maybe.withDefault "" span.operation
+                    ++ " (" ++ span.status ++ ")"
+
+        bar span =
+            H.div
+                [ HA.style "position" "absolute"
+                , HA.style "top" "0"
+                , HA.style "bottom" "0"
+                , HA.style "left" (percent span.start)
+                -- at least one pixel, however short the task
+                , HA.style "width"
+                    ("max(1px, calc(" ++ percent span.end
+                         ++ " - " ++ percent span.start ++ "))")
+                , HA.style "background-color" (color span.status)
+                , HA.title (label span)
+                ]
+                []
+
+        pidhost =
+            (Maybe.withDefault "" <| Maybe.map (\pid -> String.fromInt pid ++ "@") worker.pid)
+                ++ worker.host
+    in
+    H.tr []
+        [ td pidhost
+        , H.td [ HA.style "width" "80%" ]
+            [ H.div
+                [ HA.style "position" "relative"
+                , HA.style "height" "1.2em"
+                ]
+                (List.map bar worker.intervals)
+            ]
+        ]
+
+
 formatdatecolor : String -> Float -> H.Html Msg
 formatdatecolor stringDate delta =
     let
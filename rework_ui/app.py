@@ -1,19 +1,108 @@
 from sqlalchemy import create_engine
 from flask import Flask
 
-from rework_ui.blueprint import reworkui
+from rework_ui.blueprint import (
+    MAXFILESIZE,
+    MAXREQUESTSIZE,
+    reworkui
+)
+from rework_ui.federation import federatedui
 
 
-def make_app(engine, prefix=None):
+def pooled_engine(dburi,
+                  poolsize=5,
+                  maxoverflow=10,
+                  pooltimeout=30,
+                  poolrecycle=-1,
+                  preping=True):
+    return create_engine(
+        dburi,
+        pool_size=poolsize,
+        max_overflow=maxoverflow,
+        pool_timeout=pooltimeout,
+        pool_recycle=poolrecycle,
+        pool_pre_ping=preping
+    )
+
+
+def make_app(engine, prefix=None, jsonbackend='auto', readengine=None,
+             timeout=5,
+             maxfilesize=MAXFILESIZE,
+             maxrequestsize=MAXREQUESTSIZE,
+             coalescewindow=0,
+             readythresholds=None):
+    """build the ui app
+
+    With a mapping of names to engines (and optionally of names to
+    read engines), each source gets its own dashboard under
+    `/<name>/` and the root serves the merged view (see
+    rework_ui.federation).
+    """
     app = Flask('rework')
+    # werkzeug stops reading the larger (or chunked) bodies early
+    app.config['MAX_CONTENT_LENGTH'] = maxrequestsize
+    options = dict(
+        jsonbackend=jsonbackend,
+        maxfilesize=maxfilesize,
+        maxrequestsize=maxrequestsize,
+        coalescewindow=coalescewindow,
+        readythresholds=readythresholds
+    )
+    if not isinstance(engine, dict):
+        app.register_blueprint(
+            reworkui(engine, readengine=readengine, **options),
+            url_prefix=prefix
+        )
+        return app
+
+    readengines = readengine or {}
+    for name, source in engine.items():
+        app.register_blueprint(
+            reworkui(
+                source,
+                readengine=readengines.get(name),
+                **options
+            ),
+            url_prefix=f'{prefix or ""}/{name}',
+            name=f'reworkui_{name}'
+        )
     app.register_blueprint(
-        reworkui(engine),
+        federatedui(
+            engine,
+            timeout=timeout,
+            jsonbackend=jsonbackend,
+            readengines=readengines
+        ),
         url_prefix=prefix
     )
     return app
 
 
-def startapp(host, port, dburi):
-    engine = create_engine(dburi)
-    app = make_app(engine)
+def startapp(host, port, dburi, readuri=None, timeout=5,
+             maxfilesize=MAXFILESIZE,
+             maxrequestsize=MAXREQUESTSIZE,
+             coalescewindow=0,
+             readythresholds=None,
+             **pooloptions):
+    if isinstance(dburi, dict):
+        engine = {
+            name: pooled_engine(uri, **pooloptions)
+            for name, uri in dburi.items()
+        }
+        readengine = {
+            name: pooled_engine(uri, **pooloptions)
+            for name, uri in (readuri or {}).items()
+        }
+    else:
+        engine = pooled_engine(dburi, **pooloptions)
+        readengine = readuri and pooled_engine(readuri, **pooloptions)
+    app = make_app(
+        engine,
+        readengine=readengine,
+        timeout=timeout,
+        maxfilesize=maxfilesize,
+        maxrequestsize=maxrequestsize,
+        coalescewindow=coalescewindow,
+        readythresholds=readythresholds
+    )
     app.run(host=host, port=port, threaded=True)
@@ -0,0 +1,125 @@
+from datetime import datetime, timezone
+
+from sqlhelp import select
+
+
+TASKCOLUMNS = (
+    'id', 'operation', 'queued', 'started', 'finished',
+    'input', 'output', 'traceback', 'worker', 'status',
+    'abort', 'metadata'
+)
+
+
+def _month_bounds(stamp):
+    stamp = stamp.astimezone(timezone.utc)
+    start = datetime(stamp.year, stamp.month, 1, tzinfo=timezone.utc)
+    if stamp.month == 12:
+        stop = datetime(stamp.year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        stop = datetime(stamp.year, stamp.month + 1, 1, tzinfo=timezone.utc)
+    return start, stop
+
+
+def ensure_partitions(cn, stamps):
+    """create the monthly partitions of the archive tables
+    needed to hold tasks finished at the given `stamps`
+    """
+    for start, stop in sorted({_month_bounds(stamp) for stamp in stamps}):
+        suffix = start.strftime('%Y%m')
+        for table in ('task_archive', 'log_archive'):
+            cn.execute(
+                f'create table if not exists rework.{table}_{suffix} '
+                f'partition of rework.{table} '
+                f'for values from (%(start)s) to (%(stop)s)',
+                start=start,
+                stop=stop
+            )
+
+
+def archive_batch(engine, before, batchsize=1000):
+    """move at most `batchsize` finished tasks (with their logs) which
+    finished before `before` into the archive
+
+    Returns the number of archived tasks.
+    """
+    with engine.begin() as cn:
+        rows = cn.execute(
+            'select id, finished from rework.task '
+            "where status = 'done' and finished < %(before)s "
+            'order by id '
+            'limit %(batchsize)s '
+            'for update skip locked',
+            before=before,
+            batchsize=batchsize
+        ).fetchall()
+        if not rows:
+            return 0
+
+        ids = [row.id for row in rows]
+        ensure_partitions(cn, [row.finished for row in rows])
+        cn.execute(
+            'insert into rework.log_archive (id, task, tstamp, line, finished) '
+            'select l.id, l.task, l.tstamp, l.line, t.finished '
+            'from rework.log as l, rework.task as t '
+            'where l.task = t.id and t.id = any(%(ids)s)',
+            ids=ids
+        )
+        columns = ', '.join(TASKCOLUMNS)
+        cn.execute(
+            f'insert into rework.task_archive ({columns}) '
+            f'select {columns} from rework.task '
+            'where id = any(%(ids)s)',
+            ids=ids
+        )
+        # the logs go away through the cascading foreign key
+        cn.execute(
+            'delete from rework.task where id = any(%(ids)s)',
+            ids=ids
+        )
+    return len(ids)
+
+
+def archive(engine, before, batchsize=1000, maxbatches=None):
+    """move the finished tasks older than `before` into the archive,
+    in batches of `batchsize` tasks (one transaction per batch)
+
+    Returns the total number of archived tasks.
+    """
+    total = 0
+    batches = 0
+    while maxbatches is None or batches < maxbatches:
+        count = archive_batch(engine, before, batchsize)
+        if not count:
+            break
+        total += count
+        batches += 1
+    return total
+
+
+def archived_maxid(cn):
+    " the highest task id in the archive (0 if it is empty) "
+    return select('max(id)').table(
+        'rework.task_archive'
+    ).do(cn).scalar() or 0
+
+
+def archived_task(engine, tid):
+    " the archived task row (None if it is not in the archive) "
+    return select(
+        'id', 'operation', 'status', 'traceback', 'abort',
+        'input', 'output', 'metadata'
+    ).table('rework.task_archive'
+    ).where(id=tid
+    ).do(engine).fetchone()
+
+
+def archived_logs(engine, tid, fromid=None):
+    q = select('id', 'line').table('rework.log_archive').where(
+        task=tid
+    )
+    if fromid:
+        q.where('id > %(fromid)s', fromid=fromid)
+
+    q.order('id')
+    with engine.begin() as cn:
+        return q.do(cn).fetchall()
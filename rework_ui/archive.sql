@@ -0,0 +1,30 @@
+-- archive of the finished tasks and their logs (one partition per month)
+
+create table if not exists {ns}.task_archive (
+  id integer not null,
+  operation int not null,
+  queued timestamptz,
+  started timestamptz,
+  finished timestamptz not null,
+  input bytea,
+  output bytea,
+  traceback text,
+  worker int,
+  status {ns}.status,
+  abort bool not null default false,
+  metadata jsonb,
+  primary key (id, finished)
+) partition by range (finished);
+
+create index if not exists ix_{ns}_task_archive_operation on {ns}.task_archive (operation);
+
+
+create table if not exists {ns}.log_archive (
+  id integer not null,
+  task integer not null,
+  tstamp integer not null,
+  line text not null,
+  finished timestamptz not null
+) partition by range (finished);
+
+create index if not exists ix_{ns}_log_archive_task on {ns}.log_archive (task, id);
@@ -0,0 +1,89 @@
+"""Fingerprinted static assets (the .br copies need the brotli extra)"""
+
+import gzip
+import hashlib
+import json
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional
+    brotli = None
+
+
+STATIC_DIR = Path(__file__).parent / 'rui_static'
+MANIFEST = 'manifest.json'
+ASSETS = (
+    'rework_ui_elm.js',
+    'logview.js',
+    'info.js',
+    'style.css'
+)
+ENCODINGS = (
+    ('br', '.br'),
+    ('gzip', '.gz')
+)
+
+
+def hashed_name(name, content):
+    stem, ext = name.rsplit('.', 1)
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    return f'{stem}.{digest}.{ext}'
+
+
+def fingerprint(staticdir=STATIC_DIR, names=ASSETS):
+    """write the fingerprinted (and precompressed) copies of the
+    existing assets and their manifest
+
+    Returns the manifest.
+    """
+    staticdir = Path(staticdir)
+    # forget the previous build
+    for old in manifest(staticdir).values():
+        for suffix in ('', '.gz', '.br'):
+            path = staticdir / f'{old}{suffix}'
+            if path.exists():
+                path.unlink()
+
+    mapping = {}
+    for name in names:
+        path = staticdir / name
+        if not path.exists():
+            continue
+        content = path.read_bytes()
+        hashed = hashed_name(name, content)
+        (staticdir / hashed).write_bytes(content)
+        (staticdir / f'{hashed}.gz').write_bytes(
+            gzip.compress(content, compresslevel=9, mtime=0)
+        )
+        if brotli is not None:
+            (staticdir / f'{hashed}.br').write_bytes(
+                brotli.compress(content)
+            )
+        mapping[name] = hashed
+
+    (staticdir / MANIFEST).write_text(
+        json.dumps(mapping, indent=2, sort_keys=True)
+    )
+    return mapping
+
+
+def manifest(staticdir=STATIC_DIR):
+    path = Path(staticdir) / MANIFEST
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())
+
+
+def negotiate(staticdir, hashed, accept_encodings):
+    """return the (path, encoding) of the best variant of a
+    fingerprinted asset given the accepted encodings
+    """
+    staticdir = Path(staticdir)
+    for encoding, suffix in ENCODINGS:
+        if not accept_encodings[encoding]:
+            continue
+        path = staticdir / f'{hashed}{suffix}'
+        if path.exists():
+            return path, encoding
+    return staticdir / hashed, None
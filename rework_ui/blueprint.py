@@ -1,41 +1,35 @@
 import io
 import json
-import pickle
+import math
+import hashlib
 import mimetypes
 from datetime import (
     datetime,
     timedelta
 )
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, wraps
+import threading
+import time
 
-import tzlocal
 from flask import (
     abort,
     Blueprint,
-    jsonify,
     make_response,
     request,
     render_template,
+    Response,
     send_file,
     url_for
 )
 import werkzeug
-from icron import croniter_range
-
-from pygments import highlight
-from pygments.lexers import PythonTracebackLexer
-from pygments.formatters import HtmlFormatter
 
 from sqlhelp import select, update
-from rework import api
-from icron import croniter
 
 from rework.helper import (
     convert_io,
     filterio,
     iospec,
-    unpack_io,
-    unpack_iofiles_length,
-    unpack_iofile,
     utcnow
 )
 from rework.task import (
@@ -43,14 +37,54 @@ from rework.task import (
     Task
 )
 
+from rework_ui import (
+    assets,
+    cron,
+    export,
+    forecast,
+    health,
+    preview,
+    profiler,
+    taskio,
+    timeline
+)
+from rework_ui.singleflight import singleflight
+from rework_ui.archive import (
+    archived_logs,
+    archived_task
+)
 from rework_ui.helper import argsdict
+from rework_ui.serialize import dumper, localzone
+
+
+# upload limits (in bytes)
+MAXFILESIZE = 50 * 2**20
+MAXREQUESTSIZE = 100 * 2**20
 
 
-TZ = tzlocal.get_localzone()
+def __getattr__(name):
+    # the former `TZ` constant (see rework_ui.serialize.localzone)
+    if name == 'TZ':
+        return localzone()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def jsonresponder(jsonbackend='auto'):
+    " a `jsonresponse(obj, status=200)` serializing with `jsonbackend` "
+    dumps = dumper(jsonbackend)
+
+    def jsonresponse(obj, status=200):
+        return make_response(
+            dumps(obj),
+            status,
+            {'content-type': 'application/json'}
+        )
+
+    return jsonresponse
 
 
 def homeurl():
-    homeurl = url_for('reworkui.home')
+    homeurl = url_for('.home')
     baseurl = homeurl[:homeurl.rindex('/')]
     if len(baseurl):
         return baseurl
@@ -64,39 +98,332 @@ def getjob(engine, jobid):
         return None
 
 
+def getarchivedjob(engine, jobid):
+    if not str(jobid).isdigit():
+        return None
+    return archived_task(engine, int(jobid))
+
+
 def task_formatinput(spec, input):
-    if input is None:
-        return ''
-    if spec is None:
-        inp = pickle.loads(input)
+    " a bounded preview: the input is never fully deserialized "
+    return preview.preview(spec, input)
+
+
+# the table only shows the last line of the tracebacks (the
+# full text is served by /task-traceback/<tid>)
+EXCERPT_LENGTH = 200
+TRACEBACK_EXCERPT = (
+    r"left(substring(rtrim(t.traceback, E' \n\r\t') from '[^\n]*$'), "
+    f"{EXCERPT_LENGTH}) as traceback"
+)
+
+
+def tasks_query(table, domain):
+    q = select(
+        't.id', 'op.name', 't.status', 'op.domain',
+        't.operation', 't.traceback is not null as failed',
+        TRACEBACK_EXCERPT, 't.abort',
+        't.queued', 't.started', 't.finished',
+        't.metadata', 't.worker',
+        f'left(w.deathinfo, {EXCERPT_LENGTH}) as deathinfo',
+        'op.inputs', 't.input'
+    ).table(f'{table} as t'
+    ).join('rework.operation as op on (op.id = t.operation)'
+    ).join('rework.worker as w on (w.id = t.worker)', jtype='left outer')
+    if domain != 'all':
+        q.where('op.domain = %(domain)s', domain=domain)
+    return q
+
+
+def workers_query(domain):
+    q = select(
+        'id', 'host', 'domain', 'pid', 'mem', 'cpu',
+        'shutdown', 'kill', 'debugport', 'started'
+    ).table('rework.worker'
+    ).where('running = true'
+    ).order('id')
+    if domain != 'all':
+        q.where(domain=domain)
+    return q
+
+
+def monitors_query(domain):
+    q = select(
+        'id', 'domain', 'lastseen', 'options'
+    ).table('rework.monitor')
+    if domain != 'all':
+        q.where(domain=domain)
+    return q
+
+
+def workers_data(engine, domain):
+    workers = workers_query(domain).do(engine).fetchall()
+    monitors = {
+        row.domain: row
+        for row in monitors_query(domain).do(engine).fetchall()
+    }
+    now = utcnow().astimezone(localzone())
+    domains_list = []
+    for domain, row in sorted(monitors.items()):
+        domains_list.append({
+            'id': row.id,
+            'domain': row.domain,
+            'delta': (now - row.lastseen).total_seconds(),
+            'lastseen': row.lastseen,
+            'options': sorted(row.options.items())
+        })
+
+    workers_list = []
+    for wid, host, domain, pid, mem, cpu, shutdown, kill, debugport, started in workers:
+        workers_list.append({
+            'wid': wid,
+            'host':host,
+            'pid': pid,
+            'domain': domain,
+            'mem': mem,
+            'cpu': cpu,
+            'debugport': debugport,
+            'started': started,
+            'button': {
+                'kill': kill,
+                'shutdown': shutdown
+            }
+        })
+    return {
+        'domains': domains_list,
+        'workers': workers_list
+    }
+
+
+def queue_query(domain):
+    """queued tasks count and oldest queued date per domain and operation
+    (an index only scan of the partial index on the queued tasks)
+    """
+    q = select(
+        'op.domain', 'op.name as operation',
+        'count(*) as queued', 'min(t.queued) as oldest',
+        'extract(epoch from now() - min(t.queued))::float as age'
+    ).table('rework.task as t'
+    ).join('rework.operation as op on (op.id = t.operation)'
+    ).where("t.status = 'queued'"
+    ).group(('op.domain', 'op.name')
+    ).order('op.domain, op.name')
+    if domain != 'all':
+        q.where('op.domain = %(domain)s', domain=domain)
+    return q
+
+
+def queue_data(engine, domain):
+    return [
+        dict(row)
+        for row in queue_query(domain).do(engine).fetchall()
+    ]
+
+
+def _metriclabel(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def queue_metrics(rows):
+    " the queue depth in the prometheus text format "
+    out = [
+        '# HELP rework_queue_depth Number of queued tasks.',
+        '# TYPE rework_queue_depth gauge'
+    ]
+    labels = [
+        f'domain="{_metriclabel(row["domain"])}",'
+        f'operation="{_metriclabel(row["operation"])}"'
+        for row in rows
+    ]
+    for label, row in zip(labels, rows):
+        out.append(f'rework_queue_depth{{{label}}} {row["queued"]}')
+    out += [
+        '# HELP rework_queue_oldest_age_seconds '
+        'Time waited by the oldest queued task.',
+        '# TYPE rework_queue_oldest_age_seconds gauge'
+    ]
+    for label, row in zip(labels, rows):
+        out.append(
+            f'rework_queue_oldest_age_seconds{{{label}}} {float(row["age"]):.3f}'
+        )
+    return '\n'.join(out) + '\n'
+
+
+def services_query(domain):
+    q = select(
+        'id', 'host', 'name', 'path', 'domain'
+    ).table('rework.operation'
+    ).order('domain, name', 'asc')
+    if domain != 'all':
+        q.where(domain=domain)
+    return q
+
+
+def schedulers_query():
+    return select(
+        'sched.id', 'op.name', 'sched.domain', 'sched.host', 'rule',
+        'op.inputs', 'inputdata'
+    ).table('rework.sched as sched', 'rework.operation as op'
+    ).where('sched.operation = op.id'
+    ).order('sched.domain, op.name', 'asc')
+
+
+def events_query(fromid, toid=None, domain=None, operation=None):
+    q = select(
+        'id', 'action', 'taskid'
+    ).table('rework.events'
+    ).where('id > %(eid)s', eid=fromid
+    ).order('id')
+    if toid is not None:
+        q.where('id <= %(toid)s', toid=toid)
+    if domain and domain != 'all':
+        q.where(domain=domain)
+    if operation:
+        q.where(operation=operation)
+    return q
+
+
+# the tables without a change counter (they are written on rework hot
+# path): a cheap fingerprint of their contents stands for their version
+DERIVED_VERSIONS = {
+    'worker': select(
+        'max(id)', 'count(*)'
+    ).table('rework.worker').where('running'),
+    'monitor': select(
+        'max(id)', 'count(*)'
+    ).table('rework.monitor')
+}
+
+
+def tables_version(cn, tables):
+    versions = dict(
+        select(
+            'tablename', 'version'
+        ).table('rework.uiversion'
+        ).where('tablename in %(tables)s', tables=tuple(tables)
+        ).do(cn).fetchall()
+    )
+    for table in tables:
+        if table in DERIVED_VERSIONS:
+            versions[table] = tuple(DERIVED_VERSIONS[table].do(cn).fetchone())
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+def tables_idle(cn, tables):
+    " seconds since the last change of the `tables` (None if never) "
+    return select(
+        'extract(epoch from now() - max(changed))'
+    ).table('rework.uiversion'
+    ).where('tablename in %(tables)s', tables=tuple(tables)
+    ).do(cn).scalar()
+
+
+def events_idle(cn):
+    " seconds since the last task event (None if none is left) "
+    return select(
+        'extract(epoch from now() - max(tstamp))'
+    ).table('rework.events'
+    ).do(cn).scalar()
+
+
+def poll_interval(idle, load, base=1000, ceiling=20000):
+    """suggested delay (in ms) before the next poll of a client
+
+    It grows with the time (`idle`, in seconds) since the polled data
+    last changed and with the number of requests the server is
+    handling (`load`). No data yet (`idle` is None) is no sign of
+    idleness: the data may come any time.
+    """
+    if idle is None:
+        delay = base
     else:
-        inp = unpack_io(spec, input)
+        delay = max(base, float(idle) * 100)
+    delay *= 1 + load // 8
+    return int(min(delay, ceiling))
+
 
-    return format_input(inp)
+class gauge:
+    " a thread-safe count of the requests in flight "
 
+    def __init__(self):
+        self.value = 0
+        self.lock = threading.Lock()
 
-def format_input(inp):
-    if isinstance(inp, dict):
-        newinp = {}
-        for key, val in inp.items():
-            if isinstance(val, bytes):
-                val = f'<{round(len(val)/1024,2)} kb file>'
+    def incr(self):
+        with self.lock:
+            self.value += 1
+
+    def decr(self):
+        with self.lock:
+            self.value -= 1
+
+
+def maybetz(dt):
+    if dt is None:
+        return None
+    return dt.astimezone(localzone()).strftime('%Y-%m-%d %H:%M:%S%z')
+
+
+def task_row(row):
+    return {
+        'tid': row.id,
+        'name' : row.name,
+        'status': row.status,
+        'abort': row.abort,
+        'domain': row.domain,
+        'operation': row.operation,
+        'queued': row.queued,
+        'started': row.started,
+        'finished': row.finished,
+        'metadata': row.metadata,
+        'worker': row.worker,
+        'deathinfo': row.deathinfo,
+        'failed': row.failed,
+        'traceback': row.traceback,
+        'input': task_formatinput(row.inputs, row.input)
+    }
+
+
+def compact_tasks(rows, dictcolumns=('name', 'domain', 'status'),
+                  sparsecolumns=('started', 'finished', 'metadata', 'worker',
+                                 'deathinfo', 'traceback', 'input')):
+    """columnar version of the tasks table rows:
+    * one array per column,
+    * dictionary-encoded strings for the `dictcolumns`,
+    * (indexes, values) arrays leaving the nulls out for the `sparsecolumns`
+    """
+    dicts = {name: {} for name in dictcolumns}
+    columns = {}
+    sparse = {name: ([], []) for name in sparsecolumns}
+    for idx, row in enumerate(rows):
+        for key, val in row.items():
+            if key in sparse:
+                if val is not None:
+                    sparse[key][0].append(idx)
+                    sparse[key][1].append(val)
+            elif key in dicts:
+                codes = dicts[key]
+                columns.setdefault(key, []).append(
+                    codes.setdefault(val, len(codes))
+                )
             else:
-                val = str(val)
-            newinp[key] = val
-        inp = newinp
+                columns.setdefault(key, []).append(val)
 
-    return str(inp)
+    return {
+        'size': len(rows),
+        'dicts': {name: list(codes) for name, codes in dicts.items()},
+        'columns': columns,
+        'sparse': sparse
+    }
 
 
 def iter_stamps_from_cronrules(rulemap, start, stop):
     for rule, *stuff in rulemap:
-        for stamp in croniter_range(start, stop, rule):
-            yield stamp, *stuff
+        for stamp in cron.fires(rule, start, stop):
+            yield datetime.fromtimestamp(stamp, localzone()), *stuff
 
 
 def schedule_plan(engine, delta, domain=None):
-    tz = tzlocal.get_localzone()
     q = select(
         's.rule', 'op.name', 'op.inputs', 's.inputdata', 's.domain'
     ).table('rework.sched as s', 'rework.operation as op'
@@ -104,7 +431,7 @@ def schedule_plan(engine, delta, domain=None):
     if domain:
         q.where('s.domain = %(domain)s', domain=domain)
     out = q.do(engine).fetchall()
-    now = datetime.now(tz)
+    now = datetime.now(localzone())
 
     for stamp, op, spec, inputdata, domain in sorted(
             iter_stamps_from_cronrules(
@@ -132,6 +459,8 @@ def _schedule_job(engine,
     if user is None:
         abort(400, 'user parameter is mandatory')
 
+    # the scheduling api (and the monitor it brings) loads on first use
+    from rework import api
     hostid = args.hostid or api.host()
     domain = args.domain
     metadata = {'user': user}
@@ -147,7 +476,7 @@ def _schedule_job(engine,
                             metadata=metadata)
     except Exception as err:
         abort(400, str(err))
-    return json.dumps(task.tid)
+    return task.tid
 
 
 def alldomains(engine):
@@ -162,12 +491,6 @@ def initialdomain(domains):
     return 'all' if len(domains) > 1 else domains and domains[0] or 'default'
 
 
-def maybetz(dt):
-    if dt is None:
-        return None
-    return dt.astimezone(TZ).strftime('%Y-%m-%d %H:%M:%S%z')
-
-
 def none_as_empty_str(alist):
     return [
         elt if elt is not None else ""
@@ -198,7 +521,13 @@ def build_menu_links():
 def reworkui(engine,
              serviceactions=None,
              alttemplate=None,
-             has_permission=lambda perm: True):
+             has_permission=lambda perm: True,
+             jsonbackend='auto',
+             maxfilesize=MAXFILESIZE,
+             maxrequestsize=MAXREQUESTSIZE,
+             readengine=None,
+             coalescewindow=0,
+             readythresholds=None):
 
     bp = Blueprint(
         'reworkui',
@@ -207,38 +536,192 @@ def reworkui(engine,
         static_folder='rui_static',
     )
 
+    jsonresponse = jsonresponder(jsonbackend)
+    # the read-only views (polled by the dashboards) can be served
+    # by a replica, while the writes go to the primary `engine`
+    reader = readengine or engine
+
+    load = gauge()
+
+    @bp.before_request
+    def enter():
+        load.incr()
+
+    @bp.teardown_request
+    def leave(exc):
+        load.decr()
+
+    def pollhint(response, idle):
+        " tell the client when to come back "
+        response.headers['X-Poll-Interval'] = str(
+            poll_interval(idle, load.value)
+        )
+        return response
+
+    def readable(func):
+        """check the read permission, before the `versioned` and
+        `coalesced` wrappers (which must come below it) do anything
+        """
+        @wraps(func)
+        def checked(*args, **kw):
+            if not has_permission('read'):
+                abort(403, 'Nothing to see there.')
+            return func(*args, **kw)
+
+        return checked
+
+    def versioned(*tables, period=None):
+        """answer 304 (before running the actual query) when the client
+        already holds the current version of the `tables` contents
+
+        With a `period` (in seconds) the version also moves with the
+        clock, for the views depending on the current time.
+        """
+        def decorator(func):
+            @wraps(func)
+            def conditional(*args, **kw):
+                with reader.begin() as cn:
+                    versions = tables_version(cn, tables)
+                    idle = tables_idle(cn, tables)
+                clock = period and int(time.time()) // period
+                etag = hashlib.sha1(
+                    repr((request.full_path, versions, clock)).encode('utf-8')
+                ).hexdigest()
+                if etag in request.if_none_match:
+                    response = make_response('', 304)
+                else:
+                    response = make_response(func(*args, **kw))
+                response.set_etag(etag)
+                # always revalidate
+                response.headers['Cache-Control'] = 'no-cache'
+                return pollhint(response, idle)
+
+            return conditional
+
+        return decorator
+
+    flights = singleflight(window=coalescewindow)
+
+    # (task id, direction) -> io manifest
+    iomanifests = taskio.manifestcache()
+
+    def coalesced(func):
+        """share one computation (and its serialized response) between
+        the concurrent identical requests, and the ones coming within
+        `coalescewindow` seconds
+        """
+        @wraps(func)
+        def shared(*args, **kw):
+            def compute():
+                response = make_response(func(*args, **kw))
+                return (
+                    response.get_data(),
+                    response.status_code,
+                    list(response.headers.items())
+                )
+
+            key = (
+                request.path,
+                tuple(sorted(request.args.items(multi=True)))
+            )
+            return make_response(*flights.do(key, compute))
+
+        return shared
+
+    # logical name -> fingerprinted name
+    fingerprinted = assets.manifest(assets.STATIC_DIR)
+    servable = set(fingerprinted.values())
+
+    @bp.context_processor
+    def asset_urls():
+
+        def asset(name):
+            if name in fingerprinted:
+                return url_for('.asset', filename=fingerprinted[name])
+            return url_for('.static', filename=name)
+
+        return {'asset': asset}
+
+    @bp.route('/assets/<filename>')
+    def asset(filename):
+        if filename not in servable:
+            abort(404, 'no such asset')
+
+        path, encoding = assets.negotiate(
+            assets.STATIC_DIR,
+            filename,
+            request.accept_encodings
+        )
+        response = send_file(
+            path,
+            mimetype=mimetypes.guess_type(filename)[0],
+            download_name=filename,
+            conditional=True
+        )
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
     @bp.route('/canwrite')
     def canwrite():
         role = request.environ.get('ROLE')
-        return jsonify(role in ('admin', 'rw'))
+        return jsonresponse(role in ('admin', 'rw'))
+
+    def uploaded_files():
+        """return the contents of the uploaded files
+
+        The form parser spools them to temporary files: their sizes are
+        checked against `maxfilesize` and `maxrequestsize` (answering
+        413, None meaning no limit) before they are read in memory.
+        They cannot be streamed further: rework packs the inputs of a
+        task into a single bytea value.
+        """
+        if (maxrequestsize is not None and
+            (request.content_length or 0) > maxrequestsize):
+            abort(413, f'request too large (max {maxrequestsize} bytes)')
+
+        files = {}
+        total = 0
+        for name, upload in argsdict(request.files).items():
+            if not upload:
+                continue
+            upload.stream.seek(0, io.SEEK_END)
+            size = upload.stream.tell()
+            upload.stream.seek(0)
+            if maxfilesize is not None and size > maxfilesize:
+                abort(
+                    413,
+                    f'file `{upload.filename}` too large '
+                    f'({size} bytes, max {maxfilesize})'
+                )
+            total += size
+            if maxrequestsize is not None and total > maxrequestsize:
+                abort(413, f'request too large (max {maxrequestsize} bytes)')
+            files[name] = upload.read()
+        return files
 
     @bp.route('/schedule-task/<service>', methods=['PUT'])
     def schedule_task(service):
         if not has_permission('schedule'):
-            return json.dumps(-1)
+            return jsonresponse(-1)
 
+        inputfile = uploaded_files().get('input_file')
         args = argsdict()
         args.update(argsdict(request.form))
         args.update(argsdict(request.args))
-        fileargs = argsdict(request.files)
-
-        if fileargs.input_file is None:
-            inputfile = None
-        else:
-            inputfile = fileargs.input_file.read()
 
-        return _schedule_job(engine,
-                             service,
-                             args,
-                             inputfile)
+        return jsonresponse(
+            _schedule_job(engine,
+                          service,
+                          args,
+                          inputfile)
+        )
 
     @bp.route('/schedule2/<service>', methods=['PUT'])
     def schedule2(service):
-        args = {
-            k: v.read()
-            for k, v in argsdict(request.files).items()
-            if v
-        }
+        args = uploaded_files()
         args.update(
             argsdict(request.form)
         )
@@ -252,6 +735,7 @@ def reworkui(engine,
         typed_args = convert_io(spec, args)
 
         try:
+            from rework import api
             task = api.schedule(
                 engine,
                 service,
@@ -262,41 +746,49 @@ def reworkui(engine,
             )
         except Exception as err:
             abort(400, str(err))
-        return json.dumps(task.tid)
+        return jsonresponse(task.tid)
 
     @bp.route('/relaunch-task/<int:tid>', methods=['PUT'])
     def relaunch_task(tid):
         if not has_permission('relaunch'):
-            return json.dumps(0)
+            return jsonresponse(0)
 
         t = Task.byid(engine, tid)
-        if t is None:
-            return json.dumps(0)
+        if t.operation is not None:
+            operation, rawinput, metadata = (
+                t.operation, t.raw_input, t.metadata
+            )
+        else:
+            archived = archived_task(engine, tid)
+            if archived is None:
+                abort(404, 'NO SUCH JOB')
+            operation, rawinput, metadata = (
+                archived.operation,
+                archived.input and bytes(archived.input),
+                archived.metadata
+            )
 
         op = select(
             'name', 'host', 'domain'
-        ).table(
-            'rework.operation'
-        ).join(
-            'rework.task as task on (task.operation = operation.id)'
-        ).where(
-            'task.id = %(tid)s', tid=t.tid
+        ).table('rework.operation'
+        ).where(id=operation
         ).do(engine).fetchone()
 
+        from rework import api
         newtask = api.schedule(
             engine,
             op.name,
-            rawinputdata=t.raw_input,
+            rawinputdata=rawinput,
             domain=op.domain,
             hostid=op.host,
-            metadata=t.metadata
+            metadata=metadata
         )
-        return json.dumps(newtask.tid)
+        return jsonresponse(newtask.tid)
 
     @bp.route('/launch-scheduled/<int:sid>', methods=['PUT'])
     def launch_scheduled(sid):
         if not has_permission('launch'):
-            return json.dumps(0)
+            return jsonresponse(0)
 
         q = select(
             'op.name', 's.domain', 's.inputdata', 's.host', 's.metadata',
@@ -305,6 +797,7 @@ def reworkui(engine,
         ).where('s.id = %(sid)s', sid=sid)
         sched = q.do(engine).fetchone()
 
+        from rework import api
         t = api.schedule(
             engine,
             sched[0],
@@ -314,20 +807,25 @@ def reworkui(engine,
             metadata=sched[4]
         )
 
-        return jsonify({'tid': t.tid})
+        return jsonresponse({'tid': t.tid})
 
     @bp.route('/job_input/<jobid>')
     def job_input(jobid):
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        job = getjob(engine, jobid)
-        if job is None:
-            abort(404, 'no such job')
+        job = getjob(reader, jobid)
+        if job is None or job.operation is None:
+            # not in the hot storage, maybe archived
+            archived = getarchivedjob(reader, jobid)
+            if archived is None:
+                abort(404, 'no such job')
+            payload = archived.input
+        else:
+            payload = job.raw_input
 
-        archive = job.raw_input
         return send_file(
-            io.BytesIO(archive),
+            io.BytesIO(payload),
             mimetype='application/octet-stream'
         )
 
@@ -336,9 +834,21 @@ def reworkui(engine,
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        job = getjob(engine, jobid)
-        if job is None:
-            abort(404, 'NO SUCH JOB')
+        job = getjob(reader, jobid)
+        if job is None or job.operation is None:
+            # not in the hot storage, maybe archived (hence done)
+            archived = getarchivedjob(reader, jobid)
+            if archived is None:
+                abort(404, 'NO SUCH JOB')
+            if archived.traceback:
+                return send_file(
+                    io.BytesIO(archived.traceback.encode('utf-8')),
+                    mimetype='text/plain'
+                )
+            return send_file(
+                io.BytesIO(archived.output or b''),
+                mimetype='application/octet-stream'
+            )
 
         if job.status != 'done':
             return make_response(
@@ -351,9 +861,9 @@ def reworkui(engine,
                 mimetype='text/plain'
             )
 
-        archive = job.raw_output
+        payload = job.raw_output
         return send_file(
-            io.BytesIO(archive),
+            io.BytesIO(payload),
             mimetype='application/octet-stream'
         )
 
@@ -362,35 +872,58 @@ def reworkui(engine,
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        job = getjob(engine, jobid)
+        job = getjob(reader, jobid)
 
         if job is None:
             abort(404, 'NO SUCH JOB')
 
-        return job.state
+        state = job.operation and job.state
+        if state is None:
+            archived = getarchivedjob(reader, jobid)
+            if archived is None:
+                abort(404, 'NO SUCH JOB')
+            state = _task_state(
+                archived.status, archived.abort, archived.traceback
+            )
+        return state
 
     @bp.route('/job_logslice/<jobid>')
     def job_logslice(jobid):
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        job = getjob(engine, jobid)
+        job = getjob(reader, jobid)
 
         if job is None:
             abort(404, 'job does not exists')
 
         args = sliceargs(request.args)
-        logs = job.logs(fromid=args.from_log_id)
-        return json.dumps([
-            [lid, line] for lid, line in logs
-        ])
+        if job.operation is None:
+            # not in the hot storage, maybe archived
+            logs = archived_logs(reader, job.tid, fromid=args.from_log_id)
+            # they won't change
+            idle = math.inf
+        else:
+            logs = job.logs(fromid=args.from_log_id)
+            with reader.begin() as cn:
+                idle = select(
+                    'extract(epoch from now()) - max(tstamp)'
+                ).table('rework.log'
+                ).where(task=job.tid
+                ).do(cn).scalar()
+        return pollhint(
+            jsonresponse([
+                [lid, line] for lid, line in logs
+            ]),
+            idle
+        )
 
     @bp.route('/list_jobs')
     def list_jobs():
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        with engine.begin() as cn:
+        with reader.begin() as cn:
             tsql = 'select id from rework.task order by id'
             jobids = cn.execute(tsql).fetchall()
             opsql = 'select id, name from rework.operation'
@@ -398,7 +931,7 @@ def reworkui(engine,
 
         output = []
         for jid, in jobids:
-            job = getjob(engine, jid)
+            job = getjob(reader, jid)
             stat = job.status
             if stat == 'done':
                 if job.traceback:
@@ -409,7 +942,22 @@ def reworkui(engine,
                 (jid, ops[job.operation], stat)
             )
 
-        return json.dumps(output)
+        archived = select(
+            't.id', 't.operation', 't.traceback is not null as failed', 't.abort'
+        ).table('rework.task_archive as t'
+        ).order('t.id'
+        ).do(reader).fetchall()
+        for jid, opid, failed, aborted in archived:
+            stat = 'done'
+            if failed:
+                stat = 'failed'
+            elif aborted:
+                stat = 'aborted'
+            output.append(
+                (jid, ops.get(opid), stat)
+            )
+
+        return jsonresponse(sorted(output))
 
     @bp.route('/shutdown-worker/<wid>')
     def shutdown_worker(wid):
@@ -420,7 +968,7 @@ def reworkui(engine,
             update('rework.worker').where(id=wid).values(
                 shutdown=True
             ).do(cn)
-        return json.dumps(True)
+        return jsonresponse(True)
 
     @bp.route('/kill-worker/<wid>')
     def kill_worker(wid):
@@ -431,79 +979,143 @@ def reworkui(engine,
             update('rework.worker').where(id=wid).values(
                 kill=True
             ).do(cn)
-        return json.dumps(True)
+        return jsonresponse(True)
+
+    @lru_cache(maxsize=1)
+    def defaultdomain():
+        # computed on first use rather than while building the blueprint
+        return initialdomain(alldomains(reader))
 
     class uiargsdict(argsdict):
         defaults = {
-            'domain': initialdomain(alldomains(engine))
+            'domain': defaultdomain
         }
 
     @bp.route('/workers-table-json')
+    @readable
+    @versioned('worker', 'monitor', period=5)
+    @coalesced
     def list_workers_json():
+        return jsonresponse(
+            workers_data(reader, uiargsdict(request.args).domain)
+        )
+
+    class timelineargs(uiargsdict):
+        defaults = dict(
+            uiargsdict.defaults,
+            width=1000
+        )
+        types = {
+            'width': int
+        }
+
+    @bp.route('/workers-timeline-json')
+    def workers_timeline_json():
+        """the tasks run by each worker between `start` and `stop`
+        (the last hour by default), merged to fit `width` pixels
+        """
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        # workers
-        q = select(
-            'id', 'host', 'domain', 'pid', 'mem', 'cpu',
-            'shutdown', 'kill', 'debugport', 'started'
-        ).table('rework.worker'
-        ).where('running = true'
-        ).order('id')
+        args = timelineargs(request.args)
+        try:
+            stop = (
+                datetime.fromisoformat(args.stop) if args.stop
+                else datetime.now(localzone())
+            )
+            start = (
+                datetime.fromisoformat(args.start) if args.start
+                else stop - timedelta(hours=1)
+            )
+        except ValueError as err:
+            abort(400, str(err))
+        # the naive dates are local
+        start, stop = (
+            stamp if stamp.tzinfo else stamp.replace(tzinfo=localzone())
+            for stamp in (start, stop)
+        )
+        if start >= stop:
+            abort(400, 'the start must precede the stop')
+        if not 0 < args.width <= 10000:
+            abort(400, 'the width is between 1 and 10000 pixels')
 
-        domain = uiargsdict(request.args).domain
-        if domain != 'all':
-            q.where(domain=domain)
+        return jsonresponse(
+            timeline.timeline(reader, start, stop, args.width, args.domain)
+        )
 
-        workers = q.do(engine).fetchall()
+    @bp.route('/queue-depth-json')
+    def queue_depth_json():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
 
-        # monitors
-        q = select(
-            'id', 'domain', 'lastseen', 'options'
-        ).table('rework.monitor')
-        if domain != 'all':
-            q.where(domain=domain)
-
-        monitors = {
-            row.domain: row
-            for row in q.do(engine).fetchall()
-        }
-        now = utcnow().astimezone(TZ)
-        domains_list = []
-        for domain, row in sorted(monitors.items()):
-            domains_list.append({
-                'id': row.id,
-                'domain': row.domain,
-                'delta': (now - row.lastseen).total_seconds(),
-                'lastseen': row.lastseen.astimezone(TZ).strftime('%Y-%m-%d %H:%M:%S%z'),
-                'options': sorted(row.options.items())
-            })
+        return jsonresponse(
+            queue_data(reader, uiargsdict(request.args).domain)
+        )
 
-        workers_list = []
-        for wid, host, domain, pid, mem, cpu, shutdown, kill, debugport, started in workers:
-            if started:
-                started = started.astimezone(TZ).strftime(
-                    '%Y-%m-%d %H:%M:%S%z'
-                )
-            workers_list.append({
-                'wid': wid,
-                'host':host,
-                'pid': pid,
-                'domain': domain,
-                'mem': mem,
-                'cpu': cpu,
-                'debugport': debugport,
-                'started': started,
-                'button': {
-                    'kill': kill,
-                    'shutdown': shutdown
-                }
-            })
-        return json.dumps(
+    @bp.route('/metrics')
+    def metrics():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        return make_response(
+            queue_metrics(queue_data(reader, 'all')),
+            200,
+            {'content-type': 'text/plain; version=0.0.4'}
+        )
+
+    # the probes are meant for the load balancers: no permission
+    # check, no template
+
+    @bp.route('/healthz')
+    def healthz():
+        response = jsonresponse({'status': 'ok'})
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    @bp.route('/readyz')
+    def readyz():
+        ready, checks = health.readiness(engine, reader, readythresholds)
+        response = jsonresponse(
             {
-                'domains': domains_list,
-                'workers': workers_list
-            }
+                'status': 'ready' if ready else 'unready',
+                'checks': checks
+            },
+            200 if ready else 503
+        )
+        response.headers['Cache-Control'] = 'no-store'
+        return response
+
+    class profileargs(argsdict):
+        defaults = {
+            'seconds': 5,
+            'rate': 100
+        }
+        types = {
+            'seconds': float,
+            'rate': int
+        }
+
+    @bp.route('/profile')
+    def profile():
+        """sample the stacks of the threads serving requests at `rate`
+        hertz for `seconds` and return them as flamegraph collapsed
+        stacks, prefixed with the request endpoints
+        """
+        if not has_permission('profile'):
+            abort(403, 'You cannot do that.')
+
+        args = profileargs(request.args)
+        if not 0 < args.seconds <= 60 or not 0 < args.rate <= 1000:
+            abort(400, 'at most 60 seconds, at most 1000 samples per second')
+        try:
+            counts = profiler.profile(args.seconds, args.rate)
+        except profiler.busy:
+            abort(409, 'a profile is already running')
+
+        return make_response(
+            profiler.collapsed(counts),
+            200,
+            {'content-type': 'text/plain'}
         )
 
     @bp.route('/delete-task/<tid>')
@@ -511,13 +1123,36 @@ def reworkui(engine,
         if not has_permission('delete'):
             abort(403, 'You cannot do that.')
 
+        if not tid.isdigit():
+            abort(404, 'NO SUCH JOB')
+
         with engine.begin() as cn:
-            cn.execute(
-                "delete from rework.task "
-                "where id = %(tid)s and status != 'running'",
+            status = cn.execute(
+                'select status from rework.task where id = %(tid)s '
+                'for update',
                 tid=tid
-            )
-        return json.dumps(True)
+            ).scalar()
+            if status == 'running':
+                abort(409, 'the task is running')
+            if status is not None:
+                cn.execute(
+                    'delete from rework.task where id = %(tid)s',
+                    tid=tid
+                )
+            else:
+                # the archived logs are not tied by a foreign key
+                deleted = cn.execute(
+                    'delete from rework.task_archive where id = %(tid)s',
+                    tid=tid
+                ).rowcount
+                if not deleted:
+                    abort(404, 'NO SUCH JOB')
+                cn.execute(
+                    'delete from rework.log_archive where task = %(tid)s',
+                    tid=tid
+                )
+        iomanifests.discard(int(tid))
+        return jsonresponse(True)
 
     @bp.route('/abort-task/<tid>')
     def abort_task(tid):
@@ -529,22 +1164,49 @@ def reworkui(engine,
             abort(404, 'NO SUCH JOB')
 
         if t.aborted:
-            return json.dumps(False)
+            return jsonresponse(False)
 
         t.abort()
-        return json.dumps(True)
+        return jsonresponse(True)
+
+    def task_traceback(taskid):
+        " the full traceback of a (possibly archived) task, or 404 "
+        with reader.begin() as cn:
+            for table in ('rework.task', 'rework.task_archive'):
+                row = select('traceback').table(table).where(
+                    id=taskid
+                ).do(cn).fetchone()
+                if row is not None:
+                    break
+        if row is None:
+            abort(404, 'job does not exists')
+        if row.traceback is None:
+            abort(404, 'job has no traceback')
+        return row.traceback
+
+    @bp.route('/task-traceback/<int:taskid>')
+    def task_traceback_text(taskid):
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        return make_response(
+            task_traceback(taskid),
+            200,
+            {'content-type': 'text/plain; charset=utf-8'}
+        )
 
     @bp.route('/taskerror/<int:taskid>')
     def taskerror(taskid):
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        job = getjob(engine, taskid)
-        if job is None:
-            abort(404, 'job does not exists')
+        # only this page needs pygments
+        from pygments import highlight
+        from pygments.lexers import PythonTracebackLexer
+        from pygments.formatters import HtmlFormatter
 
         formatter = HtmlFormatter()
-        traceback = highlight(job.traceback,
+        traceback = highlight(task_traceback(taskid),
                               PythonTracebackLexer(),
                               formatter)
         flags_menu = json.dumps(['/', 'monitor-tasks'])
@@ -566,66 +1228,88 @@ def reworkui(engine,
         }
 
     @bp.route('/tasks-table-json')
+    @readable
+    @coalesced
     def tasks_table():
-        if not has_permission('read'):
-            abort(403, 'Nothing to see there.')
-
         args = tasksargs(request.args)
-        with engine.begin() as cn:
-            q = select(
-                't.id', 'op.name', 't.status', 'op.domain',
-                't.operation', 't.traceback', 't.abort',
-                't.queued', 't.started', 't.finished',
-                't.metadata', 't.worker', 'w.deathinfo',
-                'op.inputs', 't.input'
-            ).table('rework.task as t'
-            ).join('rework.operation as op on (op.id = t.operation)'
-            ).join('rework.worker as w on (w.id = t.worker)', jtype='left outer')
-            if args.domain != 'all':
-                q.where('op.domain = %(domain)s', domain=args.domain)
+        with reader.begin() as cn:
+            q = tasks_query('rework.task', args.domain)
             # update
             if args.min and args.max:
-                transform = lambda x: x  # noqa
                 q.where('t.id >= %(minid)s', minid=args.min)
                 q.where('t.id <= %(maxid)s', maxid=args.max)
                 q.order('t.id')
-            # complete initial batch: the next highest 250
-            elif args.min:
-                transform = lambda x: list(reversed(x))  # noqa
-                q.where('t.id < %(minid)s', minid=args.min)
-                q.order('t.id', direction='desc')
-                q.limit(250)
+                rows = q.do(cn).fetchall()
             else:
-                # initial batch: the first highest 250
-                transform = lambda x: list(reversed(x))  # noqa
-                q.limit(250)
-                q.order('t.id', direction='desc')
-
-            out = transform(
-                [
-                    {'tid': row.id,
-                     'name' : row.name,
-                     'status': row.status,
-                     'abort': row.abort,
-                     'domain': row.domain,
-                     'operation': row.operation,
-                     'queued': maybetz(row.queued),
-                     'started': maybetz(row.started),
-                     'finished': maybetz(row.finished),
-                     'metadata': row.metadata,
-                     'worker': row.worker,
-                     'deathinfo': row.deathinfo,
-                     'traceback': row.traceback,
-                     'input': task_formatinput(row.inputs, row.input)
-                     }
-                    for row in q.do(cn).fetchall()
-                ]
-            )
+                # the tasks are archived by age, not by id: the hot
+                # and archived ids interleave, hence the highest 250
+                # are taken from both tables and merged
+                rows = []
+                for table in ('rework.task', 'rework.task_archive'):
+                    q = tasks_query(table, args.domain)
+                    # complete initial batch: the next highest 250
+                    if args.min:
+                        q.where('t.id < %(minid)s', minid=args.min)
+                    # initial batch: the first highest 250
+                    q.order('t.id', direction='desc')
+                    q.limit(250)
+                    rows += q.do(cn).fetchall()
+                rows = sorted(rows, key=lambda row: row.id)[-250:]
+
+            out = [
+                task_row(row)
+                for row in rows
+            ]
+
+        if args.format == 'compact':
+            out = compact_tasks(out)
+
+        return jsonresponse(out)
+
+    @bp.route('/tasks-export')
+    def tasks_export():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
 
-        return make_response(
-            json.dumps(out),
-            200,
-            {'content-type': 'application/json'}
+        args = uiargsdict(request.args)
+        fmt = args.format or 'ndjson'
+        if fmt not in export.FORMATS:
+            abort(400, f'unknown format `{fmt}`')
+        if fmt == 'parquet' and export.pyarrow() is None:
+            abort(400, 'the parquet format needs pyarrow')
+
+        columns = list(export.COLUMNS)
+        if args.columns:
+            columns = args.columns.split(',')
+        unknown = set(columns) - set(export.COLUMNS)
+        if unknown:
+            abort(400, f'unknown columns: {",".join(sorted(unknown))}')
+
+        if args.status and args.status not in export.STATUSES:
+            # before the response headers go out
+            abort(400, f'unknown status `{args.status}`')
+
+        try:
+            start = args.start and datetime.fromisoformat(args.start)
+            stop = args.stop and datetime.fromisoformat(args.stop)
+        except ValueError as err:
+            abort(400, str(err))
+
+        return Response(
+            export.stream(
+                reader,
+                fmt,
+                columns,
+                domain=args.domain,
+                operation=args.operation,
+                status=args.status or None,
+                start=start,
+                stop=stop
+            ),
+            mimetype=export.FORMATS[fmt],
+            headers={
+                'Content-Disposition': f'attachment; filename=tasks.{fmt}'
+            }
         )
 
     @bp.route('/tasklogs/<int:taskid>')
@@ -664,14 +1348,20 @@ def reworkui(engine,
 
     @bp.route('/info-for/<int:taskid>')
     def info_for(taskid):
-        res = select(
-            'status', 'abort', 'traceback',
-            'queued', 'started', 'finished',
-            'inputs', 'outputs'
-        ).table('rework.task as t', 'rework.operation as o'
-        ).where('t.id = %(taskid)s', taskid=taskid
-        ).where('o.id = t.operation'
-        ).do(engine).fetchone()
+        for table in ('rework.task', 'rework.task_archive'):
+            res = select(
+                'status', 'abort', 'traceback',
+                'queued', 'started', 'finished',
+                'inputs', 'outputs'
+            ).table(f'{table} as t', 'rework.operation as o'
+            ).where('t.id = %(taskid)s', taskid=taskid
+            ).where('o.id = t.operation'
+            ).do(reader).fetchone()
+            if res is not None:
+                break
+
+        if res is None:
+            abort(404, 'NO SUCH JOB')
 
         info = {
             'state': _task_state(
@@ -686,80 +1376,79 @@ def reworkui(engine,
             'outputspec': res.outputs or []
         }
 
-        return make_response(
-            json.dumps(info),
-            200,
-            {'content-type': 'application/json'}
-        )
+        return jsonresponse(info)
 
     def _io_payload(taskid, direction):
-        q = select(
-            direction
-        ).table(
-            'rework.task'
-        ).where(id=taskid)
-
-        return q.do(engine).scalar()
-
-    def _io_spec(taskid, direction):
-        return select(
-            f'{direction}s'
-        ).table(
-            'rework.task as t', 'rework.operation as o'
-        ).where(
-            't.id = %(taskid)s', taskid=taskid
-        ).where(
-            'o.id = t.operation'
-        ).do(engine).scalar()
+        for table in ('rework.task', 'rework.task_archive'):
+            payload = select(
+                direction
+            ).table(
+                table
+            ).where(id=taskid).do(reader).scalar()
+            if payload is not None:
+                return payload
+        return None
 
+    def _task_exists(taskid):
+        return reader.execute(
+            'select exists (select 1 from rework.task where id = %(tid)s) '
+            'or exists (select 1 from rework.task_archive where id = %(tid)s)',
+            tid=taskid
+        ).scalar()
+
+    def _io_manifest(taskid, direction):
+        """return the manifest of a task input or output (or None) and
+        the payload when it had to be fetched
+
+        The inputs and outputs of the done tasks no longer change: their
+        manifests are cached, and served as long as the task exists
+        (it can be deleted by another process).
+        """
+        key = (taskid, direction)
+        manifest = iomanifests.get(key)
+        if manifest is not None:
+            if _task_exists(taskid):
+                return manifest, None
+            iomanifests.discard(taskid)
+
+        for table in ('rework.task', 'rework.task_archive'):
+            res = select(
+                f't.{direction} as payload', f'o.{direction}s as spec',
+                't.status'
+            ).table(f'{table} as t'
+            ).join('rework.operation as o on (o.id = t.operation)'
+            ).where('t.id = %(taskid)s', taskid=taskid
+            ).do(reader).fetchone()
+            if res is not None:
+                break
+        if res is None or res.payload is None:
+            return None, None
+
+        manifest = taskio.manifest(res.spec, res.payload)
+        if res.status == 'done':
+            iomanifests.set(key, manifest)
+        return manifest, res.payload
 
     @bp.route('/read_io/<int:taskid>')
     def read_io(taskid):
         args = argsdict(request.args)
         assert args.direction in ('input', 'output')
 
-        payload = _io_payload(taskid, args.direction)
-        if payload is None:
-            return make_response(
-                json.dumps(None),
-                200,
-                {'content-type': 'application/json'}
-            )
-
-        spec = _io_spec(taskid, args.direction)
+        manifest, _ = _io_manifest(taskid, args.direction)
+        if manifest is None:
+            return jsonresponse(None)
 
-        out = unpack_io(
-            spec,
-            payload,
-            nofiles=True
-        )
-        return make_response(
-            json.dumps(
-                out
-            ),
-            200,
-            {'content-type': 'application/json'}
-        )
+        return jsonresponse(manifest['fields'])
 
     @bp.route('/getiofile_lengths/<int:taskid>')
     def getiofile_lengths(taskid):
         args = argsdict(request.args)
         assert args.direction in ('input', 'output')
-        payload = _io_payload(taskid, args.direction)
-        if payload is None:
-            return make_response(
-                json.dumps(None),
-                200,
-                {'content-type': 'application/json'}
-            )
+        manifest, _ = _io_manifest(taskid, args.direction)
+        if manifest is None:
+            return jsonresponse(None)
 
-        spec = _io_spec(taskid, args.direction)
-        out = unpack_iofiles_length(spec, payload)
-        return make_response(
-            out,
-            200,
-            {'content-type': 'application/json'}
-        )
+        return jsonresponse(manifest['lengths'])
 
 
     @bp.route('/getiofile/<int:taskid>')
@@ -767,16 +1456,19 @@ def reworkui(engine,
         args = argsdict(request.args)
         assert args.direction in ('input', 'output')
         fname = args['getfile']
-        payload = _io_payload(taskid, args.direction)
-        if payload is None:
-            return make_response(
-                json.dumps(None),
-                200,
-                {'content-type': 'application/json'}
-            )
+        manifest, payload = _io_manifest(taskid, args.direction)
+        if manifest is None:
+            return jsonresponse(None)
 
-        spec = _io_spec(taskid, args.direction)
-        contents = unpack_iofile(spec, payload, fname)
+        if payload is None:
+            payload = _io_payload(taskid, args.direction)
+            if payload is None:
+                # the task is gone since its manifest was cached
+                iomanifests.discard(taskid)
+                abort(404, 'NO SUCH JOB')
+        contents = taskio.iofile(manifest, payload, fname)
+        if contents is None:
+            abort(404, 'NO SUCH FILE')
         mimetype = mimetypes.guess_type(fname)[0]
         return make_response(
             contents,
@@ -793,39 +1485,23 @@ def reworkui(engine,
 
         out = {}
         for tid in args.taskid or ():
-            payload = _io_payload(tid, args.direction)
-            if payload is None:
+            manifest, _ = _io_manifest(tid, args.direction)
+            if manifest is None:
                 continue
-            spec = _io_spec(tid, args.direction)
-            flenths = unpack_iofiles_length(spec, payload)
+            flenths = manifest['lengths']
             if len(flenths) == 1:
                 # more than one: we won't provide the button
                 # instead, all files can be found in the Info page
                 out[tid] = list(flenths.keys())[0]
 
-        return make_response(
-            json.dumps(out),
-            200,
-            {'content-type': 'application/json'}
-        )
+        return jsonresponse(out)
 
     # services
 
-    @bp.route('/services-table-json')
-    def list_services_json():
-        if not has_permission('read'):
-            abort(403, 'Nothing to see there.')
-
-        args = uiargsdict(request.args)
-        q = select(
-            'id', 'host', 'name', 'path', 'domain'
-        ).table('rework.operation'
-        ).order('domain, name', 'asc')
-        if args.domain != 'all':
-            q.where(domain=args.domain)
-
+    def services_data(domain):
+        q = services_query(domain)
         out = []
-        for opid, host, name, path, domain in q.do(engine).fetchall():
+        for opid, host, name, path, domain in q.do(reader).fetchall():
             out.append({
                 'opid': opid,
                 'host': host,
@@ -833,89 +1509,103 @@ def reworkui(engine,
                 'path': path,
                 'domain': domain
             })
-        return make_response(
-            json.dumps(out),
-            200,
-            {'content-type': 'application/json'}
+        return out
+
+    @bp.route('/services-table-json')
+    @readable
+    @versioned('operation')
+    def list_services_json():
+        return jsonresponse(
+            services_data(uiargsdict(request.args).domain)
         )
 
     @bp.route('/launchers-table-json')
+    @readable
+    @versioned('operation')
     def launchers_table_json():
-        if not has_permission('read'):
-            abort(403, 'Nothing to see there.')
-
-        spec = iospec(engine)
-        return make_response(
-            json.dumps(spec),
-            200,
-            {'content-type': 'application/json'}
-        )
+        spec = iospec(reader)
+        return jsonresponse(spec)
 
     @bp.route('/plans-table-json')
+    @readable
+    @coalesced
     def plans_table_json():
-        if not has_permission('read'):
-            abort(403, 'Nothing to see there.')
-
         args = argsdict(request.args)
         hours = int(
             args.get('hours', 1)
         )
+        return jsonresponse(plans_data(hours))
 
-        plan = [
+    def plans_data(hours):
+        return [
             (id, stamp.isoformat(), op, inputdata, domain)
             for id, (stamp, op, inputdata, domain) in
             enumerate(
                 schedule_plan(
-                    engine,
+                    reader,
                     timedelta(hours=hours)
                 )
             )
         ]
-        return make_response(
-            json.dumps(plan),
-            200,
-            {'content-type': 'application/json'}
+
+    class forecastargs(uiargsdict):
+        defaults = dict(
+            uiargsdict.defaults,
+            hours=24,
+            interval=3600
         )
+        types = {
+            'hours': int,
+            'interval': int
+        }
 
-    @bp.route('/schedulers-table-json')
-    def schedulers_table_json():
+    @bp.route('/schedule-forecast')
+    def schedule_forecast():
+        """the expected load of the scheduled tasks per domain over
+        the next `hours`, in buckets of `interval` seconds
+        """
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        with engine.begin() as cn:
-            sql = (
-                'select sched.id, op.name, sched.domain, sched.host, rule, '
-                '       op.inputs, inputdata '
-                'from rework.sched as sched, rework.operation as op '
-                'where sched.operation = op.id '
-                'order by sched.domain, op.name asc'
+        args = forecastargs(request.args)
+        if args.interval < 60 or args.hours < 1:
+            abort(400, 'the interval is at least 60s and the horizon 1h')
+        if args.hours * 3600 // args.interval > 10000:
+            abort(400, 'too many buckets')
+
+        # aligned buckets
+        now = time.time()
+        start = datetime.fromtimestamp(now - now % args.interval, localzone())
+        return jsonresponse(
+            forecast.forecast(
+                reader, start, args.hours, args.interval, args.domain
             )
-            res = cn.execute(sql).fetchall()
-
-        return make_response(
-            json.dumps(
-                [
-                    [row.id,
-                     row.name,
-                     row.domain,
-                     row.host or "",
-                     row.rule,
-                     task_formatinput(row.inputs, row.inputdata)
-                    ]
-                    for row in res
-                ]
-            ),
-            200,
-            {'content-type': 'application/json'}
         )
 
+    def schedulers_data():
+        with reader.begin() as cn:
+            res = schedulers_query().do(cn).fetchall()
+
+        return [
+            [row.id,
+             row.name,
+             row.domain,
+             row.host or "",
+             row.rule,
+             task_formatinput(row.inputs, row.inputdata)
+            ]
+            for row in res
+        ]
+
+    @bp.route('/schedulers-table-json')
+    @readable
+    @versioned('sched', 'operation')
+    def schedulers_table_json():
+        return jsonresponse(schedulers_data())
+
     @bp.route('/prepare-schedule', methods=['PUT'])
     def prepare_schedule():
-        args = argsdict({
-            k: v.read()
-            for k, v in argsdict(request.files).items()
-            if v
-        })
+        args = argsdict(uploaded_files())
         args.update(
             argsdict(request.form)
         )
@@ -926,6 +1616,14 @@ def reworkui(engine,
         host = args.pop('host', None)
         operation, domain = args.pop('service').split(':')
         rule = args.pop('rule', None)
+        # usually already checked (and cached) while typing the rule
+        error = cron.check(rule or '')
+        if error:
+            return make_response(
+                error,
+                400,
+                {'content-type': 'application/json'}
+            )
         specs = iospec(engine)
         spec = filterio(specs, operation, domain, host)
         try:
@@ -938,6 +1636,7 @@ def reworkui(engine,
             )
 
         try:
+            from rework import api
             api.prepare(
                 engine,
                 opname=operation,
@@ -962,6 +1661,7 @@ def reworkui(engine,
 
     @bp.route('/unprepare/<int:sid>', methods=['DELETE'])
     def unprepare(sid):
+        from rework import api
         api.unprepare(engine, sid)
         return make_response('', 204)
 
@@ -969,50 +1669,216 @@ def reworkui(engine,
     def lasteventid():
         eid = select('max(id)').table(
             'rework.events'
-        ).do(engine).scalar() or 0
-        return json.dumps(eid)
+        ).do(reader).scalar() or 0
+        return jsonresponse(eid)
+
+    def events_data(fromid, domain=None, operation=None, toid=None):
+        """return the events following `fromid` (None if it is unknown)
+        up to `toid` (by default the last one) and the last event id
+        they account for
+
+        The filtered out events still move the last event id.
+        """
+        with reader.begin() as cn:
+            knownid = select('id').table(
+                'rework.events'
+            ).where(
+                id=fromid
+            ).do(cn).scalar()
+            if not knownid:
+                return None, None
+
+            lastid = toid or select('max(id)').table(
+                'rework.events'
+            ).do(cn).scalar()
+            q = events_query(fromid, lastid, domain, operation)
+            events = [
+                dict(item)
+                for item in q.do(cn).fetchall()
+            ]
+        return events, lastid
 
     @bp.route('/events/<int:fromid>')
     def events(fromid):
-        knownid = select('id').table(
-            'rework.events'
-        ).where(
-            id=fromid
-        ).do(engine).scalar()
-        if not knownid:
+        args = argsdict(request.args)
+        events, lastid = events_data(fromid, args.domain, args.operation)
+        if events is None:
             # this signals to the client
             # he is needs a full refresh
-            return 'null'
+            return jsonresponse(None)
+
+        response = jsonresponse(events)
+        response.headers['X-Last-Event-Id'] = str(lastid)
+        with reader.begin() as cn:
+            idle = events_idle(cn)
+        return pollhint(response, idle)
+
+    # section -> (tables, period, args, producer)
+    sections = {
+        'services': (
+            ('operation',), None, ('domain',),
+            lambda args: services_data(args.domain)
+        ),
+        'launchers': (
+            ('operation',), None, (),
+            lambda args: iospec(reader)
+        ),
+        'schedulers': (
+            ('sched', 'operation'), None, (),
+            lambda args: schedulers_data()
+        ),
+        'workers': (
+            ('worker', 'monitor'), 5, ('domain',),
+            lambda args: workers_data(reader, args.domain)
+        ),
+        # no change counter on the (busy) tasks table: the clock only
+        'queue': (
+            (), 5, ('domain',),
+            lambda args: queue_data(reader, args.domain)
+        ),
+        'plans': (
+            ('sched', 'operation'), 60, ('hours',),
+            lambda args: plans_data(int(args.hours or 1))
+        )
+    }
 
-        q = select(
-            'id', 'action', 'taskid'
-        ).table('rework.events'
-        ).where('id > %(eid)s', eid=fromid
-        ).order('id')
-
-        events = [
-            dict(item)
-            for item in q.do(engine).fetchall()
+    @bp.route('/snapshot', methods=['POST'])
+    def snapshot():
+        """return, for the requested sections, the current version
+        tokens and the contents of those the client does not hold yet
+
+        The payload looks like:
+        {"sections": ["workers", "events"],
+         "versions": {"workers": "<token>", "events": "<last event id>"},
+         "domain": "default"}
+        """
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        payload = request.get_json(force=True)
+        if not isinstance(payload, dict):
+            abort(400, 'a json object is expected')
+        args = uiargsdict(payload)
+        wanted = args.sections or []
+        if (not isinstance(wanted, list) or
+            not all(isinstance(name, str) for name in wanted)):
+            abort(400, 'sections must be a list of section names')
+        unknown = set(wanted) - set(sections) - {'events'}
+        if unknown:
+            abort(400, f'unknown sections: {", ".join(sorted(unknown))}')
+        known = args.versions or {}
+        if not isinstance(known, dict):
+            abort(400, 'versions must map section names to tokens')
+
+        # all the tokens in one round trip
+        tables = sorted({
+            table
+            for name in wanted if name in sections
+            for table in sections[name][0]
+        })
+        with reader.begin() as cn:
+            versions = dict(
+                zip(tables, tables_version(cn, tables))
+            ) if tables else {}
+            idles = [tables_idle(cn, tables)] if tables else []
+            lastevent = None
+            if 'events' in wanted:
+                lastevent = select('max(id)').table(
+                    'rework.events'
+                ).do(cn).scalar()
+                idles.append(events_idle(cn))
+
+        now = time.time()
+        tokens = {}
+        for name in wanted:
+            if name == 'events':
+                tokens[name] = str(lastevent or 0)
+                continue
+            deps, period, keys, _ = sections[name]
+            clock = period and int(now) // period
+            tokens[name] = hashlib.sha1(
+                repr((
+                    name,
+                    tuple(args.get(key) for key in keys),
+                    tuple(versions[table] for table in deps),
+                    clock
+                )).encode('utf-8')
+            ).hexdigest()
+
+        stale = [
+            name for name in wanted
+            if known.get(name) != tokens[name]
         ]
-        return json.dumps(
-            events
+
+        def produce(name):
+            if name == 'events':
+                fromid = known.get(name)
+                if fromid is None or not str(fromid).isdigit():
+                    return None
+                if int(fromid) == 0:
+                    # the client saw an empty events table
+                    q = events_query(0, lastevent, args.domain, args.operation)
+                    return [
+                        dict(item)
+                        for item in q.do(reader).fetchall()
+                    ]
+                return events_data(
+                    int(fromid), args.domain, args.operation, lastevent
+                )[0]
+            return sections[name][3](args)
+
+        # the stale sections are independent: fetch them concurrently
+        with ThreadPoolExecutor(max_workers=max(len(stale), 1)) as pool:
+            contents = dict(zip(stale, pool.map(produce, stale)))
+
+        # the most recently changed section sets the pace
+        idles = [idle for idle in idles if idle is not None]
+        return pollhint(
+            jsonresponse({
+                'versions': tokens,
+                'sections': contents
+            }),
+            min(idles) if idles else None
         )
 
     @bp.route('/test-cron-rule')
     def test_cron_rule():
         args = argsdict(request.args)
-        try:
-            assert croniter.is_valid(args.rule), 'bad rule'
-            return make_response('', 200)
-        except AssertionError as err:
-            return make_response(str(err), 200)
+        return make_response(cron.check(args.rule or '') or '', 200)
+
+    @bp.route('/test-cron-rules', methods=['POST'])
+    def test_cron_rules():
+        """check a batch of rules and give the next fire times
+        (in the local time zone) of the valid ones
+
+        The payload looks like:
+        {"rules": ["0 0 6 * * *", "nope"], "count": 5}
+        """
+        args = argsdict(request.get_json(force=True))
+        rules = args.rules or []
+        if not isinstance(rules, list) or len(rules) > 100:
+            abort(400, 'a list of at most 100 rules is expected')
+        count = 5 if args.count is None else args.count
+        if (not isinstance(count, int) or isinstance(count, bool) or
+            not 1 <= count <= 50):
+            abort(400, 'count must be an integer between 1 and 50')
+        now = datetime.now(localzone())
+        out = []
+        for rule in map(str, rules):
+            error = cron.check(rule)
+            out.append({
+                'rule': rule,
+                'error': error,
+                'next': [] if error else cron.next_fires(rule, now, count)
+            })
+        return jsonresponse(out)
 
     @bp.route('/')
     def home():
         if not has_permission('read'):
             abort(403, 'Nothing to see there.')
 
-        domains = alldomains(engine)
+        domains = alldomains(reader)
         flags_menu = json.dumps(['/', 'monitor-tasks'])
         url_style_menu_css, url_js_menu_elm = build_menu_links()
         return render_template(
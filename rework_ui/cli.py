@@ -1,23 +1,104 @@
+from datetime import timedelta
 from threading import Thread
-import webbrowser
 
 import click
 from sqlalchemy import create_engine
 
 from rework import schema as baseschema, helper
-from rework.helper import find_dburi
-from rework_ui.app import startapp
-from rework_ui import schema
+from rework.helper import find_dburi, utcnow
+from rework_ui import archive, schema
+
+# the web app (flask, the blueprints and their dependencies) is only
+# imported by the commands needing it: the others start faster
+
+
+def named_uri(spec, default=None):
+    """ `eu=postgres://...` -> ('eu', 'postgres://...')
+    (the db uris themselves may contain `=` in their query string)
+    """
+    name, sep, uri = spec.partition('=')
+    if sep and name.isidentifier():
+        return name, uri
+    return default, spec
 
 
 @click.command()
 @click.argument('db-uri')
-def view(db_uri):
+@click.option('--read-uri', help='read-only replica serving the views')
+@click.option('--pool-size', type=int, default=5)
+@click.option('--max-overflow', type=int, default=10)
+@click.option('--pool-timeout', type=int, default=30,
+              help='seconds to wait for a pooled connection')
+@click.option('--pool-recycle', type=int, default=-1,
+              help='max age (in seconds) of the pooled connections')
+@click.option('--pre-ping/--no-pre-ping', default=True,
+              help='check the pooled connections before use')
+@click.option('--source', 'sources', multiple=True,
+              help='another database, as <name>=<db-uri>, for a merged '
+                   'view of all the sources (the main one being named '
+                   'by a <name>= prefix of db-uri, or `main`)')
+@click.option('--source-timeout', type=float, default=5,
+              help='seconds to wait for each source of the merged view')
+@click.option('--max-file-size', type=int, default=50,
+              help='max size (in MB) of an uploaded file')
+@click.option('--max-request-size', type=int, default=100,
+              help='max size (in MB) of an upload request')
+@click.option('--coalesce-window', type=float, default=0,
+              help='seconds during which identical view requests share '
+                   'their response')
+@click.option('--ready-latency', type=float,
+              help='max round trip time (in seconds) of a ready database')
+@click.option('--ready-pool-usage', type=float,
+              help='max share of the pool connections in use when ready')
+@click.option('--ready-replica-lag', type=float,
+              help='max replay lag (in seconds) of a ready replica')
+def view(db_uri, read_uri=None, pool_size=5, max_overflow=10,
+         pool_timeout=30, pool_recycle=-1, pre_ping=True,
+         sources=(), source_timeout=5,
+         max_file_size=50, max_request_size=100, coalesce_window=0,
+         ready_latency=None, ready_pool_usage=None, ready_replica_lag=None):
     """monitor and control workers and tasks"""
+    import webbrowser
+    from rework_ui.app import startapp
+
     ipaddr = helper.host()
     port = 5679
+    readuri = read_uri and find_dburi(read_uri)
+    if not sources:
+        dburi = find_dburi(db_uri)
+    else:
+        mainname, uri = named_uri(db_uri, 'main')
+        dburi = {mainname: find_dburi(uri)}
+        for source in sources:
+            name, uri = named_uri(source)
+            if name is None:
+                raise click.BadParameter(
+                    f'{source} (expected <name>=<db-uri>)'
+                )
+            dburi[name] = find_dburi(uri)
+        readuri = {mainname: readuri} if readuri else None
     server = Thread(name='reworkui.webapp', target=startapp,
-                    kwargs={'host': ipaddr, 'port': port, 'dburi': find_dburi(db_uri)})
+                    kwargs={'host': ipaddr, 'port': port,
+                            'dburi': dburi,
+                            'readuri': readuri,
+                            'timeout': source_timeout,
+                            'maxfilesize': max_file_size * 2**20,
+                            'maxrequestsize': max_request_size * 2**20,
+                            'coalescewindow': coalesce_window,
+                            'readythresholds': {
+                                name: value
+                                for name, value in (
+                                    ('latency', ready_latency),
+                                    ('poolusage', ready_pool_usage),
+                                    ('replicalag', ready_replica_lag)
+                                )
+                                if value is not None
+                            },
+                            'poolsize': pool_size,
+                            'maxoverflow': max_overflow,
+                            'pooltimeout': pool_timeout,
+                            'poolrecycle': pool_recycle,
+                            'preping': pre_ping})
     server.daemon = True
     server.start()
 
@@ -33,8 +114,49 @@ def view(db_uri):
 
 @click.command(name='init-db')
 @click.argument('dburi')
-def init_db(dburi):
+@click.option('--upgrade', is_flag=True, default=False,
+              help='only install the missing indexes and triggers '
+                   'of an existing database')
+def init_db(dburi, upgrade=False):
     "initialize the database schema for rework in its own namespace"
     engine = create_engine(find_dburi(dburi))
+    if upgrade:
+        schema.upgrade(engine)
+        return
     baseschema.init(engine)
     schema.init(engine)
+
+
+@click.command(name='check-plans')
+@click.argument('dburi')
+@click.option('--domain', default='all')
+@click.option('--min-rows', type=int, default=10000,
+              help='tables smaller than this are allowed a sequential scan')
+def check_plans(dburi, domain='all', min_rows=10000):
+    "explain the ui queries and flag the sequential scans on large tables"
+    from rework_ui import explain
+
+    engine = create_engine(find_dburi(dburi))
+    flagged = explain.check_plans(engine, domain, min_rows)
+    for endpoint, table, rows in flagged:
+        print(f'{endpoint}: sequential scan on {table} (~{rows} rows)')
+    if not flagged:
+        print('no sequential scan on large tables')
+
+
+@click.command(name='archive-tasks')
+@click.argument('dburi')
+@click.option('--days', type=int, default=30,
+              help='retention (in days) of the finished tasks')
+@click.option('--batch-size', type=int, default=1000)
+@click.option('--max-batches', type=int)
+def archive_tasks(dburi, days=30, batch_size=1000, max_batches=None):
+    "move the finished tasks older than the retention into the archive"
+    engine = create_engine(find_dburi(dburi))
+    count = archive.archive(
+        engine,
+        utcnow() - timedelta(days=days),
+        batchsize=batch_size,
+        maxbatches=max_batches
+    )
+    print(f'archived {count} tasks')
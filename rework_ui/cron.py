@@ -0,0 +1,76 @@
+"""Cached validation, parsing and daily expansions of the scheduler rules"""
+
+from bisect import bisect_left
+from datetime import (
+    datetime,
+    time,
+    timedelta
+)
+from functools import lru_cache
+import threading
+
+from rework_ui.serialize import localzone
+
+
+@lru_cache(maxsize=4096)
+def check(rule):
+    " why `rule` is not a valid scheduler rule (None if it is valid) "
+    if rule.startswith('*'):
+        return '"every second" rule is forbidden'
+    from icron import croniter
+    if not croniter.is_valid(rule):
+        return 'bad rule'
+    return None
+
+
+@lru_cache(maxsize=1024)
+def _parsed(rule):
+    from icron import croniter
+    return croniter(rule)
+
+
+_parsedlock = threading.Lock()
+
+
+def next_fires(rule, start, count=5):
+    " the `count` next fire times of a valid `rule` after `start` "
+    # the parsed rules are stateful iterators
+    with _parsedlock:
+        it = _parsed(rule)
+        it.set_current(start)
+        return [
+            it.get_next(datetime)
+            for _ in range(count)
+        ]
+
+
+@lru_cache(maxsize=8192)
+def day_fires(rule, day):
+    " the fire times (timestamps) of `rule` during the local `day` "
+    from icron import croniter_range
+    tz = localzone()
+    start = datetime.combine(day, time(), tzinfo=tz)
+    stop = datetime.combine(day + timedelta(days=1), time(), tzinfo=tz)
+    end = stop.timestamp()
+    stamps = (
+        stamp.timestamp()
+        for stamp in croniter_range(start, stop, rule)
+    )
+    return tuple(
+        stamp for stamp in stamps
+        if stamp < end
+    )
+
+
+def fires(rule, start, stop):
+    " the sorted fire times (timestamps) of `rule` within [start, stop) "
+    day = start.astimezone(localzone()).date()
+    lastday = stop.astimezone(localzone()).date()
+    stamps = []
+    while day <= lastday:
+        stamps.extend(day_fires(rule, day))
+        day += timedelta(days=1)
+    return stamps[
+        bisect_left(stamps, start.timestamp()):
+        bisect_left(stamps, stop.timestamp())
+    ]
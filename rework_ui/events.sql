@@ -0,0 +1,33 @@
+-- the events carry the domain and operation of their task
+
+alter table {ns}.events add column if not exists domain text;
+alter table {ns}.events add column if not exists operation text;
+
+create index if not exists ix_{ns}_events_domain on {ns}.events (domain, id);
+
+
+create or replace function trace_events() returns trigger as $body$
+declare
+  taskid integer;
+  opid integer;
+  opdomain text;
+  opname text;
+begin
+ if (tg_op = 'UPDATE' or tg_op = 'DELETE') then
+   select into taskid, opid old.id, old.operation;
+ elsif (tg_op = 'INSERT') then
+   select into taskid, opid new.id, new.operation;
+ else
+   raise warning 'we missed something';
+   return null;
+ end if;
+ select into opdomain, opname op.domain, op.name
+ from {ns}.operation as op
+ where op.id = opid;
+ insert into {ns}.events (action, taskid, domain, operation)
+ values (substring(tg_op,1,1), taskid, opdomain, opname);
+ delete from {ns}.events where tstamp < (current_timestamp - interval '1 minute');
+ return null;
+end;
+$body$
+language plpgsql;
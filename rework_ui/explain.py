@@ -0,0 +1,90 @@
+from datetime import datetime, timezone
+import json
+
+from rework_ui.blueprint import (
+    events_query,
+    monitors_query,
+    queue_query,
+    schedulers_query,
+    services_query,
+    tasks_query,
+    workers_query
+)
+from rework_ui.timeline import timeline_query
+
+
+class explainer:
+    """an executor (for the sqlhelp queries `.do` method) which
+    yields the json query plan instead of running the query
+    """
+
+    def __init__(self, cn):
+        self.cn = cn
+
+    def execute(self, sql, kw=None):
+        return self.cn.execute(f'explain (verbose, format json) {sql}', kw or {})
+
+
+def ui_queries(domain):
+    " the (endpoint, query) pairs of the hot ui queries "
+    q = tasks_query('rework.task', domain)
+    q.order('t.id', direction='desc')
+    q.limit(250)
+    yield 'tasks-table-json', q
+
+    q = tasks_query('rework.task', domain)
+    q.where('t.id < %(minid)s', minid=1000)
+    q.order('t.id', direction='desc')
+    q.limit(250)
+    yield 'tasks-table-json (more)', q
+
+    q = tasks_query('rework.task', domain)
+    q.where('t.id >= %(minid)s', minid=1000)
+    q.where('t.id <= %(maxid)s', maxid=1100)
+    q.order('t.id')
+    yield 'tasks-table-json (update)', q
+
+    yield 'workers-table-json', workers_query(domain)
+    yield 'workers-table-json (monitors)', monitors_query(domain)
+    yield 'services-table-json', services_query(domain)
+    yield 'schedulers-table-json', schedulers_query()
+    yield 'events', events_query(0)
+    yield 'queue-depth-json', queue_query(domain)
+    yield 'workers-timeline-json', timeline_query(
+        datetime(2020, 1, 1, tzinfo=timezone.utc),
+        datetime(2020, 1, 2, tzinfo=timezone.utc),
+        domain
+    )
+
+
+def _seqscans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield f'{node["Schema"]}.{node["Relation Name"]}'
+    for sub in node.get('Plans', ()):
+        yield from _seqscans(sub)
+
+
+def check_plans(engine, domain='all', minrows=10000):
+    """explain the ui queries and return the (endpoint, table, rows)
+    triples of the sequential scans on tables having more than
+    `minrows` rows (as estimated by the planner statistics)
+    """
+    out = []
+    with engine.begin() as cn:
+        sizes = dict(
+            cn.execute(
+                'select n.nspname || \'.\' || c.relname, c.reltuples '
+                'from pg_class as c, pg_namespace as n '
+                'where c.relnamespace = n.oid'
+            ).fetchall()
+        )
+        for name, q in ui_queries(domain):
+            plan = q.do(explainer(cn)).scalar()
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            for table in _seqscans(plan[0]['Plan']):
+                # never analyzed tables have a -1 estimate
+                rows = max(int(sizes.get(table, 0)), 0)
+                if rows >= minrows:
+                    out.append((name, table, rows))
+    return out
@@ -0,0 +1,225 @@
+import csv
+import io
+import json
+from datetime import datetime
+from functools import lru_cache
+
+from sqlhelp import select
+
+
+@lru_cache(maxsize=None)
+def pyarrow():
+    """the (pyarrow, pyarrow.parquet) modules, imported on first use
+    (None when missing)
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:  # optional
+        return None
+    return pa, pq
+
+
+# name -> (sql expression, kind)
+COLUMNS = {
+    'tid': ('t.id', 'int'),
+    'operation': ('op.name', 'str'),
+    'domain': ('op.domain', 'str'),
+    'status': ('t.status', 'str'),
+    'abort': ('t.abort', 'bool'),
+    'failed': ('t.traceback is not null', 'bool'),
+    'queued': ('t.queued', 'stamp'),
+    'started': ('t.started', 'stamp'),
+    'finished': ('t.finished', 'stamp'),
+    'worker': ('t.worker', 'int'),
+    'metadata': ('t.metadata', 'json'),
+}
+
+# the task states one can filter on (as computed by rework's
+# _task_state: abort first, then traceback)
+STATES = {
+    'queued': ("t.status = 'queued'", 'not t.abort'),
+    'running': ("t.status = 'running'", 'not t.abort'),
+    'done': ("t.status = 'done'", 'not t.abort', 't.traceback is null'),
+    'failed': ("t.status = 'done'", 'not t.abort', 't.traceback is not null'),
+    'aborted': ("t.status = 'done'", 't.abort')
+}
+STATUSES = tuple(STATES)
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+    'parquet': 'application/vnd.apache.parquet'
+}
+
+
+def export_query(columns,
+                 domain=None,
+                 operation=None,
+                 status=None,
+                 start=None,
+                 stop=None,
+                 table='rework.task'):
+    if status is not None and status not in STATES:
+        raise ValueError(f'unknown status `{status}`')
+    q = select(*(
+        f'{COLUMNS[name][0]} as {name}'
+        for name in columns
+    )).table(f'{table} as t'
+    ).join('rework.operation as op on (op.id = t.operation)'
+    ).order('t.id')
+
+    if domain and domain != 'all':
+        q.where('op.domain = %(domain)s', domain=domain)
+    if operation:
+        q.where('op.name = %(operation)s', operation=operation)
+    if status:
+        q.where(*STATES[status])
+    if start:
+        q.where('t.queued >= %(start)s', start=start)
+    if stop:
+        q.where('t.queued < %(stop)s', stop=stop)
+    return q
+
+
+def reaches_archive(engine, start):
+    " tell whether archived tasks may have been queued after `start` "
+    if start is None:
+        return True
+    # the archived tasks were queued before they finished
+    return select('1').table('rework.task_archive').where(
+        'finished >= %(start)s', start=start
+    ).limit(1).do(engine).scalar() is not None
+
+
+def iter_batches(engine, queries, batchsize=1000):
+    " stream the queries results through a server-side cursor "
+    with engine.connect() as cn:
+        for q in queries:
+            result = q.do(cn.execution_options(stream_results=True))
+            while True:
+                rows = result.fetchmany(batchsize)
+                if not rows:
+                    break
+                yield rows
+
+
+def _jsonable(val):
+    if isinstance(val, datetime):
+        return val.isoformat()
+    return val
+
+
+def ndjson(columns, batches):
+    for rows in batches:
+        yield ''.join(
+            json.dumps(dict(zip(columns, map(_jsonable, row)))) + '\n'
+            for row in rows
+        )
+
+
+def _csvcell(val):
+    if isinstance(val, dict):
+        return json.dumps(val)
+    return _jsonable(val)
+
+
+def csvrows(columns, batches):
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(
+            [_csvcell(val) for val in row]
+            for row in rows
+        )
+        yield out.getvalue()
+        out.seek(0)
+        out.truncate()
+    # no rows at all
+    if out.tell():
+        yield out.getvalue()
+
+
+class _sink:
+    """a write-only file handing out what has been written so far
+    (parquet needs to know the absolute positions)
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.pos = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        self.chunks.append(data)
+        self.pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.pos
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def parquet(columns, batches):
+    pa, pq = pyarrow()
+    types = {
+        'int': pa.int64(),
+        'str': pa.string(),
+        'bool': pa.bool_(),
+        'stamp': pa.timestamp('us', tz='UTC'),
+        'json': pa.string()
+    }
+    schema = pa.schema([
+        (name, types[COLUMNS[name][1]])
+        for name in columns
+    ])
+    jsoncols = [
+        idx for idx, name in enumerate(columns)
+        if COLUMNS[name][1] == 'json'
+    ]
+    sink = _sink()
+    writer = pq.ParquetWriter(sink, schema)
+    for rows in batches:
+        data = [list(col) for col in zip(*rows)]
+        for idx in jsoncols:
+            data[idx] = [
+                None if val is None else json.dumps(val)
+                for val in data[idx]
+            ]
+        writer.write_table(
+            pa.Table.from_arrays(data, schema=schema)
+        )
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def stream(engine, fmt, columns, **filters):
+    """return a generator of the serialized chunks of the export
+
+    The archived tasks (if the range reaches back to them) come first.
+    """
+    assert fmt in FORMATS
+    queries = [export_query(columns, **filters)]
+    if reaches_archive(engine, filters.get('start')):
+        queries.insert(
+            0, export_query(columns, table='rework.task_archive', **filters)
+        )
+    batches = iter_batches(engine, queries)
+    if fmt == 'ndjson':
+        return ndjson(columns, batches)
+    if fmt == 'csv':
+        return csvrows(columns, batches)
+    return parquet(columns, batches)
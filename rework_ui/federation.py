@@ -0,0 +1,262 @@
+"""Merged views over several rework databases"""
+
+from concurrent.futures import (
+    ThreadPoolExecutor,
+    TimeoutError as FutureTimeout
+)
+import threading
+import time
+
+from flask import (
+    abort,
+    Blueprint,
+    render_template,
+    request
+)
+from sqlhelp import select
+
+from rework_ui.blueprint import (
+    events_query,
+    jsonresponder,
+    task_row,
+    tasks_query,
+    workers_data
+)
+from rework_ui.helper import argsdict
+
+
+class fanout:
+    """run a function of (source name, engine) against all the sources
+    concurrently
+
+    A source still busy with `maxinflight` calls (e.g. a stuck
+    database) is not handed more, so it cannot exhaust the shared
+    pool.
+    """
+
+    def __init__(self, engines, timeout=5, maxinflight=4):
+        self.engines = engines
+        if not isinstance(timeout, dict):
+            timeout = {name: timeout for name in engines}
+        self.timeouts = timeout
+        self.maxinflight = maxinflight
+        self.inflight = {name: 0 for name in engines}
+        self.lock = threading.Lock()
+        self.pool = ThreadPoolExecutor(
+            max_workers=max(len(engines), 1) * maxinflight,
+            thread_name_prefix='rework-fanout'
+        )
+
+    def _call(self, name, func):
+        try:
+            return func(name, self.engines[name])
+        finally:
+            with self.lock:
+                self.inflight[name] -= 1
+
+    def run(self, func):
+        """return the ({source: result}, {source: error}) of
+        `func(name, engine)` over the sources
+        """
+        start = time.monotonic()
+        futures = {}
+        errors = {}
+        for name in self.engines:
+            with self.lock:
+                busy = self.inflight[name] >= self.maxinflight
+                if not busy:
+                    self.inflight[name] += 1
+            if busy:
+                errors[name] = 'busy'
+                continue
+            futures[name] = self.pool.submit(self._call, name, func)
+
+        results = {}
+        for name, future in futures.items():
+            remaining = self.timeouts[name] - (time.monotonic() - start)
+            try:
+                results[name] = future.result(timeout=max(remaining, 0))
+            except FutureTimeout:
+                errors[name] = 'timeout'
+            except Exception as err:
+                errors[name] = str(err) or err.__class__.__name__
+        return results, errors
+
+
+def merge(results, key=None, reverse=False):
+    " the rows of all the sources, tagged with their source "
+    rows = [
+        dict(row, source=name)
+        for name, items in results.items()
+        for row in items
+    ]
+    if key:
+        rows.sort(key=key, reverse=reverse)
+    return rows
+
+
+def latest_tasks(engine, domain, limit):
+    q = tasks_query('rework.task', domain)
+    q.order('t.id', direction='desc')
+    q.limit(limit)
+    return [
+        task_row(row)
+        for row in q.do(engine).fetchall()
+    ]
+
+
+def events_since(engine, fromid, domain):
+    " the events after `fromid` (none without a cursor) and the last event id "
+    with engine.begin() as cn:
+        lastid = select('max(id)').table(
+            'rework.events'
+        ).do(cn).scalar() or 0
+        if fromid is None:
+            return [], lastid
+        q = events_query(fromid, lastid, domain)
+        return [dict(item) for item in q.do(cn).fetchall()], lastid
+
+
+def parse_cursors(spec):
+    " `eu:42,us:7` -> {'eu': 42, 'us': 7} "
+    cursors = {}
+    for item in (spec or '').split(','):
+        name, _, eid = item.partition(':')
+        if name and eid.isdigit():
+            cursors[name] = int(eid)
+    return cursors
+
+
+class federatedargs(argsdict):
+    defaults = {
+        'domain': 'all',
+        'limit': 250
+    }
+    types = {
+        'limit': int
+    }
+
+
+def federatedui(engines,
+                timeout=5,
+                has_permission=lambda perm: True,
+                jsonbackend='auto',
+                readengines=None):
+    """the merged views over the named `engines`
+
+    The `timeout` (in seconds) is either global or a mapping
+    of the source names to their own timeout.
+    """
+    bp = Blueprint(
+        'federatedui',
+        __name__,
+        template_folder='rui_templates'
+    )
+
+    readers = dict(engines)
+    readers.update(readengines or {})
+    sources = fanout(readers, timeout=timeout)
+    jsonresponse = jsonresponder(jsonbackend)
+
+    def workers(domain):
+        results, errors = sources.run(
+            lambda name, engine: workers_data(engine, domain)
+        )
+        return {
+            'domains': merge(
+                {name: res['domains'] for name, res in results.items()}
+            ),
+            'workers': merge(
+                {name: res['workers'] for name, res in results.items()}
+            ),
+            'errors': errors
+        }
+
+    def tasks(domain, limit):
+        results, errors = sources.run(
+            lambda name, engine: latest_tasks(engine, domain, limit)
+        )
+        return {
+            'tasks': merge(
+                results, key=lambda row: row['queued'], reverse=True
+            )[:limit],
+            'errors': errors
+        }
+
+    @bp.route('/federated/sources')
+    def federated_sources():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        return jsonresponse(list(engines))
+
+    @bp.route('/federated/workers-table-json')
+    def federated_workers():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        args = federatedargs(request.args)
+        return jsonresponse(workers(args.domain))
+
+    @bp.route('/federated/tasks-table-json')
+    def federated_tasks():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        args = federatedargs(request.args)
+        return jsonresponse(tasks(args.domain, args.limit))
+
+    @bp.route('/federated/events')
+    def federated_events():
+        """the events following the per-source cursors
+        (`?from=eu:42,us:7`) and the new cursors
+
+        A source without a cursor only gets its current last event id.
+        """
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        args = federatedargs(request.args)
+        cursors = parse_cursors(args['from'])
+        results, errors = sources.run(
+            lambda name, engine: events_since(
+                engine, cursors.get(name), args.domain
+            )
+        )
+        return jsonresponse({
+            'events': merge(
+                {name: res[0] for name, res in results.items()}
+            ),
+            'lastids': {
+                name: res[1] for name, res in results.items()
+            },
+            'errors': errors
+        })
+
+    @bp.route('/')
+    def federated_home():
+        if not has_permission('read'):
+            abort(403, 'Nothing to see there.')
+
+        args = federatedargs(request.args)
+        # one round to each source for both tables
+        results, errors = sources.run(
+            lambda name, engine: (
+                workers_data(engine, args.domain),
+                latest_tasks(engine, args.domain, args.limit)
+            )
+        )
+        return render_template(
+            'rui_federated.html',
+            sources=list(engines),
+            workers=merge(
+                {name: res[0]['workers'] for name, res in results.items()}
+            ),
+            tasks=merge(
+                {name: res[1] for name, res in results.items()},
+                key=lambda row: row['queued'], reverse=True
+            )[:args.limit],
+            errors=errors
+        )
+
+    return bp
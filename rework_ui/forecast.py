@@ -0,0 +1,126 @@
+"""Schedule load forecast"""
+
+from bisect import bisect_left
+from datetime import (
+    datetime,
+    timedelta
+)
+import threading
+import time
+
+from sqlhelp import select
+
+from rework_ui import cron
+from rework_ui.serialize import localzone
+
+
+# the means move slowly: a week of done tasks is aggregated at most
+# once per DURATIONS_TTL seconds (per engine)
+DURATIONS_TTL = 300
+_durations = {}
+_durationslock = threading.Lock()
+
+
+def mean_durations(engine, days=7, ttl=DURATIONS_TTL):
+    " operation id -> mean duration (in seconds) of its recent runs "
+    key = (engine, days)
+    now = time.monotonic()
+    with _durationslock:
+        cached = _durations.get(key)
+    if cached is not None and now - cached[0] < ttl:
+        return cached[1]
+
+    durations = dict(
+        select(
+            'operation',
+            'avg(extract(epoch from finished - started))::float'
+        ).table('rework.task'
+        ).where(
+            "status = 'done'",
+            'traceback is null',
+            'started is not null',
+            'finished > now() - %(history)s::interval',
+            history=f'{days} days'
+        ).group(('operation',)
+        ).do(engine).fetchall()
+    )
+    with _durationslock:
+        _durations[key] = (now, durations)
+    return durations
+
+
+def capacities(engine):
+    " domain -> max number of workers of its monitors "
+    capacity = {}
+    for domain, options in select(
+            'domain', 'options'
+    ).table('rework.monitor').do(engine).fetchall():
+        capacity[domain] = capacity.get(domain, 0) + (
+            (options or {}).get('maxworkers') or 0
+        )
+    return capacity
+
+
+def bucket_counts(stamps, edges):
+    " number of sorted `stamps` between each pair of consecutive `edges` "
+    positions = [bisect_left(stamps, edge) for edge in edges]
+    return [
+        high - low
+        for low, high in zip(positions, positions[1:])
+    ]
+
+
+def forecast(engine, start, hours, interval,
+             domain=None, defaultduration=60):
+    """per domain and bucket of `interval` seconds over the next `hours`:
+    the launches, the mean number of busy workers it takes (`load`),
+    the domain `capacity`, the work (in seconds) carried over to the
+    next bucket (`backlog`) and whether the bucket `saturated`
+
+    The operations without a recent history are assumed to run for
+    `defaultduration` seconds.
+    """
+    stop = start + timedelta(hours=hours)
+    nbuckets = -(-hours * 3600 // interval)
+    edges = [
+        start.timestamp() + idx * interval
+        for idx in range(nbuckets + 1)
+    ]
+    q = select(
+        's.rule', 's.domain', 's.operation'
+    ).table('rework.sched as s')
+    if domain and domain != 'all':
+        q.where('s.domain = %(domain)s', domain=domain)
+    scheds = q.do(engine).fetchall()
+    durations = mean_durations(engine)
+    capacity = capacities(engine)
+
+    launches = {}
+    work = {}
+    for rule, dom, opid in scheds:
+        counts = bucket_counts(cron.fires(rule, start, stop), edges)
+        duration = durations.get(opid, defaultduration)
+        domlaunches = launches.setdefault(dom, [0] * nbuckets)
+        domwork = work.setdefault(dom, [0.] * nbuckets)
+        for idx, count in enumerate(counts):
+            domlaunches[idx] += count
+            domwork[idx] += count * duration
+
+    out = []
+    for dom in sorted(launches):
+        workers = capacity.get(dom, 0)
+        available = workers * interval
+        backlog = 0.
+        for idx in range(nbuckets):
+            demand = backlog + work[dom][idx]
+            backlog = max(0., demand - available)
+            out.append({
+                'domain': dom,
+                'start': datetime.fromtimestamp(edges[idx], localzone()),
+                'launches': launches[dom][idx],
+                'load': round(demand / interval, 2),
+                'capacity': workers,
+                'backlog': round(backlog, 2),
+                'saturated': demand > available
+            })
+    return out
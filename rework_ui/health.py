@@ -0,0 +1,102 @@
+"""Readiness probes"""
+
+import time
+
+
+# the defaults of the readiness thresholds
+THRESHOLDS = {
+    # max share of the pool connections in use
+    'poolusage': .9,
+    # max round-trip time of `select 1` (in seconds)
+    'latency': .5,
+    # max replay lag of the read replica (in seconds)
+    'replicalag': 60
+}
+
+
+def pool_status(engine):
+    " the pool usage (None for the pools without a fixed capacity) "
+    pool = engine.pool
+    if not hasattr(pool, 'checkedout'):
+        return None
+    overflow = getattr(pool, '_max_overflow', 0)
+    if overflow < 0:  # unbounded
+        return None
+    return {
+        'inuse': pool.checkedout(),
+        'capacity': pool.size() + overflow
+    }
+
+
+def round_trip(cn):
+    " the time (in seconds) of a trivial query "
+    start = time.perf_counter()
+    cn.execute('select 1').scalar()
+    return time.perf_counter() - start
+
+
+def replay_lag(cn):
+    " the replay lag (in seconds) of a replica (None on a primary) "
+    return cn.execute(
+        'select case when pg_is_in_recovery() '
+        'then coalesce('
+        '  extract(epoch from now() - pg_last_xact_replay_timestamp()), 0'
+        ')::float end'
+    ).scalar()
+
+
+def probe(engine, thresholds, replica=False):
+    " the checks of one database "
+    checks = {}
+    status = pool_status(engine)
+    if status is not None:
+        usage = status['inuse'] / max(status['capacity'], 1)
+        checks['pool'] = dict(
+            status,
+            threshold=thresholds['poolusage'],
+            ok=usage < thresholds['poolusage']
+        )
+        if status['inuse'] >= status['capacity']:
+            # the query would wait for a connection
+            return checks
+
+    try:
+        with engine.connect() as cn:
+            latency = round_trip(cn)
+            lag = replay_lag(cn) if replica else None
+    except Exception as err:
+        checks['latency'] = {
+            'error': str(err).strip() or err.__class__.__name__,
+            'ok': False
+        }
+        return checks
+
+    checks['latency'] = {
+        'seconds': latency,
+        'threshold': thresholds['latency'],
+        'ok': latency < thresholds['latency']
+    }
+    if lag is not None:
+        checks['replicalag'] = {
+            'seconds': lag,
+            'threshold': thresholds['replicalag'],
+            'ok': lag < thresholds['replicalag']
+        }
+    return checks
+
+
+def readiness(engine, readengine=None, thresholds=None):
+    """return a (ready, checks) tuple
+
+    The `thresholds` override the THRESHOLDS items.
+    """
+    thresholds = dict(THRESHOLDS, **(thresholds or {}))
+    checks = {'primary': probe(engine, thresholds)}
+    if readengine is not None and readengine is not engine:
+        checks['replica'] = probe(readengine, thresholds, replica=True)
+    ready = all(
+        check['ok']
+        for dbchecks in checks.values()
+        for check in dbchecks.values()
+    )
+    return ready, checks
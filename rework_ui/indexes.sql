@@ -0,0 +1,25 @@
+-- indexes serving the ui queries (see schema.create_indexes)
+
+-- domain filter and join of the tasks table
+create index concurrently if not exists ix_{ns}_operation_domain on {ns}.operation (domain, id);
+create index concurrently if not exists ix_{ns}_task_operation_id on {ns}.task (operation, id desc);
+
+-- running workers
+create index concurrently if not exists ix_{ns}_worker_running_domain on {ns}.worker (domain, id)
+  where running;
+
+-- schedulers table and schedule plan
+create index concurrently if not exists ix_{ns}_sched_domain on {ns}.sched (domain, operation);
+
+-- queue depth: index only scans over the queued tasks
+create index concurrently if not exists ix_{ns}_task_queued on {ns}.task (operation, queued)
+  where status = 'queued';
+
+-- workers timeline: the tasks overlapping a time window
+create index concurrently if not exists ix_{ns}_task_span on {ns}.task
+  using gist (tstzrange(
+    started,
+    case when finished < started then started else finished end,
+    '[]'
+  ))
+  where started is not null;
@@ -0,0 +1,301 @@
+"""Bounded previews of the task inputs (nothing is unpickled)"""
+
+import io
+import pickletools
+import struct
+import time
+
+import pyzstd as zstd
+from rework.io import _iobase
+
+
+MAXBYTES = 16 * 1024
+MAXTIME = .002
+MAXCHARS = 1000
+ELLIPSIS = '…'
+
+
+def format_input(inp):
+    if isinstance(inp, dict):
+        newinp = {}
+        for key, val in inp.items():
+            if isinstance(val, bytes):
+                val = f'<{round(len(val)/1024,2)} kb file>'
+            else:
+                val = str(val)
+            newinp[key] = val
+        inp = newinp
+
+    return str(inp)
+
+
+class _budget:
+
+    def __init__(self, maxtime):
+        self.deadline = time.thread_time() + maxtime
+
+    @property
+    def exhausted(self):
+        return time.thread_time() > self.deadline
+
+
+# packed io
+
+def _filelength(size):
+    return f'<{round(size/1024,2)} kb file>'
+
+
+def preview_io(spec, payload, maxbytes=MAXBYTES, maxtime=MAXTIME):
+    """return a (dict of formatted values, truncated) tuple
+    for a packed io payload
+    """
+    budget = _budget(maxtime)
+    raw = zstd.ZstdDecompressor().decompress(
+        bytes(payload), max_length=maxbytes
+    )
+    if len(raw) < 4:
+        return {}, True
+    [count] = struct.unpack('!L', raw[:4])
+    offset = 4 + count * 4
+    if offset > len(raw):
+        return {}, True
+    sizes = struct.unpack(f'!{"L" * count}', raw[4:offset])
+
+    positions = []
+    for size in sizes:
+        positions.append((offset, size))
+        offset += size
+    middle = len(positions) // 2
+
+    fields = {field['name']: field for field in spec}
+    out = {}
+    truncated = False
+    for (noffset, nsize), (voffset, vsize) in zip(
+            positions[:middle], positions[middle:]):
+        if noffset + nsize > len(raw) or budget.exhausted:
+            truncated = True
+            break
+        name = raw[noffset:noffset + nsize].decode('utf-8')
+        field = fields.get(name)
+        if field is None or field['type'] == 'file':
+            out[name] = _filelength(vsize)
+            continue
+        if voffset + vsize > len(raw):
+            out[name] = ELLIPSIS
+            truncated = True
+            continue
+        value = raw[voffset:voffset + vsize]
+        if field['type'] == 'moment':
+            # show the expression rather than evaluating it
+            out[name] = value.decode('utf-8')
+            continue
+        inp = _iobase.from_type(
+            field['type'], name, field['required'], field['choices'], None
+        )
+        out[name] = str(inp.binary_decode({name: value}))
+
+    if not truncated:
+        # the defaults, as unpack_io would provide them
+        for name, field in fields.items():
+            if name in out or field['type'] == 'file':
+                continue
+            inp = _iobase.from_type(
+                field['type'], name, field['required'], field['choices'],
+                field.get('default')
+            )
+            if inp.default is not None:
+                out[name] = str(inp.default)
+
+    return out, truncated
+
+
+# pickles
+
+class _opaque:
+    " stands for an object the preview will not build "
+
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'<{self.name}>'
+
+    __str__ = __repr__
+
+
+_MARK = object()
+
+_SCALARS = {
+    'NONE': lambda arg: None,
+    'NEWTRUE': lambda arg: True,
+    'NEWFALSE': lambda arg: False,
+}
+
+_CONTAINERS = {
+    'EMPTY_DICT': dict,
+    'EMPTY_LIST': list,
+    'EMPTY_TUPLE': tuple,
+    'EMPTY_SET': list,
+}
+
+_MEMOIZE = ('PUT', 'BINPUT', 'LONG_BINPUT')
+_GET = ('GET', 'BINGET', 'LONG_BINGET')
+_CALLS = ('REDUCE', 'NEWOBJ', 'NEWOBJ_EX', 'OBJ', 'INST')
+
+
+def _popmark(stack):
+    idx = len(stack) - 1
+    while stack[idx] is not _MARK:
+        idx -= 1
+    items = stack[idx + 1:]
+    del stack[idx:]
+    return items
+
+
+def _additems(target, items):
+    if isinstance(target, dict):
+        for key, val in zip(items[::2], items[1::2]):
+            try:
+                target[key] = val
+            except TypeError:  # unhashable key
+                target[repr(key)] = val
+    elif isinstance(target, list):
+        target.extend(items)
+
+
+def _setitems(stack, items):
+    if stack:
+        _additems(stack[-1], items)
+
+
+def _step(stack, memo, name, arg):
+    if name in ('PROTO', 'FRAME', 'STOP'):
+        return
+    if name in _SCALARS:
+        stack.append(_SCALARS[name](arg))
+    elif name in _CONTAINERS:
+        stack.append(_CONTAINERS[name]())
+    elif name == 'MARK':
+        stack.append(_MARK)
+    elif name == 'MEMOIZE':
+        memo[len(memo)] = stack[-1]
+    elif name in _MEMOIZE:
+        memo[arg] = stack[-1]
+    elif name in _GET:
+        stack.append(memo[arg])
+    elif name in ('DICT', 'LIST', 'TUPLE', 'FROZENSET'):
+        items = _popmark(stack)
+        if name == 'DICT':
+            target = {}
+            _additems(target, items)
+            stack.append(target)
+        elif name == 'TUPLE':
+            stack.append(tuple(items))
+        else:
+            stack.append(items)
+    elif name in ('TUPLE1', 'TUPLE2', 'TUPLE3'):
+        size = int(name[-1])
+        items = tuple(stack[-size:])
+        del stack[-size:]
+        stack.append(items)
+    elif name in ('APPEND', 'SETITEM'):
+        size = 1 if name == 'APPEND' else 2
+        items = stack[-size:]
+        del stack[-size:]
+        _setitems(stack, items)
+    elif name in ('APPENDS', 'SETITEMS', 'ADDITEMS'):
+        items = _popmark(stack)
+        _setitems(stack, items)
+    elif name == 'GLOBAL':
+        stack.append(_opaque(arg.replace(' ', '.')))
+    elif name == 'STACK_GLOBAL':
+        module, qualname = stack[-2:]
+        del stack[-2:]
+        stack.append(_opaque(f'{module}.{qualname}'))
+    elif name in _CALLS:
+        if name in ('OBJ', 'INST'):
+            items = _popmark(stack)
+            callable = items[0] if name == 'OBJ' else _opaque(
+                arg.replace(' ', '.')
+            )
+            stack.append(callable)
+        else:
+            args = stack.pop()
+            if name == 'NEWOBJ_EX':
+                args = stack.pop()
+            callable = stack.pop()
+            if (name == 'REDUCE' and repr(callable) == '<_codecs.encode>'
+                    and args and isinstance(args[0], str)):
+                # how the protocols < 3 spell the bytes
+                stack.append(args[0].encode('latin-1'))
+            else:
+                stack.append(callable)
+    elif name == 'BUILD':
+        stack.pop()
+    elif name in ('PERSID', 'BINPERSID'):
+        if name == 'BINPERSID':
+            stack.pop()
+        stack.append(_opaque('persistent'))
+    elif name == 'POP':
+        stack.pop()
+    elif name == 'POP_MARK':
+        _popmark(stack)
+    elif name == 'DUP':
+        stack.append(stack[-1])
+    elif name.startswith('EXT'):
+        stack.append(_opaque(f'extension {arg}'))
+    elif isinstance(arg, (str, bytes, int, float)):
+        # strings, bytes, ints, floats
+        stack.append(arg)
+    else:
+        raise ValueError(f'unsupported opcode {name}')
+
+
+def _fold(stack):
+    " close the pending marks of an interrupted scan "
+    while _MARK in stack:
+        items = _popmark(stack)
+        _setitems(stack, items)
+    if not stack:
+        return None
+    # a single SETITEM or APPEND was still pending
+    _additems(stack[0], stack[1:])
+    return stack[0]
+
+
+def preview_pickle(payload, maxbytes=MAXBYTES, maxtime=MAXTIME):
+    """return a (shallow image of the pickled object, truncated) tuple
+    without unpickling it
+    """
+    budget = _budget(maxtime)
+    data = bytes(payload[:maxbytes])
+    stack = []
+    memo = {}
+    try:
+        for opcode, arg, pos in pickletools.genops(io.BytesIO(data)):
+            if budget.exhausted:
+                return _fold(stack), True
+            _step(stack, memo, opcode.name, arg)
+            if opcode.name == 'STOP':
+                return _fold(stack), False
+    except (ValueError, IndexError, KeyError, TypeError):
+        # truncated payload or something we do not follow
+        pass
+    return _fold(stack), True
+
+
+def preview(spec, payload,
+            maxbytes=MAXBYTES, maxtime=MAXTIME, maxchars=MAXCHARS):
+    " a bounded textual summary of a task input "
+    if payload is None:
+        return ''
+    if spec is None:
+        inp, truncated = preview_pickle(payload, maxbytes, maxtime)
+    else:
+        inp, truncated = preview_io(spec, payload, maxbytes, maxtime)
+    text = format_input(inp)
+    if truncated:
+        text = f'{text} {ELLIPSIS}'
+    if len(text) > maxchars:
+        text = text[:maxchars] + ELLIPSIS
+    return text
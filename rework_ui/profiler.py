@@ -0,0 +1,91 @@
+"""On-demand sampling profiler"""
+
+from collections import Counter
+import sys
+import threading
+import time
+
+
+# the flask frame setting up the request context
+ENTRY = 'wsgi_app'
+
+# one profile at a time
+_running = threading.Lock()
+
+
+class busy(Exception):
+    " another profile is running "
+
+
+def _endpoint(frame):
+    ctx = frame.f_locals.get('ctx')
+    rule = getattr(getattr(ctx, 'request', None), 'url_rule', None)
+    return rule.endpoint if rule is not None else '<unrouted>'
+
+
+def _label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f'{module}:{code.co_name}'
+
+
+def request_stack(frame):
+    """the (endpoint, frames labels) of a request-serving thread stack
+    (None for the other threads)
+    """
+    frames = []
+    while frame is not None:
+        if frame.f_code.co_name == ENTRY:
+            frames.reverse()
+            return _endpoint(frame), frames
+        frames.append(_label(frame))
+        frame = frame.f_back
+    return None
+
+
+def sample(counts, ignore=()):
+    " count the current stacks of the request-serving threads "
+    for ident, frame in sys._current_frames().items():
+        if ident in ignore:
+            continue
+        stack = request_stack(frame)
+        if stack is None:
+            continue
+        endpoint, frames = stack
+        counts[';'.join([endpoint] + frames)] += 1
+
+
+def profile(seconds, rate):
+    """sample `rate` times per second during `seconds` and return
+    the stack counts
+
+    Raises `busy` when a profile is already running.
+    """
+    if not _running.acquire(blocking=False):
+        raise busy()
+    try:
+        counts = Counter()
+        # the profiling request does not profile itself
+        ignore = {threading.get_ident()}
+        period = 1 / rate
+        deadline = time.monotonic() + seconds
+        nextsample = time.monotonic()
+        while nextsample < deadline:
+            sample(counts, ignore)
+            # a late sample delays the next ones rather than
+            # bunching them up
+            nextsample = max(nextsample + period, time.monotonic())
+            delay = nextsample - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+        return counts
+    finally:
+        _running.release()
+
+
+def collapsed(counts):
+    " the flamegraph collapsed stacks text "
+    return ''.join(
+        f'{stack} {count}\n'
+        for stack, count in sorted(counts.items())
+    )
@@ -1,12 +1,63 @@
 from pathlib import Path
+import re
 
 from sqlhelp import sqlfile
 
 
 SCHEMAFILE = Path(__file__).parent / 'schema.sql'
+# idempotent, hence usable to upgrade an existing database
+UPGRADEFILES = (
+    Path(__file__).parent / 'archive.sql',
+    Path(__file__).parent / 'versions.sql',
+    Path(__file__).parent / 'events.sql'
+)
+# built concurrently, outside of any transaction
+INDEXFILE = Path(__file__).parent / 'indexes.sql'
 
 
 def init(engine):
     sql = sqlfile(SCHEMAFILE, ns='rework')
     with engine.begin() as cn:
         cn.execute(sql)
+    upgrade(engine)
+
+
+def upgrade(engine):
+    """install the (missing) archive tables, ui indexes, change counters
+    and event columns
+    """
+    with engine.begin() as cn:
+        for path in UPGRADEFILES:
+            cn.execute(sqlfile(path, ns='rework'))
+    create_indexes(engine)
+
+
+def create_indexes(engine):
+    """build the (missing) ui indexes without blocking the writes to
+    the indexed tables
+    """
+    statements = [
+        statement.strip()
+        for statement in sqlfile(INDEXFILE, ns='rework').split(';')
+        if statement.strip()
+    ]
+    names = [
+        re.search(r'if not exists (\w+)', statement).group(1)
+        for statement in statements
+    ]
+    # `create index concurrently` cannot run in a transaction
+    autocommit = engine.execution_options(isolation_level='AUTOCOMMIT')
+    with autocommit.connect() as cn:
+        # an interrupted build leaves an invalid index behind
+        invalid = cn.execute(
+            'select c.relname from pg_index as i '
+            'join pg_class as c on (c.oid = i.indexrelid) '
+            'join pg_namespace as n on (n.oid = c.relnamespace) '
+            "where n.nspname = 'rework' and not i.indisvalid "
+            'and c.relname = any(%(names)s)',
+            names=names
+        ).fetchall()
+        for name, in invalid:
+            cn.execute(f'drop index concurrently rework.{name}')
+        for statement in statements:
+            cn.execute(statement)
@@ -32,3 +32,4 @@ language plpgsql;
 create trigger trace_events
 after insert or update or delete on {ns}.task
 for each row execute procedure trace_events();
+
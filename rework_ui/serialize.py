@@ -0,0 +1,59 @@
+import json
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import orjson
+except ImportError:  # optional
+    orjson = None
+
+
+@lru_cache(maxsize=None)
+def localzone():
+    " the local timezone (looked up once, on first use) "
+    import tzlocal
+    return tzlocal.get_localzone()
+
+
+def __getattr__(name):
+    # the former `TZ` constant
+    if name == 'TZ':
+        return localzone()
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def _default(obj):
+    if isinstance(obj, datetime):
+        return obj.astimezone(localzone()).strftime('%Y-%m-%d %H:%M:%S%z')
+    if isinstance(obj, (bytes, memoryview)):
+        return bytes(obj).decode('utf-8', errors='replace')
+    raise TypeError(f'{type(obj).__name__} is not json serializable')
+
+
+def dumper(backend='auto'):
+    """return a `dumps` function (python object -> json bytes) for the
+    given backend: `json` (the stdlib), `orjson` or `auto` (orjson
+    when it is installed)
+
+    Datetimes are shown in the local timezone and bytes are decoded.
+    """
+    if backend == 'auto':
+        backend = 'json' if orjson is None else 'orjson'
+
+    if backend == 'orjson':
+        if orjson is None:
+            raise ValueError('the orjson backend is not installed')
+        options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+
+        def dumps(obj):
+            return orjson.dumps(obj, default=_default, option=options)
+
+        return dumps
+
+    if backend != 'json':
+        raise ValueError(f'unknown json backend `{backend}`')
+
+    def dumps(obj):
+        return json.dumps(obj, default=_default).encode('utf-8')
+
+    return dumps
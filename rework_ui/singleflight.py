@@ -0,0 +1,61 @@
+import threading
+import time
+
+
+class _call:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class singleflight:
+    """run a computation once for all the concurrent callers asking for
+    the same key, and hand its result to the callers coming within
+    `window` seconds after it completed
+    """
+
+    def __init__(self, window=0):
+        self.window = window
+        self.lock = threading.Lock()
+        self.inflight = {}
+        # key -> (completion time, value)
+        self.results = {}
+
+    def do(self, key, func):
+        with self.lock:
+            now = time.monotonic()
+            result = self.results.get(key)
+            if result is not None and now - result[0] < self.window:
+                return result[1]
+
+            call = self.inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self.inflight[key] = _call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+
+        try:
+            call.value = func()
+        except BaseException as err:
+            call.error = err
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+                now = time.monotonic()
+                self.results = {
+                    k: v for k, v in self.results.items()
+                    if now - v[0] < self.window
+                }
+                if self.window and call.error is None:
+                    self.results[key] = (now, call.value)
+            call.done.set()
+
+        return call.value
@@ -0,0 +1,80 @@
+"""Task inputs/outputs manifests"""
+
+from collections import OrderedDict
+import struct
+import threading
+
+import pyzstd as zstd
+from rework.helper import unpack_io
+
+
+def _positions(raw):
+    [count] = struct.unpack('!L', raw[:4])
+    offset = 4 + count * 4
+    sizes = struct.unpack(f'!{"L" * count}', raw[4:offset])
+    positions = []
+    for size in sizes:
+        positions.append((offset, size))
+        offset += size
+    return positions
+
+
+def manifest(spec, payload):
+    raw = zstd.decompress(bytes(payload))
+    positions = _positions(raw)
+    middle = len(positions) // 2
+    names = [
+        raw[offset:offset + size].decode('utf-8')
+        for offset, size in positions[:middle]
+    ]
+    offsets = dict(zip(names, positions[middle:]))
+    return {
+        'offsets': offsets,
+        'fields': unpack_io(spec, payload, nofiles=True),
+        'lengths': {
+            field['name']: offsets[field['name']][1]
+            for field in spec
+            if field['type'] == 'file' and field['name'] in offsets
+        }
+    }
+
+
+def iofile(manifest, payload, name):
+    " the contents of the `name` file (None if there is no such file) "
+    if name not in manifest['lengths']:
+        return None
+    offset, size = manifest['offsets'][name]
+    raw = zstd.decompress(bytes(payload))
+    return raw[offset:offset + size]
+
+
+class manifestcache:
+    " a thread-safe lru mapping of (task id, direction) to manifests "
+
+    def __init__(self, maxsize=1000):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is not None:
+                self.items.move_to_end(key)
+            return item
+
+    def set(self, key, item):
+        with self.lock:
+            self.items[key] = item
+            self.items.move_to_end(key)
+            while len(self.items) > self.maxsize:
+                self.items.popitem(last=False)
+
+    def discard(self, taskid):
+        " forget the manifests of a task "
+        with self.lock:
+            for direction in ('input', 'output'):
+                self.items.pop((taskid, direction), None)
+
+    def __len__(self):
+        return len(self.items)
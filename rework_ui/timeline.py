@@ -0,0 +1,91 @@
+"""Workers timeline"""
+
+from sqlhelp import select
+from rework.task import _task_state
+
+
+# must match the ix_{ns}_task_span index expression
+# (unbounded while running, and robust to a finished before started)
+SPAN = (
+    "tstzrange(t.started, "
+    "case when t.finished < t.started then t.started else t.finished end, "
+    "'[]')"
+)
+
+
+def timeline_query(start, stop, domain=None):
+    q = select(
+        't.id', 't.worker', 'w.host', 'w.pid', 'w.domain',
+        'op.name as operation', 't.status', 't.abort',
+        't.traceback is not null as failed',
+        'extract(epoch from t.started)::float as began',
+        # the unfinished tasks end now
+        'extract(epoch from coalesce(t.finished, now()))::float as ended'
+    ).table('rework.task as t'
+    ).join('rework.operation as op on (op.id = t.operation)'
+    ).join('rework.worker as w on (w.id = t.worker)'
+    ).where('t.started is not null'
+    ).where(
+        f"{SPAN} && tstzrange(%(start)s, %(stop)s, '[)')",
+        start=start,
+        stop=stop
+    ).order('t.worker, t.started')
+    if domain and domain != 'all':
+        q.where('op.domain = %(domain)s', domain=domain)
+    return q
+
+
+def merge(intervals, start, stop, width):
+    """fold the intervals (sorted by start) starting within the same
+    pixel of a `width` pixels wide window into one
+    """
+    if len(intervals) <= width:
+        return intervals
+    pixel = (stop - start) / width
+    out = []
+    for item in intervals:
+        last = out[-1] if out else None
+        if last is None or item['start'] >= last['start'] + pixel:
+            out.append(dict(item))
+            continue
+        last['end'] = max(last['end'], item['end'])
+        last['count'] += item['count']
+        if last['operation'] != item['operation']:
+            last['operation'] = None
+        if last['status'] != item['status']:
+            last['status'] = 'mixed'
+    return out
+
+
+def timeline(engine, start, stop, width=1000, domain=None):
+    """the workers, with the intervals of the tasks they ran
+    between the `start` and `stop` datetimes
+
+    The times are in seconds since the epoch.
+    """
+    begin, end = start.timestamp(), stop.timestamp()
+    workers = {}
+    for row in timeline_query(start, stop, domain).do(engine).fetchall():
+        worker = workers.setdefault(row.worker, {
+            'wid': row.worker,
+            'host': row.host,
+            'pid': row.pid,
+            'domain': row.domain,
+            'intervals': []
+        })
+        worker['intervals'].append({
+            'tid': row.id,
+            'operation': row.operation,
+            'status': _task_state(row.status, row.abort, row.failed),
+            'start': row.began,
+            'end': row.ended,
+            'count': 1
+        })
+
+    for worker in workers.values():
+        worker['intervals'] = merge(worker['intervals'], begin, end, width)
+    return {
+        'start': begin,
+        'stop': end,
+        'workers': list(workers.values())
+    }
@@ -0,0 +1,39 @@
+-- change counters of the tables behind the slow-changing ui views
+
+create table if not exists {ns}.uiversion (
+  tablename text primary key,
+  version bigint not null default 0
+);
+
+-- when did it last change (drives the clients polling pace)
+alter table {ns}.uiversion
+add column if not exists changed timestamptz not null default now();
+
+
+create or replace function {ns}.bump_uiversion() returns trigger as $body$
+begin
+  insert into {ns}.uiversion (tablename, version) values (tg_table_name, 1)
+  on conflict (tablename) do update
+  set version = {ns}.uiversion.version + 1, changed = now();
+  return null;
+end;
+$body$
+language plpgsql;
+
+
+drop trigger if exists bump_uiversion on {ns}.operation;
+create trigger bump_uiversion
+after insert or update or delete or truncate on {ns}.operation
+for each statement execute procedure {ns}.bump_uiversion();
+
+drop trigger if exists bump_uiversion on {ns}.sched;
+create trigger bump_uiversion
+after insert or update or delete or truncate on {ns}.sched
+for each statement execute procedure {ns}.bump_uiversion();
+
+-- the workers and monitors are updated all the time by rework itself
+-- (heartbeats, memory and cpu usage): no counter there, the ui derives
+-- their versions from the tables (see blueprint.tables_version)
+drop trigger if exists bump_uiversion on {ns}.worker;
+drop trigger if exists bump_uiversion on {ns}.monitor;
+delete from {ns}.uiversion where tablename in ('worker', 'monitor');
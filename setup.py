@@ -4,6 +4,7 @@ from setuptools import setup
 from setuptools.command.build_ext import build_ext
 
 from rework_ui import __version__
+from rework_ui.assets import fingerprint
 
 
 WORKING_DIR = Path(__file__).resolve().parent
@@ -26,6 +27,7 @@ class ElmBuild(build_ext):
             ('info', 'Info.elm'),
         ]:
             compile_elm(edit_kind, src)
+        print('fingerprinted', fingerprint(STATIC_DIR))
         super().run()
 
 
@@ -52,14 +54,25 @@ setup(name='rework_ui',
           'lxml',  # for the tests
           'sqlalchemy',
       ],
+      extras_require={
+          'parquet': ['pyarrow'],
+          'fastjson': ['orjson'],
+          'brotli': ['brotli']
+      },
       package_data={'rework_ui': [
           'rui_static/*',
           'rui_templates/*',
-          'schema.sql'
+          'schema.sql',
+          'archive.sql',
+          'indexes.sql',
+          'versions.sql',
+          'events.sql'
       ]},
       entry_points={'rework.subcommands': [
           'view=rework_ui.cli:view',
-          'init-db=rework_ui.cli:init_db'
+          'init-db=rework_ui.cli:init_db',
+          'archive-tasks=rework_ui.cli:archive_tasks',
+          'check-plans=rework_ui.cli:check_plans'
       ]},
       classifiers=[
           'Development Status :: 4 - Beta',
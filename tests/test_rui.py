@@ -1,13 +1,52 @@
+import csv
 import datetime
+import gzip
+import inspect
+import io as pyio
+import json
+import pickle
 from pathlib import Path
+import subprocess
+import sys
+import threading
 import time
+from urllib.request import urlopen
 
+from flask import Flask
+from icron import croniter_range
 from lxml import etree
-
-from rework import api, io
+from sqlalchemy import create_engine
+from sqlhelp import sqlfile
+from werkzeug.serving import make_server
+import pytest
+import webtest
+
+from rework import api, io, schema as reworkschema
+from rework.helper import pack_io, utcnow
 from rework.task import Task
 from rework.testutils import workers, scrub
 
+from rework_ui import (
+    app,
+    archive,
+    assets,
+    cron,
+    explain,
+    export,
+    federation,
+    forecast,
+    health,
+    preview,
+    profiler,
+    schema,
+    serialize,
+    taskio,
+    timeline
+)
+from rework_ui.blueprint import poll_interval, reworkui
+from rework_ui.serialize import TZ, localzone
+from rework_ui.singleflight import singleflight
+
 
 DATADIR = Path(__file__).parent / 'data'
 
@@ -189,6 +228,7 @@ def test_with_input(engine, client):
         {'abort': False,
          'deathinfo': None,
          'domain': 'default',
+         'failed': False,
          'finished': None,
          'input': ("{'babar.xlsx': '<0.02 kb file>', 'name': 'Babar', "
                    "'weight': '65', 'celeste.xlsx': '<0.02 kb file>', "
@@ -306,6 +346,7 @@ def test_schedulers(engine, client):
     ]
 
     res = client.put(f'/launch-scheduled/{sid}')
+    assert res.content_type == 'application/json'
     assert 'tid' in res.json
     tid = res.json['tid']
     task = Task.byid(engine, tid)
@@ -416,3 +457,1401 @@ def test_validate_schedule_rule(engine, client):
     )
     assert res.status_code == 200
     assert res.text == 'bad rule'
+
+    cron.check.cache_clear()
+    res = client.post_json('/test-cron-rules', {
+        'rules': ['0 0 6 * * *', 'NOPE', '* * * * * *'],
+        'count': 3
+    })
+    good, bad, everysecond = res.json
+    assert good['error'] is None
+    stamps = [
+        datetime.datetime.strptime(stamp, '%Y-%m-%d %H:%M:%S%z')
+        for stamp in good['next']
+    ]
+    assert [stamp.hour for stamp in stamps] == [6, 6, 6]
+    assert stamps == sorted(stamps)
+    assert stamps[0] > datetime.datetime.now(TZ)
+    assert bad == {'rule': 'NOPE', 'error': 'bad rule', 'next': []}
+    assert everysecond['error'] == '"every second" rule is forbidden'
+    assert cron.check.cache_info().currsize == 3
+
+    # the rule checked while typing is known when recording it
+    res = client.put(
+        '/prepare-schedule',
+        {'service': 'with_inputs:default', 'rule': 'NOPE'},
+        status=400
+    )
+    assert res.text == 'bad rule'
+    assert cron.check.cache_info().hits == 1
+
+    res = client.post_json('/test-cron-rules', {'rules': ['0 0 6 * * *']})
+    assert len(res.json[0]['next']) == 5
+    for count in ('3', 2.5, 0, -1, 51, True):
+        res = client.post_json(
+            '/test-cron-rules',
+            {'rules': ['0 0 6 * * *'], 'count': count},
+            status=400
+        )
+        assert 'count must be an integer between 1 and 50' in res.text
+
+
+def test_archive(engine, client):
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task')
+
+    tids = [
+        api.schedule(engine, 'good_job').tid
+        for _ in range(4)
+    ]
+    old = utcnow() - datetime.timedelta(days=60)
+    with engine.begin() as cn:
+        cn.execute(
+            "update rework.task set status = 'done', "
+            "started = %(old)s, finished = %(old)s "
+            "where id = any(%(tids)s)",
+            old=old,
+            tids=tids[:3]
+        )
+        cn.execute(
+            'insert into rework.log (task, tstamp, line) '
+            "values (%(tid)s, 0, 'archived line')",
+            tid=tids[0]
+        )
+
+    count = archive.archive(
+        engine,
+        utcnow() - datetime.timedelta(days=30),
+        batchsize=2
+    )
+    assert count == 3
+
+    with engine.begin() as cn:
+        assert cn.execute(
+            'select count(*) from rework.task'
+        ).scalar() == 1
+        assert cn.execute(
+            'select count(*) from rework.task_archive'
+        ).scalar() == 3
+        assert cn.execute(
+            'select count(*) from rework.log_archive'
+        ).scalar() == 1
+
+    # transparent reads
+    res = client.get('/tasks-table-json')
+    assert [t['tid'] for t in res.json] == tids
+    assert [t['status'] for t in res.json] == [
+        'done', 'done', 'done', 'queued'
+    ]
+
+    res = client.get('/tasks-table-json', {'min': tids[-1]})
+    assert [t['tid'] for t in res.json] == tids[:3]
+
+    res = client.get('/list_jobs')
+    assert json.loads(res.text) == [
+        [tid, 'good_job', status]
+        for tid, status in zip(tids, ('done', 'done', 'done', 'queued'))
+    ]
+
+    res = client.get(f'/job_logslice/{tids[0]}')
+    assert [line for _, line in json.loads(res.text)] == ['archived line']
+    # the archived logs won't change
+    assert int(res.headers['X-Poll-Interval']) == 20000
+
+    res = client.get(f'/info-for/{tids[0]}')
+    assert res.json['state'] == 'done'
+
+    assert client.get(f'/job_status/{tids[0]}').text == 'done'
+    assert client.get('/job_status/100000').status_code == 404
+
+    newtid = int(client.put(f'/relaunch-task/{tids[1]}').body)
+    assert Task.byid(engine, newtid).operation is not None
+    assert client.put('/relaunch-task/100000').status_code == 404
+
+    # the archived tasks are deleted with their logs
+    assert client.get(f'/delete-task/{tids[0]}').json
+    assert client.get(f'/delete-task/{tids[0]}').status_code == 404
+    assert client.get('/delete-task/babar').status_code == 404
+    with engine.begin() as cn:
+        assert cn.execute(
+            'select count(*) from rework.log_archive'
+        ).scalar() == 0
+        cn.execute(
+            "update rework.task set status = 'running' where id = %(tid)s",
+            tid=newtid
+        )
+    assert client.get(f'/delete-task/{newtid}').status_code == 409
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task where id = %(tid)s', tid=newtid)
+
+    # nothing left to archive
+    assert archive.archive(
+        engine,
+        utcnow() - datetime.timedelta(days=30)
+    ) == 0
+
+    # the inputs and outputs of the archived tasks
+    tid = int(client.put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=[('babar.xlsx', 'babar.xlsx', b'babar.xslx contents')]
+    ).body)
+    rawinput = Task.byid(engine, tid).raw_input
+    with engine.begin() as cn:
+        cn.execute(
+            "update rework.task set status = 'done', "
+            "started = %(old)s, finished = %(old)s, output = 'out' "
+            "where id = %(tid)s",
+            old=old,
+            tid=tid
+        )
+    assert archive.archive(engine, utcnow() - datetime.timedelta(days=30)) == 1
+
+    io = {'direction': 'input'}
+    assert client.get(f'/read_io/{tid}', io).json == {'name': 'Babar'}
+    assert client.get(f'/getiofile_lengths/{tid}', io).json == {
+        'babar.xlsx': 19
+    }
+    res = client.get(f'/getiofile/{tid}', dict(io, getfile='babar.xlsx'))
+    assert res.body == b'babar.xslx contents'
+    assert client.get(f'/job_input/{tid}').body == rawinput
+    assert client.get(f'/job_results/{tid}').body == b'out'
+    client.get('/job_results/100000', status=404)
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task_archive')
+        cn.execute('delete from rework.log_archive')
+
+
+def test_archive_interleaved_ids(engine, client):
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task')
+
+    tids = [
+        api.schedule(engine, 'good_job').tid
+        for _ in range(4)
+    ]
+    old = utcnow() - datetime.timedelta(days=60)
+    with engine.begin() as cn:
+        # the first task stays queued while the next ones are archived
+        cn.execute(
+            "update rework.task set status = 'done', "
+            "started = %(old)s, finished = %(old)s "
+            "where id = any(%(tids)s)",
+            old=old,
+            tids=tids[1:3]
+        )
+    assert archive.archive(engine, utcnow() - datetime.timedelta(days=30)) == 2
+
+    res = client.get('/tasks-table-json')
+    assert [t['tid'] for t in res.json] == tids
+    res = client.get('/tasks-table-json', {'min': tids[3]})
+    assert [t['tid'] for t in res.json] == tids[:3]
+    res = client.get('/tasks-table-json', {'min': tids[2]})
+    assert [t['tid'] for t in res.json] == tids[:2]
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task')
+        cn.execute('delete from rework.task_archive')
+
+
+def test_upgrade_archive(engine):
+    admin = engine.execution_options(isolation_level='AUTOCOMMIT')
+    admin.execute('drop database if exists olddb')
+    admin.execute('create database olddb')
+    olddb = create_engine(str(engine.url).replace('/postgres', '/olddb'))
+    reworkschema.init(olddb)
+    # a database set up before the archive
+    with olddb.begin() as cn:
+        cn.execute(sqlfile(schema.SCHEMAFILE, ns='rework'))
+
+    schema.upgrade(olddb)
+    schema.upgrade(olddb)
+    with olddb.begin() as cn:
+        archive.ensure_partitions(cn, [utcnow()])
+        assert archive.archived_maxid(cn) == 0
+
+    olddb.dispose()
+    admin.execute('drop database olddb')
+
+
+def test_indexes_and_plans(engine):
+    # idempotent
+    schema.upgrade(engine)
+
+    with engine.begin() as cn:
+        indexes = {
+            name for name, in cn.execute(
+                "select indexname from pg_indexes where schemaname = 'rework'"
+            ).fetchall()
+        }
+    assert {
+        'ix_rework_operation_domain',
+        'ix_rework_task_operation_id',
+        'ix_rework_worker_running_domain',
+        'ix_rework_sched_domain',
+        'ix_rework_task_queued',
+        'ix_rework_task_span'
+    } <= indexes
+
+    # our test tables are tiny
+    assert explain.check_plans(engine, 'default') == []
+
+
+def test_concurrent_index_builds(engine):
+    def valid(name):
+        return engine.execute(
+            'select i.indisvalid from pg_index as i '
+            'join pg_class as c on (c.oid = i.indexrelid) '
+            'where c.relname = %(name)s',
+            name=name
+        ).scalar()
+
+    engine.execute('drop index rework.ix_rework_task_queued')
+    tid = api.schedule(engine, 'good_job').tid
+
+    # a long transaction holds a write lock on the tasks table
+    longtx = engine.connect()
+    tx = longtx.begin()
+    longtx.execute(
+        'update rework.task set metadata = null where id = %(tid)s', tid=tid
+    )
+    builder = threading.Thread(target=schema.create_indexes, args=(engine,))
+    builder.start()
+    time.sleep(.5)
+    # while the build waits, the other writers are not blocked
+    with engine.begin() as cn:
+        cn.execute("set local lock_timeout = '2s'")
+        other = cn.execute(
+            'insert into rework.task (operation, status) '
+            "select operation, 'queued' from rework.task where id = %(tid)s "
+            'returning id',
+            tid=tid
+        ).scalar()
+    tx.commit()
+    longtx.close()
+    builder.join()
+    assert valid('ix_rework_task_queued')
+
+    # the leftover of an interrupted build is rebuilt
+    engine.execute(
+        'update pg_index set indisvalid = false '
+        "where indexrelid = 'rework.ix_rework_task_queued'::regclass"
+    )
+    assert not valid('ix_rework_task_queued')
+    schema.upgrade(engine)
+    assert valid('ix_rework_task_queued')
+
+    engine.execute(
+        'delete from rework.task where id = any(%(tids)s)',
+        tids=[tid, other]
+    )
+
+    flagged = explain.check_plans(engine, 'default', minrows=0)
+    assert flagged
+    assert {endpoint for endpoint, _, _ in flagged} <= {
+        name for name, _ in explain.ui_queries('default')
+    }
+
+
+def test_fingerprinted_assets(engine, tmp_path, monkeypatch):
+    (tmp_path / 'style.css').write_bytes(b'.done { color: green; }')
+    mapping = assets.fingerprint(tmp_path)
+    hashed = mapping['style.css']
+    assert hashed.startswith('style.')
+    assert hashed.endswith('.css')
+    assert (tmp_path / f'{hashed}.gz').exists()
+    assert assets.manifest(tmp_path) == mapping
+
+    monkeypatch.setattr(assets, 'STATIC_DIR', tmp_path)
+    # not webtest: it transparently decodes the gzipped responses
+    client = app.make_app(engine).test_client()
+
+    res = client.get(f'/assets/{hashed}', headers={'Accept-Encoding': 'gzip'})
+    assert res.headers['Content-Encoding'] == 'gzip'
+    assert res.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert res.headers['Vary'] == 'Accept-Encoding'
+    assert res.mimetype == 'text/css'
+    assert gzip.decompress(res.data) == b'.done { color: green; }'
+
+    res = client.get(f'/assets/{hashed}')
+    assert 'Content-Encoding' not in res.headers
+    assert res.data == b'.done { color: green; }'
+
+    assert client.get('/assets/style.css').status_code == 404
+
+    res = client.get('/')
+    assert f'assets/{hashed}' in res.text
+
+
+def test_export(engine, client):
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task')
+
+    tids = [
+        api.schedule(engine, opname, metadata={'user': 'Babar'}).tid
+        for opname in ('good_job', 'bad_job', 'good_job')
+    ]
+
+    res = client.get(
+        '/tasks-export',
+        {'operation': 'good_job', 'columns': 'tid,operation,status,metadata'}
+    )
+    assert res.content_type == 'application/x-ndjson'
+    assert [json.loads(line) for line in res.text.splitlines()] == [
+        {'tid': tids[0], 'operation': 'good_job', 'status': 'queued',
+         'metadata': {'user': 'Babar'}},
+        {'tid': tids[2], 'operation': 'good_job', 'status': 'queued',
+         'metadata': {'user': 'Babar'}}
+    ]
+
+    res = client.get(
+        '/tasks-export',
+        {'format': 'csv', 'columns': 'tid,operation,failed'}
+    )
+    assert list(csv.reader(pyio.StringIO(res.text))) == [
+        ['tid', 'operation', 'failed'],
+        [str(tids[0]), 'good_job', 'False'],
+        [str(tids[1]), 'bad_job', 'False'],
+        [str(tids[2]), 'good_job', 'False']
+    ]
+
+    res = client.get('/tasks-export', {'format': 'csv', 'status': 'done'})
+    assert res.text.strip() == ','.join(export.COLUMNS)
+
+    res = client.get('/tasks-export', {'columns': 'tid,input'})
+    assert res.status_code == 400
+
+    res = client.get('/tasks-export', {'status': 'bogus'})
+    assert res.status_code == 400
+
+    # the archived history
+    old = utcnow() - datetime.timedelta(days=60)
+    with engine.begin() as cn:
+        cn.execute(
+            "update rework.task set status = 'done', queued = %(old)s, "
+            "started = %(old)s, finished = %(old)s where id = %(tid)s",
+            old=old,
+            tid=tids[1]
+        )
+    archive.archive(engine, utcnow() - datetime.timedelta(days=30))
+
+    def exported(**args):
+        res = client.get('/tasks-export', dict(args, columns='tid,status'))
+        return [json.loads(line) for line in res.text.splitlines()]
+
+    assert exported(status='done') == [{'tid': tids[1], 'status': 'done'}]
+
+    # the states, abort first
+    with engine.begin() as cn:
+        cn.execute(
+            "update rework.task set status = 'done', traceback = 'boom', "
+            'abort = %(abort)s where id = %(tid)s',
+            abort=True,
+            tid=tids[0]
+        )
+        cn.execute(
+            "update rework.task set status = 'done', traceback = 'boom' "
+            'where id = %(tid)s',
+            tid=tids[2]
+        )
+    assert [row['tid'] for row in exported(status='aborted')] == [tids[0]]
+    assert [row['tid'] for row in exported(status='failed')] == [tids[2]]
+    assert [row['tid'] for row in exported(status='done')] == [tids[1]]
+    with pytest.raises(ValueError):
+        export.export_query(['tid'], status='bogus')
+    with engine.begin() as cn:
+        cn.execute(
+            "update rework.task set status = 'queued', traceback = null, "
+            'abort = false where id = any(%(tids)s)',
+            tids=[tids[0], tids[2]]
+        )
+    assert [row['tid'] for row in exported()] == [tids[1], tids[0], tids[2]]
+    recent = (utcnow() - datetime.timedelta(days=1)).isoformat()
+    assert [row['tid'] for row in exported(start=recent)] == [
+        tids[0], tids[2]
+    ]
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task_archive')
+        cn.execute('delete from rework.log_archive')
+    tids.remove(tids[1])
+
+    pq = pytest.importorskip('pyarrow.parquet')
+    res = client.get(
+        '/tasks-export',
+        {'format': 'parquet', 'columns': 'tid,queued,metadata'}
+    )
+    table = pq.read_table(pyio.BytesIO(res.body))
+    assert table.column('tid').to_pylist() == tids
+    assert table.column('metadata').to_pylist() == ['{"user": "Babar"}'] * 2
+
+
+def test_compact_tasks_table(engine, client):
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task')
+
+    for opname in ('good_job', 'bad_job', 'good_job'):
+        api.schedule(engine, opname, metadata={'user': 'Babar'})
+
+    rows = client.get('/tasks-table-json').json
+    compact = client.get('/tasks-table-json', {'format': 'compact'}).json
+    assert compact['size'] == 3
+    assert compact['dicts'] == {
+        'domain': ['default'],
+        'name': ['good_job', 'bad_job'],
+        'status': ['queued']
+    }
+    assert compact['columns']['name'] == [0, 1, 0]
+    assert compact['sparse']['started'] == [[], []]
+
+    # back to the rows
+    rebuilt = []
+    for idx in range(compact['size']):
+        row = {}
+        for name, column in compact['columns'].items():
+            val = column[idx]
+            if name in compact['dicts']:
+                val = compact['dicts'][name][val]
+            row[name] = val
+        for name, (indexes, values) in compact['sparse'].items():
+            row[name] = dict(zip(indexes, values)).get(idx)
+        rebuilt.append(row)
+    assert rebuilt == rows
+
+
+@pytest.mark.parametrize('backend', ['json', 'orjson'])
+def test_serializer(backend):
+    if backend == 'orjson':
+        pytest.importorskip('orjson')
+    dumps = serialize.dumper(backend)
+    stamp = datetime.datetime(2024, 1, 1, 12, tzinfo=datetime.timezone.utc)
+    out = json.loads(
+        dumps({
+            'stamp': stamp,
+            'blob': b'hello',
+            'items': [(1, None), {2: 'two'}]
+        })
+    )
+    assert out == {
+        'stamp': stamp.astimezone(serialize.TZ).strftime('%Y-%m-%d %H:%M:%S%z'),
+        'blob': 'hello',
+        'items': [[1, None], {'2': 'two'}]
+    }
+
+    with pytest.raises(TypeError):
+        dumps({'what': object()})
+
+
+def test_conditional_get(engine, client, monkeypatch):
+    for url in ('/services-table-json',
+                '/launchers-table-json',
+                '/schedulers-table-json'):
+        res = client.get(url)
+        assert res.status_code == 200
+        etag = res.headers['ETag']
+
+        res = client.get(url, headers={'If-None-Match': etag})
+        assert res.status_code == 304
+        assert res.body == b''
+        assert res.headers['ETag'] == etag
+
+    res = client.get('/schedulers-table-json')
+    etag = res.headers['ETag']
+    sid = api.prepare(engine, 'with_inputs', rule='0 0 * * * *')
+    res = client.get('/schedulers-table-json', headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    assert res.headers['ETag'] != etag
+    assert sid in [row[0] for row in res.json]
+    api.unprepare(engine, sid)
+
+    # the workers view also moves with the clock
+    now = time.time()
+    monkeypatch.setattr(time, 'time', lambda: now)
+    etag = client.get('/workers-table-json').headers['ETag']
+    res = client.get('/workers-table-json', headers={'If-None-Match': etag})
+    assert res.status_code == 304
+    # a new running worker moves it too (without a counter on the
+    # workers table, which rework updates all the time)
+    with engine.begin() as cn:
+        wid = cn.execute(
+            "insert into rework.worker (host, running) "
+            "values ('etag', true) returning id"
+        ).scalar()
+    res = client.get('/workers-table-json', headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    etag = res.headers['ETag']
+    with engine.begin() as cn:
+        cn.execute(
+            'update rework.worker set mem = 42 where id = %(wid)s', wid=wid
+        )
+        assert cn.execute(
+            "select count(*) from rework.uiversion "
+            "where tablename in ('worker', 'monitor')"
+        ).scalar() == 0
+        cn.execute('delete from rework.worker where id = %(wid)s', wid=wid)
+
+    monkeypatch.setattr(time, 'time', lambda: now + 5)
+    res = client.get('/workers-table-json', headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    monkeypatch.undo()
+
+    # the args belong to the version
+    res = client.get('/services-table-json', {'domain': 'nope'},
+                     headers={'If-None-Match': etag})
+    assert res.status_code == 200
+    assert res.json == []
+
+
+def test_snapshot(engine, client):
+    res = client.post_json('/snapshot', {
+        'sections': ['services', 'launchers', 'schedulers', 'workers', 'events']
+    })
+    versions = res.json['versions']
+    sections = res.json['sections']
+    assert set(versions) == {
+        'services', 'launchers', 'schedulers', 'workers', 'events'
+    }
+    assert sections['services'] == client.get('/services-table-json').json
+    assert sections['launchers'] == client.get('/launchers-table-json').json
+    assert sections['schedulers'] == client.get('/schedulers-table-json').json
+    # no known event id yet: full refresh
+    assert sections['events'] is None
+
+    # nothing is stale
+    res = client.post_json('/snapshot', {
+        'sections': ['services', 'launchers', 'schedulers', 'events'],
+        'versions': versions
+    })
+    assert res.json['sections'] == {}
+    assert res.json['versions'] == {
+        name: versions[name]
+        for name in ('services', 'launchers', 'schedulers', 'events')
+    }
+
+    # a new task: only the events move
+    t = api.schedule(engine, 'good_job')
+    res = client.post_json('/snapshot', {
+        'sections': ['services', 'schedulers', 'events'],
+        'versions': versions
+    })
+    assert list(res.json['sections']) == ['events']
+    assert [
+        (event['action'], event['taskid'])
+        for event in res.json['sections']['events']
+    ] == [('I', t.tid)]
+
+    # a new scheduler: the schedulers move
+    sid = api.prepare(engine, 'with_inputs', rule='0 0 * * * *')
+    res = client.post_json('/snapshot', {
+        'sections': ['services', 'schedulers'],
+        'versions': versions
+    })
+    assert list(res.json['sections']) == ['schedulers']
+    assert res.json['versions']['services'] == versions['services']
+    assert sid in [row[0] for row in res.json['sections']['schedulers']]
+    api.unprepare(engine, sid)
+
+    res = client.post_json('/snapshot', {'sections': ['nope']})
+    assert res.status_code == 400
+    assert 'unknown sections: nope' in res.text
+
+    for payload, error in (
+            (['workers'], 'a json object is expected'),
+            ({'sections': 'workers'}, 'sections must be a list'),
+            ({'sections': [['workers']]}, 'sections must be a list'),
+            ({'sections': ['workers'], 'versions': ['abc']},
+             'versions must map section names to tokens'),
+            ({'sections': ['workers'], 'versions': 'abc'},
+             'versions must map section names to tokens')
+    ):
+        res = client.post_json('/snapshot', payload)
+        assert res.status_code == 400
+        assert error in res.text
+
+
+def test_events_by_domain(engine, client):
+    t = api.schedule(engine, 'good_job')
+    fromid = engine.execute(
+        'select max(id) from rework.events where taskid < %(tid)s',
+        tid=t.tid
+    ).scalar()
+    t2 = api.schedule(engine, 'bad_job')
+    lastid = engine.execute('select max(id) from rework.events').scalar()
+
+    row = engine.execute(
+        'select domain, operation from rework.events where taskid = %(tid)s',
+        tid=t.tid
+    ).fetchone()
+    assert (row.domain, row.operation) == ('default', 'good_job')
+
+    res = client.get(f'/events/{fromid}')
+    assert [e['taskid'] for e in res.json] == [t.tid, t2.tid]
+    assert res.headers['X-Last-Event-Id'] == str(lastid)
+
+    res = client.get(f'/events/{fromid}', {'domain': 'default',
+                                           'operation': 'bad_job'})
+    assert [e['taskid'] for e in res.json] == [t2.tid]
+
+    # nothing for us, but the last event id still moves
+    res = client.get(f'/events/{fromid}', {'domain': 'nope'})
+    assert res.json == []
+    assert res.headers['X-Last-Event-Id'] == str(lastid)
+
+    # an unknown event: the client must reload everything
+    res = client.get('/events/0')
+    assert res.content_type == 'application/json'
+    assert res.json is None
+
+    # upgrading again is harmless
+    schema.upgrade(engine)
+
+
+def test_io_manifest(engine, client):
+    res = client.put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Celeste'},
+        upload_files=[
+            ('babar.xlsx', 'babar.xlsx', b'celeste.xlsx contents',
+             'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+        ]
+    )
+    tid = int(res.body)
+    payload, spec = engine.execute(
+        'select t.input, o.inputs from rework.task as t, rework.operation as o '
+        'where t.id = %(tid)s and o.id = t.operation',
+        tid=tid
+    ).fetchone()
+
+    manifest = taskio.manifest(spec, payload)
+    assert manifest['fields'] == {'name': 'Celeste'}
+    assert manifest['lengths'] == {'babar.xlsx': 21}
+    assert taskio.iofile(manifest, payload, 'babar.xlsx') == b'celeste.xlsx contents'
+    assert taskio.iofile(manifest, payload, 'name') is None
+
+    # served twice: the second time from the cached manifest
+    for _ in range(2):
+        res = client.get(
+            f'/getiofile/{tid}',
+            {'direction': 'input', 'getfile': 'babar.xlsx'}
+        )
+        assert res.body == b'celeste.xlsx contents'
+        assert client.get(
+            f'/read_io/{tid}', {'direction': 'input'}
+        ).json == {'name': 'Celeste'}
+
+    res = client.get(
+        f'/getiofile/{tid}',
+        {'direction': 'input', 'getfile': 'nope.xlsx'},
+        status=404
+    )
+
+    # the deleted tasks are forgotten
+    assert client.get(f'/delete-task/{tid}').json
+    assert client.get(f'/read_io/{tid}', {'direction': 'input'}).json is None
+
+    # even behind our back (e.g. by another ui instance)
+    tid = int(client.put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Celeste'},
+        upload_files=[('babar.xlsx', 'babar.xlsx', b'celeste.xlsx contents')]
+    ).body)
+    engine.execute(
+        "update rework.task set status = 'done' where id = %(tid)s", tid=tid
+    )
+    assert client.get(
+        f'/read_io/{tid}', {'direction': 'input'}
+    ).json == {'name': 'Celeste'}
+    engine.execute('delete from rework.task where id = %(tid)s', tid=tid)
+    assert client.get(
+        f'/getiofile/{tid}',
+        {'direction': 'input', 'getfile': 'babar.xlsx'}
+    ).json is None
+    assert client.get(f'/read_io/{tid}', {'direction': 'input'}).json is None
+
+    cache = taskio.manifestcache(maxsize=2)
+    cache.set(1, 'a')
+    cache.set(2, 'b')
+    assert cache.get(1) == 'a'
+    cache.set(3, 'c')
+    assert cache.get(2) is None
+    assert (cache.get(1), cache.get(3)) == ('a', 'c')
+    assert len(cache) == 2
+
+
+def test_upload_limits(engine):
+    def client(**limits):
+        app = Flask('rework')
+        app.register_blueprint(reworkui(engine, **limits))
+        return webtest.TestApp(app)
+
+    upload = [
+        ('babar.xlsx', 'babar.xlsx', b'babar.xslx contents',
+         'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet')
+    ]
+
+    res = client(maxfilesize=10).put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=upload,
+        status=413
+    )
+    assert 'file `babar.xlsx` too large (19 bytes, max 10)' in res.text
+
+    res = client(maxrequestsize=100).put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=upload,
+        status=413
+    )
+    assert 'request too large (max 100 bytes)' in res.text
+
+    res = client(maxfilesize=19, maxrequestsize=10000).put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=upload
+    )
+    t = Task.byid(engine, int(res.body))
+    assert t.input['babar.xlsx'] == b'babar.xslx contents'
+
+    # the blueprint and the app share their defaults
+    defaults = inspect.signature(reworkui).parameters
+    assert defaults['maxfilesize'].default == app.MAXFILESIZE
+    assert defaults['maxrequestsize'].default == app.MAXREQUESTSIZE
+    rapp = app.make_app(engine)
+    assert rapp.config['MAX_CONTENT_LENGTH'] == app.MAXREQUESTSIZE
+
+    rapp = app.make_app(engine, maxfilesize=10, maxrequestsize=10000)
+    assert rapp.config['MAX_CONTENT_LENGTH'] == 10000
+    res = webtest.TestApp(rapp).put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=upload,
+        status=413
+    )
+    assert 'file `babar.xlsx` too large (19 bytes, max 10)' in res.text
+
+
+def test_read_engine(engine):
+    admin = engine.execution_options(isolation_level='AUTOCOMMIT')
+    admin.execute('drop database if exists replica')
+    admin.execute('create database replica')
+    replica = app.pooled_engine(
+        str(engine.url).replace('/postgres', '/replica'),
+        poolsize=2,
+        pooltimeout=5
+    )
+    assert replica.pool.size() == 2
+    assert replica.pool._pre_ping
+    reworkschema.init(replica)
+    schema.init(replica)
+    api.freeze_operations(replica)
+
+    client = webtest.TestApp(app.make_app(engine, readengine=replica))
+
+    # the writes land on the primary
+    tid = int(client.put(
+        '/schedule2/with_inputs?user=Babar',
+        {'name': 'Babar'},
+        upload_files=[('babar.xlsx', 'babar.xlsx', b'babar.xslx contents')]
+    ).body)
+    count = 'select count(*) from rework.task where id = %(tid)s'
+    assert engine.execute(count, tid=tid).scalar() == 1
+    assert replica.execute(count, tid=tid).scalar() == 0
+
+    # the views are read from the replica
+    tids = [task['tid'] for task in client.get('/tasks-table-json').json]
+    assert tids == []
+    assert client.get(
+        f'/getiofile_lengths/{tid}', {'direction': 'input'}
+    ).json is None
+
+    # and the actions on the primary
+    assert client.get(f'/abort-task/{tid}').json
+    assert Task.byid(engine, tid).aborted
+
+    replica.dispose()
+    admin.execute('drop database replica')
+
+
+def test_singleflight():
+    flights = singleflight()
+    calls = []
+    gate = threading.Event()
+
+    def slow():
+        calls.append(1)
+        gate.wait()
+        return len(calls)
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(flights.do('k', slow)))
+        for _ in range(5)
+    ]
+    for thread in threads:
+        thread.start()
+    # let them all join the flight
+    while len(flights.inflight) == 0:
+        time.sleep(.01)
+    time.sleep(.1)
+    gate.set()
+    for thread in threads:
+        thread.join()
+    assert results == [1] * 5
+    assert len(calls) == 1
+
+    # done: no window, computed again
+    assert flights.do('k', slow) == 2
+
+    # failures are shared too, and not kept
+    def crash():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        flights.do('k', crash)
+    assert flights.do('k', slow) == 3
+
+
+def test_coalesced_requests(engine):
+    flask = Flask('rework')
+    flask.register_blueprint(reworkui(engine, coalescewindow=60))
+    client = webtest.TestApp(flask)
+
+    before = client.get('/tasks-table-json').json
+    api.schedule(engine, 'good_job')
+    # within the freshness window
+    assert client.get('/tasks-table-json').json == before
+    # another key
+    after = client.get('/tasks-table-json', {'domain': 'default'}).json
+    assert len(after) == len(before) + 1
+
+    # the read permission is checked once per request, and before
+    # sharing anything
+    checks = []
+    allowed = True
+
+    def has_permission(perm):
+        checks.append(perm)
+        return allowed
+
+    flask = Flask('rework')
+    flask.register_blueprint(
+        reworkui(engine, coalescewindow=60, has_permission=has_permission)
+    )
+    client = webtest.TestApp(flask)
+    for url in ('/workers-table-json', '/tasks-table-json',
+                '/services-table-json'):
+        checks.clear()
+        client.get(url)
+        assert checks == ['read']
+    allowed = False
+    client.get('/tasks-table-json', status=403)
+    client.get('/workers-table-json', status=403)
+
+
+def test_poll_hints(engine, client):
+    assert poll_interval(0, 1) == 1000
+    assert poll_interval(60, 1) == 6000
+    assert poll_interval(3600, 1) == 20000
+    # no data yet
+    assert poll_interval(None, 1) == 1000
+    # a busy server slows everyone down
+    assert poll_interval(20, 16) == 6000
+
+    # something just changed
+    sid = api.prepare(engine, 'with_inputs', rule='0 0 * * * *')
+    res = client.get('/schedulers-table-json')
+    assert int(res.headers['X-Poll-Interval']) == 1000
+    api.unprepare(engine, sid)
+
+    t = api.schedule(engine, 'good_job')
+    fromid = engine.execute('select max(id) from rework.events').scalar()
+    res = client.get(f'/events/{fromid}')
+    assert int(res.headers['X-Poll-Interval']) == 1000
+
+    res = client.post_json('/snapshot', {'sections': ['services', 'events']})
+    assert int(res.headers['X-Poll-Interval']) == 1000
+
+    res = client.get(f'/job_logslice/{t.tid}')
+    assert res.json == []
+    # no log yet: they may come any time
+    assert int(res.headers['X-Poll-Interval']) == 1000
+
+
+def test_traceback_excerpt(engine, client):
+    with workers(engine):
+        t = api.schedule(engine, 'bad_job')
+        t.join()
+
+    rows = client.get('/tasks-table-json').json
+    row = [row for row in rows if row['tid'] == t.tid][0]
+    assert row['failed']
+    assert row['traceback'] == 'Exception: I am a little crasher.'
+
+    res = client.get(f'/task-traceback/{t.tid}')
+    assert res.content_type == 'text/plain'
+    assert res.text.startswith('Traceback (most recent call last):')
+    assert res.text.rstrip().endswith('Exception: I am a little crasher.')
+
+    res = client.get(f'/taskerror/{t.tid}')
+    assert 'little crasher' in res.text
+
+    good = api.schedule(engine, 'good_job')
+    client.get(f'/task-traceback/{good.tid}', status=404)
+    client.get('/task-traceback/999999', status=404)
+
+
+class _Trap:
+    def __reduce__(self):
+        return (exec, ('raise SystemExit',))
+
+
+def test_input_preview():
+    spec = [
+        {'name': 'babar.xlsx', 'type': 'file', 'required': False, 'choices': None},
+        {'name': 'name', 'type': 'string', 'required': False, 'choices': None},
+        {'name': 'weight', 'type': 'number', 'required': False, 'choices': None},
+    ]
+    payload = pack_io(spec, {
+        'babar.xlsx': b'x' * 10240,
+        'name': 'Babar',
+        'weight': 65
+    })
+    assert preview.preview(spec, payload) == (
+        "{'babar.xlsx': '<10.0 kb file>', 'name': 'Babar', 'weight': '65'}"
+    )
+    # the file contents lie before the other values: out of budget
+    assert preview.preview(spec, payload, maxbytes=1024) == (
+        "{'babar.xlsx': '<10.0 kb file>', 'name': '…', 'weight': '…'} …"
+    )
+
+    # legacy pickles are scanned, never loaded
+    legacy = pickle.dumps({'name': 'Babar', 'trap': _Trap(), 'blob': b'x' * 2048})
+    assert preview.preview(None, legacy) == (
+        "{'name': 'Babar', 'trap': '<builtins.exec>', 'blob': '<2.0 kb file>'}"
+    )
+
+    big = pickle.dumps({'values': list(range(100000))})
+    text = preview.preview(None, big, maxchars=40)
+    assert text == "{'values': '[0, 1, 2, 3, 4, 5, 6, 7, 8, …"
+    assert preview.preview(None, big, maxbytes=20).endswith(' …')
+    assert preview.preview(None, b'not a pickle') == 'None …'
+
+
+def test_federated_view(engine):
+    admin = engine.execution_options(isolation_level='AUTOCOMMIT')
+    admin.execute('drop database if exists region')
+    admin.execute('create database region')
+    region = app.pooled_engine(
+        str(engine.url).replace('/postgres', '/region')
+    )
+    reworkschema.init(region)
+    schema.init(region)
+    api.freeze_operations(region)
+
+    client = webtest.TestApp(app.make_app({'eu': engine, 'us': region}))
+    res = client.get('/federated/sources')
+    assert res.json == ['eu', 'us']
+    assert res.headers['content-type'] == 'application/json'
+
+    # each source keeps its own dashboard
+    assert 'baseurl : "/us"' in client.get('/us/').text
+    api.schedule(engine, 'with_inputs', inputdata={'name': 'Babar'})
+    t = api.schedule(region, 'with_inputs', inputdata={'name': 'Babar'})
+    assert [
+        task['tid'] for task in client.get('/us/tasks-table-json').json
+    ] == [t.tid]
+
+    # and the merged views tag the rows with their source
+    tasks = client.get('/federated/tasks-table-json').json
+    assert tasks['errors'] == {}
+    assert {task['source'] for task in tasks['tasks']} == {'eu', 'us'}
+    assert tasks['tasks'][0]['source'] == 'us'
+    assert tasks['tasks'][0]['tid'] == t.tid
+
+    workers = client.get('/federated/workers-table-json').json
+    assert workers == {'domains': [], 'workers': [], 'errors': {}}
+
+    res = client.get('/federated/events').json
+    assert res['events'] == []
+    cursors = ','.join(
+        f'{name}:{eid}' for name, eid in res['lastids'].items()
+    )
+    api.schedule(region, 'with_inputs', inputdata={'name': 'Celeste'})
+    res = client.get('/federated/events', {'from': cursors}).json
+    assert [
+        (event['source'], event['action']) for event in res['events']
+    ] == [('us', 'I')]
+    assert res['lastids']['us'] > int(cursors.split(':')[-1])
+
+    assert 'Celeste' not in client.get('/').text
+    assert f'us/taskinfo/{t.tid}' in client.get('/').text
+
+    region.dispose()
+    admin.execute('drop database region')
+
+
+def test_fanout_deadlines(engine):
+    release = threading.Event()
+
+    def query(name, engine):
+        if name == 'slow':
+            release.wait()
+        return name
+
+    sources = federation.fanout(
+        {'fast': engine, 'slow': engine},
+        timeout={'fast': 5, 'slow': .2},
+        maxinflight=1
+    )
+    start = time.time()
+    results, errors = sources.run(query)
+    assert time.time() - start < 1
+    assert results == {'fast': 'fast'}
+    assert errors == {'slow': 'timeout'}
+
+    # the stuck source is not handed more work
+    results, errors = sources.run(query)
+    assert results == {'fast': 'fast'}
+    assert errors == {'slow': 'busy'}
+
+    release.set()
+    sources.pool.shutdown(wait=True)
+    assert sources.inflight == {'fast': 0, 'slow': 0}
+
+
+def test_queue_depth(engine, client):
+    with engine.begin() as cn:
+        cn.execute("delete from rework.task where status = 'queued'")
+    assert client.get('/queue-depth-json').json == []
+
+    for name in ('Babar', 'Celeste'):
+        api.schedule(engine, 'with_inputs', inputdata={'name': name})
+    api.schedule(engine, 'good_job')
+
+    depth = client.get('/queue-depth-json').json
+    assert [
+        (row['domain'], row['operation'], row['queued'])
+        for row in depth
+    ] == [
+        ('default', 'good_job', 1),
+        ('default', 'with_inputs', 2)
+    ]
+    assert all(row['age'] >= 0 for row in depth)
+    assert client.get('/queue-depth-json', {'domain': 'nope'}).json == []
+
+    res = client.get('/metrics')
+    assert res.content_type == 'text/plain'
+    lines = res.text.splitlines()
+    assert (
+        'rework_queue_depth{domain="default",operation="with_inputs"} 2'
+    ) in lines
+    assert any(
+        line.startswith(
+            'rework_queue_oldest_age_seconds{domain="default",operation="good_job"} '
+        )
+        for line in lines
+    )
+
+    # a monitors tab section
+    res = client.post_json('/snapshot', {'sections': ['queue']})
+    assert [
+        (row['operation'], row['queued'])
+        for row in res.json['sections']['queue']
+    ] == [('good_job', 1), ('with_inputs', 2)]
+
+    with engine.begin() as cn:
+        cn.execute("delete from rework.task where status = 'queued'")
+
+
+def test_schedule_forecast(engine, client):
+    start = datetime.datetime(2030, 1, 7, tzinfo=TZ)
+    stop = start + datetime.timedelta(days=7)
+    rule = '0 */7 6-8 * * 1-5'
+    assert [
+        datetime.datetime.fromtimestamp(stamp, TZ)
+        for stamp in cron.fires(rule, start, stop)
+    ] == list(croniter_range(start, stop, rule))
+    assert cron.day_fires.cache_info().currsize >= 7
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.sched')
+        cn.execute('delete from rework.monitor')
+        cn.execute(
+            'insert into rework.monitor (domain, options) '
+            'values (%(domain)s, %(options)s)',
+            domain='default',
+            options=json.dumps({'maxworkers': 2})
+        )
+    # 360 launches from 06:00 to 07:00
+    api.prepare(engine, 'with_inputs', rule='0,10,20,30,40,50 * 6 * * *')
+
+    buckets = forecast.forecast(engine, start, 24, 3600)
+    assert len(buckets) == 24
+    assert [
+        (bucket['start'].hour, bucket['launches'], bucket['load'],
+         bucket['backlog'], bucket['saturated'])
+        for bucket in buckets[5:10]
+    ] == [
+        (5, 0, 0.0, 0.0, False),
+        # 360 x 60s of work for 2 workers
+        (6, 360, 6.0, 14400.0, True),
+        (7, 0, 4.0, 7200.0, True),
+        (8, 0, 2.0, 0.0, False),
+        (9, 0, 0.0, 0.0, False)
+    ]
+    assert {bucket['capacity'] for bucket in buckets} == {2}
+
+    # the mean durations are kept for a while
+    opid = engine.execute(
+        "select id from rework.operation where name = 'with_inputs'"
+    ).scalar()
+    tid = api.schedule(engine, 'with_inputs', {'name': 'Babar'}).tid
+    engine.execute(
+        "update rework.task set status = 'done', "
+        "started = now() - interval '1 hour', finished = now() "
+        "where id = %(tid)s",
+        tid=tid
+    )
+    assert opid not in forecast.mean_durations(engine)
+    assert forecast.mean_durations(engine, ttl=0)[opid] == 3600
+    assert forecast.mean_durations(engine)[opid] == 3600
+    engine.execute('delete from rework.task where id = %(tid)s', tid=tid)
+    forecast.mean_durations(engine, ttl=0)
+
+    res = client.get('/schedule-forecast', {'hours': 168, 'interval': 900})
+    assert len(res.json) == 168 * 4
+    assert sum(bucket['launches'] for bucket in res.json) in (360 * 7, 360 * 8)
+    client.get('/schedule-forecast', {'hours': 168, 'interval': 1}, status=400)
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.sched')
+        cn.execute('delete from rework.monitor')
+
+
+def _imported(module):
+    " the modules loaded by importing `module` in a fresh interpreter "
+    out = subprocess.run(
+        [sys.executable, '-c',
+         f'import sys, {module}; print(" ".join(sys.modules))'],
+        capture_output=True, check=True, text=True
+    ).stdout
+    return set(out.split())
+
+
+def test_import_budgets():
+    # the cli commands not serving the ui do not load it
+    loaded = _imported('rework_ui.cli')
+    for heavy in ('flask', 'pygments', 'pyarrow', 'rework_ui.blueprint'):
+        assert heavy not in loaded
+
+    # the optional or single-page dependencies load on first use
+    loaded = _imported('rework_ui.app')
+    assert 'flask' in loaded
+    for heavy in ('pygments', 'pyarrow', 'rework.api', 'rework.monitor'):
+        assert heavy not in loaded
+
+    # the rules and the local timezone are resolved on first use
+    for module in ('rework_ui.cron', 'rework_ui.serialize'):
+        loaded = _imported(module)
+        for heavy in ('icron', 'tzlocal'):
+            assert heavy not in loaded
+
+    assert serialize.TZ == localzone()
+    # the former blueprint helpers
+    from rework_ui.blueprint import TZ as bpTZ, maybetz
+    assert bpTZ == localzone()
+    assert maybetz(None) is None
+    stamp = datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)
+    assert maybetz(stamp) == stamp.astimezone(TZ).strftime('%Y-%m-%d %H:%M:%S%z')
+
+
+def test_app_construction_without_database():
+    # nothing listens there: any query would fail
+    nowhere = create_engine('postgresql://nobody@localhost:1/nowhere')
+    start = time.time()
+    app.make_app(nowhere)
+    assert time.time() - start < 1
+
+
+def test_health_probes(engine, client):
+    denied = Flask('rework')
+    denied.register_blueprint(
+        reworkui(engine, has_permission=lambda perm: False)
+    )
+    denied = webtest.TestApp(denied)
+    denied.get('/tasks-table-json', status=403)
+    assert denied.get('/healthz').json == {'status': 'ok'}
+    assert denied.get('/readyz').json['status'] == 'ready'
+
+    res = client.get('/readyz')
+    assert res.headers['Cache-Control'] == 'no-store'
+    assert res.json['status'] == 'ready'
+    checks = res.json['checks']['primary']
+    assert checks['pool']['ok']
+    assert checks['latency']['ok']
+    assert 'replica' not in res.json['checks']
+
+    # a busy database
+    slow = Flask('rework')
+    slow.register_blueprint(
+        reworkui(engine, readythresholds={'latency': 0})
+    )
+    res = webtest.TestApp(slow).get('/readyz', status=503)
+    assert res.json['status'] == 'unready'
+    assert not res.json['checks']['primary']['latency']['ok']
+
+    # an exhausted pool is not waited for
+    small = app.pooled_engine(str(engine.url), poolsize=1, maxoverflow=0)
+    with small.connect():
+        ready, checks = health.readiness(small)
+        assert not ready
+        assert checks == {
+            'primary': {
+                'pool': {
+                    'inuse': 1, 'capacity': 1, 'threshold': .9, 'ok': False
+                }
+            }
+        }
+    small.dispose()
+
+    # an unreachable database
+    nowhere = create_engine('postgresql://nobody@localhost:1/nowhere')
+    ready, checks = health.readiness(engine, nowhere)
+    assert not ready
+    assert checks['primary']['latency']['ok']
+    assert 'error' in checks['replica']['latency']
+
+
+def test_profiler(engine):
+    flask = Flask('rework')
+    flask.register_blueprint(reworkui(engine))
+
+    @flask.route('/slow')
+    def slow():
+        time.sleep(1)
+        return 'done'
+
+    server = make_server('localhost', 0, flask, threaded=True)
+    url = f'http://localhost:{server.server_port}'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    slowcall = threading.Thread(target=lambda: urlopen(f'{url}/slow').read())
+    slowcall.start()
+    time.sleep(.1)
+
+    text = urlopen(f'{url}/profile?seconds=.5&rate=50').read().decode()
+    slowcall.join()
+    server.shutdown()
+
+    stacks = dict(line.rsplit(' ', 1) for line in text.splitlines())
+    # about 25 samples, all within the slow view
+    assert 20 <= sum(map(int, stacks.values())) <= 26
+    for stack in stacks:
+        assert stack.startswith('slow;flask.app:full_dispatch_request;')
+        assert stack.endswith(';test_rui:slow')
+        assert 'profile' not in stack
+
+    client = webtest.TestApp(flask)
+    client.get('/profile', {'seconds': 61}, status=400)
+    with profiler._running:
+        client.get('/profile', {'seconds': .1}, status=409)
+    assert client.get('/profile', {'seconds': .1}).text == ''
+
+    denied = Flask('rework')
+    denied.register_blueprint(
+        reworkui(engine, has_permission=lambda perm: perm == 'read')
+    )
+    webtest.TestApp(denied).get('/profile', status=403)
+
+
+def test_workers_timeline(engine, client):
+    with engine.begin() as cn:
+        wid = cn.execute(
+            "insert into rework.worker (host, domain, pid) "
+            "values ('timeline', 'default', 42) returning id"
+        ).scalar()
+        opid = cn.execute(
+            "select id from rework.operation where name = 'with_inputs'"
+        ).scalar()
+        # one task per minute from 10:00, and one still running
+        for minute in range(60):
+            cn.execute(
+                "insert into rework.task "
+                "(operation, worker, status, started, finished) "
+                "values (%(opid)s, %(wid)s, 'done', "
+                " %(started)s, %(started)s + interval '50 seconds')",
+                opid=opid, wid=wid,
+                started=datetime.datetime(2020, 1, 1, 10, minute, tzinfo=TZ)
+            )
+        cn.execute(
+            "insert into rework.task (operation, worker, status, started) "
+            "values (%(opid)s, %(wid)s, 'running', %(started)s)",
+            opid=opid, wid=wid,
+            started=datetime.datetime(2020, 1, 1, 10, 59, 30, tzinfo=TZ)
+        )
+        # a failed and an aborted task at 10:45 and 10:46
+        cn.execute(
+            "update rework.task set traceback = 'boom' "
+            'where worker = %(wid)s and started = %(started)s',
+            wid=wid,
+            started=datetime.datetime(2020, 1, 1, 10, 45, tzinfo=TZ)
+        )
+        cn.execute(
+            'update rework.task set abort = true, '
+            "traceback = 'aborted' "
+            'where worker = %(wid)s and started = %(started)s',
+            wid=wid,
+            started=datetime.datetime(2020, 1, 1, 10, 46, tzinfo=TZ)
+        )
+
+    window = {
+        'start': '2020-01-01T10:30:00',
+        'stop': '2020-01-01T11:00:00'
+    }
+    res = client.get('/workers-timeline-json', window).json
+    assert res['stop'] - res['start'] == 1800
+    [worker] = res['workers']
+    assert (worker['wid'], worker['host'], worker['pid']) == (wid, 'timeline', 42)
+    intervals = worker['intervals']
+    # the task started at 10:29 finished before the window
+    assert len(intervals) == 31
+    assert intervals[0]['end'] - intervals[0]['start'] == 50
+    assert {item['count'] for item in intervals} == {1}
+    assert intervals[-1]['status'] == 'running'
+    assert intervals[-1]['end'] > time.time() - 60
+    # the same states as everywhere else
+    assert [item['status'] for item in intervals[14:18]] == [
+        'done', 'failed', 'aborted', 'done'
+    ]
+
+    # ten minutes per pixel
+    intervals = client.get(
+        '/workers-timeline-json', dict(window, width=3)
+    ).json['workers'][0]['intervals']
+    assert [
+        (item['count'], item['status'], item['operation'])
+        for item in intervals
+    ] == [
+        (10, 'done', 'with_inputs'),
+        (10, 'mixed', 'with_inputs'),
+        (11, 'mixed', 'with_inputs')
+    ]
+
+    # one range scan of the span index
+    with engine.begin() as cn:
+        cn.execute('set local enable_seqscan = off')
+        q = timeline.timeline_query(
+            datetime.datetime(2020, 1, 1, 10, tzinfo=TZ),
+            datetime.datetime(2020, 1, 1, 11, tzinfo=TZ)
+        )
+        plan = json.dumps(q.do(explain.explainer(cn)).scalar())
+    assert 'ix_rework_task_span' in plan
+
+    window['stop'] = window['start']
+    client.get('/workers-timeline-json', window, status=400)
+    client.get('/workers-timeline-json', {'start': 'yesterday'}, status=400)
+
+    with engine.begin() as cn:
+        cn.execute('delete from rework.task where worker = %(wid)s', wid=wid)
+        cn.execute('delete from rework.worker where id = %(wid)s', wid=wid)